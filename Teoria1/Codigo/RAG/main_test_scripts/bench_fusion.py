@@ -0,0 +1,70 @@
+"""
+Benchmark de fusión: rrf_combine original (dict + sorted sobre strings) contra fusion.fuse
+(NumPy sobre slots enteros) con listas de 50 a 5000 candidatos.
+
+    python -m main_test_scripts.bench_fusion --sizes 50 500 5000 --top-k 50
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+import numpy as np
+
+from raglib.fusion import fuse, rrf_combine_ids
+
+
+def rrf_combine_dict(*ranked_lists: List[str], k: float = 60.0) -> List[str]:
+    """Implementación anterior de rrf_combine (referencia)."""
+    scores: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, item in enumerate(ranked):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1.0)
+    sorted_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return [item for item, _ in sorted_items]
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 5000])
+    ap.add_argument("--top-k", type=int, default=50)
+    ap.add_argument("--overlap", type=float, default=0.5, help="fracción de candidatos compartidos entre listas")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'n':>6} {'dict (ms)':>10} {'rrf ids':>10} {'rrf top-k':>10} {'minmax':>10} {'zscore':>10} {'x top-k':>8}")
+    for n in args.sizes:
+        pool = rng.sample(range(20 * n), int(n * (2 - args.overlap)))
+        bm25 = np.array(pool[:n], dtype=np.int64)
+        vec = np.array(rng.sample(pool[len(pool) - n:], n), dtype=np.int64)
+        bm25_scores = np.sort(np.random.default_rng(args.seed).gamma(2.0, 3.0, n))[::-1]
+        vec_scores = np.sort(np.random.default_rng(args.seed + 1).uniform(0.2, 0.9, n))[::-1]
+        # la versión original recibe strings doc::chunk_i
+        bm25_str = [f"d{i // 8}::chunk_{i % 8}" for i in bm25.tolist()]
+        vec_str = [f"d{i // 8}::chunk_{i % 8}" for i in vec.tolist()]
+
+        ref = rrf_combine_dict(bm25_str, vec_str)
+        got = rrf_combine_ids(bm25, vec)
+        assert ref == [f"d{i // 8}::chunk_{i % 8}" for i in got.tolist()], "rrf_combine_ids difiere de la referencia"
+
+        t_dict = timeit(lambda: rrf_combine_dict(bm25_str, vec_str)[:args.top_k], args.repeat)
+        t_ids = timeit(lambda: rrf_combine_ids(bm25, vec)[:args.top_k], args.repeat)
+        t_top = timeit(lambda: fuse([bm25, vec], top_k=args.top_k), args.repeat)
+        t_mm = timeit(lambda: fuse([bm25, vec], [bm25_scores, vec_scores], "minmax", top_k=args.top_k), args.repeat)
+        t_z = timeit(lambda: fuse([bm25, vec], [bm25_scores, vec_scores], "zscore", top_k=args.top_k), args.repeat)
+        print(f"{n:>6} {t_dict:>10.3f} {t_ids:>10.3f} {t_top:>10.3f} {t_mm:>10.3f} {t_z:>10.3f} {t_dict / t_top:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
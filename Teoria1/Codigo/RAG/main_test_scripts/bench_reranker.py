@@ -0,0 +1,90 @@
+"""
+Benchmark del re-ranker: modelo actual (PyTorch, sin agrupar por largo) contra batches por largo
+y los backends ONNX / ONNX int8, sobre los datos de evaluate_retrieval.
+Los candidatos salen de BM25 (sin Pinecone) y son los mismos para todas las variantes;
+se reporta latencia por query (p50/p95), pares/s y nDCG@k tras el re-ranqueo con su diferencia.
+
+    python -m main_test_scripts.bench_reranker --docs data/docs_sample_en.jsonl --qrels data/qrels_sample_en.csv
+"""
+
+import argparse
+import time
+from typing import Dict, List
+import numpy as np
+
+from raglib.io_utils import load_docs_jsonl, load_qrels_graded_csv
+from raglib.metrics import ir_metrics, relevance_matrix
+from raglib.pipeline import RagPipeline
+from raglib.reranker import CrossEncoderReranker
+from main_test_scripts.evaluate_retrieval import resolve_path
+
+VARIANTS = {
+    "torch": dict(backend="torch", bucket=False),  # comportamiento anterior
+    "torch+bucket": dict(backend="torch"),
+    "onnx+bucket": dict(backend="onnx"),
+    "onnx-int8+bucket": dict(backend="onnx-int8"),
+}
+
+
+def run_variant(reranker: CrossEncoderReranker, queries: List[str], cands, qrels, ks, top_final: int) -> Dict:
+    reranker.rerank(queries[0], cands[0])  # calentamiento
+    lat, post = [], []
+    for q, c in zip(queries, cands):
+        t0 = time.perf_counter()
+        res = reranker.rerank(q, c)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        post.append(list(dict.fromkeys(r[0] for r in res[:top_final])))
+    judged = [qrels[q] for q in queries]
+    m = ir_metrics(relevance_matrix(post, judged), judged, ks)
+    n_pairs = sum(len(c) for c in cands)
+    row = {"p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+           "pairs_s": n_pairs / (sum(lat) / 1000.0)}
+    row.update({f"ndcg@{k}": float(m[f"ndcg@{k}"].mean()) for k in ks})
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", default="data/docs_sample_en.jsonl")
+    ap.add_argument("--qrels", default="data/qrels_sample_en.csv")
+    ap.add_argument("--ks", default="5,10")
+    ap.add_argument("--top_retrieve", type=int, default=50)
+    ap.add_argument("--top_final", type=int, default=10)
+    ap.add_argument("--ce_model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    ap.add_argument("--max_length", type=int, default=None)
+    ap.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    args = ap.parse_args()
+    ks = tuple(int(x) for x in args.ks.split(",") if x.strip())
+
+    docs = load_docs_jsonl(resolve_path(args.docs))
+    qrels = load_qrels_graded_csv(resolve_path(args.qrels))
+    queries = list(qrels.keys())
+    pipeline = RagPipeline(docs=docs, pinecone_searcher=None, max_tokens_chunk=120, overlap=30,
+                           ce_model=args.ce_model)
+    cands = pipeline.retrieve_with_metadata_many(queries, top_k=args.top_retrieve)
+    print(f"[INFO] {len(queries)} queries, {sum(len(c) for c in cands)} pares (query, chunk)")
+
+    rows = {}
+    for name in args.variants:
+        try:
+            reranker = CrossEncoderReranker(args.ce_model, max_length=args.max_length, **VARIANTS[name])
+        except Exception as e:  # p. ej. sin onnxruntime o sin el archivo ONNX en el repo del modelo
+            print(f"[WARN] {name}: omitido ({type(e).__name__}: {e})")
+            continue
+        rows[name] = run_variant(reranker, queries, cands, qrels, ks, args.top_final)
+
+    base = rows.get("torch")
+    head = f"{'variante':<18} {'p50 ms':>9} {'p95 ms':>9} {'pares/s':>10} {'vs base':>8}"
+    head += "".join(f" {f'ndcg@{k}':>9} {'Δ':>7}" for k in ks)
+    print(head)
+    for name, r in rows.items():
+        speed = f"{base['p50_ms'] / r['p50_ms']:.2f}x" if base else ""
+        line = f"{name:<18} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['pairs_s']:>10.1f} {speed:>8}"
+        for k in ks:
+            delta = r[f"ndcg@{k}"] - base[f"ndcg@{k}"] if base else 0.0
+            line += f" {r[f'ndcg@{k}']:>9.4f} {delta:>+7.4f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
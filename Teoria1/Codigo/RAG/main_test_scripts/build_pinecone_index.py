@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 from raglib import Document
 from raglib.loader_pdfs import folder_pdfs_to_documents, documents_to_chunks
 from raglib.vector_pinecone import PineconeSearcher
+from raglib.chunk_cache import ChunkCache
+from raglib.embedding_cache import EmbeddingCache
+from raglib.chunk_manifest import ChunkManifest
 
 if __name__ == "__main__":
     load_dotenv(override=True)  # opcional
@@ -15,10 +18,12 @@ if __name__ == "__main__":
     MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
     corpus_dir = Path("./corpus")  # coloca tus PDFs aquí
-    docs = folder_pdfs_to_documents(corpus_dir, recursive=True)
+    docs = folder_pdfs_to_documents(corpus_dir, recursive=True, workers=None)  # extracción en paralelo
     print(f"Docs (páginas con texto): {len(docs)}")
 
-    chunks_map = documents_to_chunks(docs, max_tokens_chunk=300, overlap=80)
+    # caché de chunks en disco: re-ingerir un corpus sin cambios no vuelve a chunkear
+    cache = ChunkCache(Path("./data/chunk_cache"))
+    chunks_map = documents_to_chunks(docs, max_tokens_chunk=300, overlap=80, cache=cache)
     total_chunks = sum(len(v) for v in chunks_map.values())
     print(f"Total chunks: {total_chunks}")
 
@@ -26,6 +31,11 @@ if __name__ == "__main__":
     docs_meta = {d.id: {"source": d.source, "page": d.page} for d in docs}
 
     # construir searcher y upsert
-    searcher = PineconeSearcher(index_name=INDEX_NAME, model_name=MODEL, cloud=CLOUD, region=REGION)
-    searcher.upsert_chunks(chunks_map, docs_meta)  #(upsert = update + insert)--->Pinecone solo pisa datos si el "id" coincide
+    searcher = PineconeSearcher(
+        index_name=INDEX_NAME, model_name=MODEL, cloud=CLOUD, region=REGION,
+        embedding_cache=EmbeddingCache(Path("./data/embedding_cache")),  # re-ingesta sin re-codificar chunks sin cambios
+    )
+    # re-ingesta incremental: sólo sube chunks nuevos/modificados y borra los que ya no existen
+    manifest = ChunkManifest(Path(f"./data/manifests/{INDEX_NAME}-{searcher.namespace}.json"))
+    searcher.sync_chunks(chunks_map, docs_meta, manifest)  #(upsert = update + insert)--->Pinecone solo pisa datos si el "id" coincide
     print("Upsert a Pinecone completado.")
@@ -1,12 +1,11 @@
 import argparse
 import os
 from pathlib import Path
-import pandas as pd
 from dotenv import load_dotenv
 
 from raglib.pipeline import RagPipeline
-from raglib.metrics import precision_at_k, recall_at_k, ndcg_at_k, mrr
-from raglib.io_utils import load_docs_jsonl, load_qrels_csv
+from raglib.evaluation import evaluate_pipeline, save_results
+from raglib.io_utils import load_docs_jsonl, load_qrels_csv, load_qrels_graded_csv
 from raglib.vector_pinecone import PineconeSearcher
 
 
@@ -17,37 +16,12 @@ def resolve_path(p: str) -> Path:
     return pp if pp.is_absolute() else (PROJECT_ROOT / pp)
 
 
-def evaluate(pipeline: RagPipeline, qrels, ks=(5, 10), top_retrieve=50, top_final=10):
-    rows = []
-    for query, rel_ids in qrels.items():
-        # Recuperación híbrida (BM25 + vector) con metadatos
-        cand = pipeline.retrieve_with_metadata(query, top_k=top_retrieve)
-
-        # IDs de documento antes del re-ranqueo (dedup conserva orden)
-        pre_ids = [doc_id for (doc_id, _chunk, _meta) in cand]
-        pre_ids = list(dict.fromkeys(pre_ids))
-
-        # Re-ranqueo con Cross-Encoder y deduplicación por documento
-        rer = pipeline.reranker.rerank(query, cand)[:top_final]
-        post_ids = [doc_id for (doc_id, _chunk, _meta, _score) in rer]
-        post_ids = list(dict.fromkeys(post_ids))
-
-        # Métricas por cada K
-        for k in ks:
-            rows.append({
-                "query": query, "k": k,
-                "precision_pre":  precision_at_k(pre_ids,  rel_ids, k),
-                "recall_pre":     recall_at_k(pre_ids,     rel_ids, k),
-                "ndcg_pre":       ndcg_at_k(pre_ids,       rel_ids, k),
-                "precision_post": precision_at_k(post_ids, rel_ids, k),
-                "recall_post":    recall_at_k(post_ids,    rel_ids, k),
-                "ndcg_post":      ndcg_at_k(post_ids,      rel_ids, k),
-                "mrr_pre":        mrr(pre_ids,  rel_ids),
-                "mrr_post":       mrr(post_ids, rel_ids),
-            })
-    df = pd.DataFrame(rows)
-    agg = df.groupby("k").mean(numeric_only=True).reset_index()
-    return df, agg
+def evaluate(pipeline: RagPipeline, qrels, ks=(5, 10), top_retrieve=50, top_final=10, batch_size=64, workers=4):
+    # Recuperación híbrida + re-ranqueo por lotes en paralelo; métricas vectorizadas (binarias si qrels es
+    # {query: set(doc_ids)}, graduadas si es {query: {doc_id: label}}).
+    # IDs de documento deduplicados antes y después del re-ranqueo.
+    return evaluate_pipeline(pipeline, qrels, ks=ks, top_retrieve=top_retrieve, top_final=top_final,
+                             batch_size=batch_size, workers=workers)
 
 
 if __name__ == "__main__":
@@ -60,6 +34,10 @@ if __name__ == "__main__":
     parser.add_argument("--top_retrieve", type=int, default=50)
     parser.add_argument("--top_final", type=int, default=10)
     parser.add_argument("--device", type=str, default=None)
+    parser.add_argument("--batch_size", type=int, default=64, help="queries por lote")
+    parser.add_argument("--workers", type=int, default=4, help="lotes en paralelo")
+    parser.add_argument("--graded", action="store_true", help="nDCG con labels graduados (por defecto binario: relevante = label > 0)")
+    parser.add_argument("--out", type=str, default="", help="métricas por query (.parquet o .csv)")
     args = parser.parse_args()
 
     ks = tuple(int(x) for x in args.ks.split(",") if x.strip())
@@ -72,7 +50,8 @@ if __name__ == "__main__":
         print(f"[INFO] docs : {docs_path}")
         print(f"[INFO] qrels: {qrels_path}")
         docs  = load_docs_jsonl(docs_path)
-        qrels = load_qrels_csv(qrels_path)
+        qrels = load_qrels_graded_csv(qrels_path) if args.graded else load_qrels_csv(qrels_path)
+        print(f"[INFO] relevancia: {'graduada (label)' if args.graded else 'binaria (label > 0)'}")
     else:
         raise SystemExit(
             f"[ERROR] No se encontraron archivos válidos.\n"
@@ -98,8 +77,11 @@ if __name__ == "__main__":
     )
 
     # Ejecutar evaluación
-    df, agg = evaluate(pipeline, qrels, ks=ks, top_retrieve=args.top_retrieve, top_final=args.top_final)
+    df, agg = evaluate(pipeline, qrels, ks=ks, top_retrieve=args.top_retrieve, top_final=args.top_final,
+                       batch_size=args.batch_size, workers=args.workers)
     print("\n=== Métricas por query y K ===")
     print(df.to_string(index=False))
     print("\n=== Promedios (macro) por K ===")
     print(agg.to_string(index=False))
+    if args.out:
+        print(f"\n[INFO] métricas por query en {save_results(df, resolve_path(args.out))}")
@@ -7,6 +7,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from dotenv import load_dotenv
 from raglib import RagPipeline, PineconeSearcher
 from raglib.loader_pdfs import folder_pdfs_to_documents, documents_to_chunks
+from raglib.chunk_cache import ChunkCache
+from raglib.embedding_cache import EmbeddingCache
+from raglib.chunk_manifest import ChunkManifest
 
 # 3) CARGA .env DESDE LA RAÍZ (para PINECONE_API_KEY)
 # Si lo movés a otra carpeta fija, solo cambiás el path antes de .env. 
@@ -39,8 +42,10 @@ def main():
     # for d in docs[:3]:
     #     print(" -", d.id, d.source, d.page, len(d.text), "chars")
 
-    # 2) Chunking (usa el mismo que tu pipeline)
-    chunks_map = documents_to_chunks(docs, max_tokens_chunk=300, overlap=80)
+    # 2) Chunking (usa el mismo que tu pipeline); la caché en disco evita re-chunkear
+    #    el mismo corpus en la ingesta, en el pipeline y en corridas siguientes
+    chunk_cache = ChunkCache(Path("./data/chunk_cache"))
+    chunks_map = documents_to_chunks(docs, max_tokens_chunk=300, overlap=80, cache=chunk_cache)
     total_chunks = sum(len(v) for v in chunks_map.values())
     print(f"[INFO] Total de chunks: {total_chunks}")
 
@@ -51,15 +56,17 @@ def main():
         cloud=CLOUD,
         region=REGION,
         api_key=API_KEY,
+        embedding_cache=EmbeddingCache(Path("./data/embedding_cache")),
         namespace="v2-200tok"  # cualquier nombre válido (minúsculas, dígitos, '-')-->Sugerencia: guardá el namespace en .env para no tocar código
                                # Si cambiás de modelo de embeddings (dimensión de vector), cambiá de índice (no solo de namespace).
     )
 
-    ## NO CONCATENA, borra todo lo que hay en ese namespace de Pinecone y lo deja vacío, comentar si se busca concatenar y perservar. 
-    searcher.clear_namespace()  #=========> IMPORTANTE
-
+    ## Re-ingesta incremental: contra el manifiesto sólo se suben los chunks nuevos/modificados y se borran
+    ## los que ya no existen; la namespace no se vacía. Para empezar de cero: searcher.clear_namespace()
+    ## y borrar el manifiesto.
     docs_meta = {d.id: {"source": d.source, "page": d.page} for d in docs}
-    searcher.upsert_chunks(chunks_map, docs_meta)
+    manifest = ChunkManifest(Path(f"./data/manifests/{INDEX_NAME}-{searcher.namespace}.json"))
+    searcher.sync_chunks(chunks_map, docs_meta, manifest)
 
 
     print(f"[INFO] Upsert en Pinecone completado -> índice '{INDEX_NAME}'.")
@@ -71,6 +78,8 @@ def main():
         max_tokens_chunk=300,
         overlap=80,
         ce_model="cross-encoder/ms-marco-MiniLM-L-6-v2",
+        chunk_cache=chunk_cache,
+        do_upsert=False,  # ya sincronizado arriba
     )
 
     # Escribí acá tu consulta (o reemplazala por input()).
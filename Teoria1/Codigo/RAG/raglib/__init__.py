@@ -1,8 +1,19 @@
-from .documents import Document, simple_tokenize, chunk_text
+from .documents import Document, simple_tokenize, chunk_text, iter_chunks, chunk_documents
+from .chunk_cache import ChunkCache
+from .embedding_cache import EmbeddingCache
+from .chunk_manifest import ChunkManifest
+from .chunk_store import ChunkStore
 from .bm25_index import BM25Index
 from .reranker import CrossEncoderReranker
-from .fusion import rrf_combine
+from .fusion import rrf_combine, fuse
+from .batching import MicroBatcher
+from . import tracing
 from .vector_pinecone import PineconeSearcher, ensure_pinecone_index
-from .pipeline import RagPipeline
-from .metrics import precision_at_k, recall_at_k, ndcg_at_k, mrr
-from .io_utils import load_docs_jsonl, load_qrels_csv
+from .vector_local import LocalVectorSearcher
+from .result_cache import ResultCache
+from .cascade import CascadePolicy, CascadeStats
+from .diversify import mmr
+from .pipeline import RagPipeline, HybridResult
+from .metrics import precision_at_k, recall_at_k, ndcg_at_k, mrr, relevance_matrix, ir_metrics
+from .evaluation import evaluate_pipeline
+from .io_utils import load_docs_jsonl, load_qrels_csv, load_qrels_graded_csv
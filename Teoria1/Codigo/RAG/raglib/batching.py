@@ -0,0 +1,76 @@
+"""
+Micro-batching para asyncio
+---------------------------
+Junta los pedidos que llegan de requests concurrentes durante unos milisegundos (o hasta
+max_batch_size) y los resuelve con una sola llamada a fn(items) en un hilo, así el encoder
+o el CrossEncoder trabajan con batches grandes en lugar de uno por request.
+"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+from .tracing import span
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        fn: Callable[[List[T]], Sequence[R]],  # items -> un resultado por item, en orden
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        size: Optional[Callable[[T], int]] = None,  # peso de cada item (p. ej. cantidad de pares)
+        executor: Optional[Executor] = None,  # None = executor por defecto del loop
+        name: str = "batch",  # nombre del span en las trazas
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size debe ser >= 1")
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.size = size or (lambda _item: 1)
+        self.executor = executor
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._pending_size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, item: T) -> R:
+        """Encola item y espera su resultado (el batch sale al llenarse o al vencer max_wait_ms)."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((item, fut))
+        self._pending_size += self.size(item)
+        if self._pending_size >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_size = self._pending, [], 0
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            with span(self.name, batch=len(batch)):
+                results = await loop.run_in_executor(self.executor, self.fn, [item for item, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), res in zip(batch, results):
+            if not fut.done():  # el request pudo cancelarse (timeout) mientras esperaba
+                fut.set_result(res)
@@ -0,0 +1,223 @@
+"""
+Benchmarks reproducibles de recuperación (sin Pinecone)
+-------------------------------------------------------
+Corre sobre el corpus sintético (synthetic.py) con semilla fija:
+- micro: chunking por documento, búsqueda BM25 por query, fusión, re-ranking por query,
+- macro: chunking e indexado del corpus completo, BM25 en lote, recuperación de punta a punta.
+Reporta throughput, latencia p50/p95/p99 y pico de memoria (tracemalloc, en una pasada aparte
+para no ensuciar los tiempos), y compara contra un baseline guardado en JSON.
+
+    python -m raglib.benchmark --sizes 1000 10000 --out bench.json
+    python -m raglib.benchmark --sizes 1000 10000 --baseline bench.json --fail-on-regression
+"""
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from .bm25_index import BM25Index
+from .documents import chunk_documents, chunk_with_fallback
+from .fusion import fuse
+from .synthetic import synthetic_corpus, synthetic_queries
+
+BENCHES = ("chunking", "indexing", "bm25", "fusion", "rerank", "e2e")
+
+
+@dataclass
+class BenchResult:
+    bench: str
+    size: int           # chunks pedidos al generador
+    items: int          # unidades procesadas (chunks, queries, pares...)
+    seconds: float
+    throughput: float   # items / s
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_mb: Optional[float] = None
+    note: str = ""
+
+
+def _latencies(fn: Callable, args: Sequence) -> np.ndarray:
+    out = np.empty(len(args))
+    for i, a in enumerate(args):
+        t0 = time.perf_counter()
+        fn(a)
+        out[i] = (time.perf_counter() - t0) * 1000.0
+    return out
+
+
+def _peak_mb(fn: Callable) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def _result(bench: str, size: int, items: int, seconds: float, lat_ms: np.ndarray,
+            peak: Optional[float] = None, note: str = "") -> BenchResult:
+    p50, p95, p99 = (np.percentile(lat_ms, [50, 95, 99]) if len(lat_ms) else (0.0, 0.0, 0.0))
+    return BenchResult(bench, size, items, seconds, items / seconds if seconds > 0 else 0.0,
+                       float(p50), float(p95), float(p99), peak, note)
+
+
+def _timed(fn: Callable):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def run_size(
+    size: int,
+    benches: Sequence[str] = BENCHES,
+    n_queries: int = 200,
+    seed: int = 0,
+    max_tokens: int = 120,
+    overlap: int = 30,
+    memory: bool = True,
+    ce_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    embed_model: Optional[str] = None,  # con modelo: e2e usa además LocalVectorSearcher
+) -> List[BenchResult]:
+    docs = synthetic_corpus(size, seed=seed)
+    queries, _qrels = synthetic_queries(docs, n_queries, seed=seed)
+    out: List[BenchResult] = []
+    peak = (lambda fn: _peak_mb(fn)) if memory else (lambda fn: None)
+
+    chunks, secs = _timed(lambda: chunk_documents(docs, max_tokens, overlap))
+    n_chunks = sum(len(v) for v in chunks.values())
+    if "chunking" in benches:
+        sample = docs[:2000]
+        lat = _latencies(lambda d: chunk_with_fallback(d.text, max_tokens, overlap), sample)
+        out.append(_result("chunking", size, n_chunks, secs, lat,
+                           peak(lambda: chunk_documents(docs, max_tokens, overlap)), f"{len(docs)} docs"))
+
+    bm25, secs = _timed(lambda: BM25Index(docs, chunks))
+    if "indexing" in benches:
+        out.append(_result("indexing", size, n_chunks, secs, np.array([secs * 1000.0]),
+                           peak(lambda: BM25Index(docs, chunks))))
+
+    if "bm25" in benches:
+        lat = _latencies(lambda q: bm25.search_slots(q, 50), queries)
+        _, secs = _timed(lambda: bm25.search_slots_many(queries, 50))
+        out.append(_result("bm25", size, len(queries), secs, lat,
+                           peak(lambda: bm25.search_slots_many(queries, 50)), "throughput = search_slots_many"))
+
+    if "fusion" in benches:
+        # segunda lista: top-50 BM25 de otra query, como si fuera la rama vectorial
+        hits = bm25.search_slots_many(queries, 50)
+        pairs = list(zip(hits, hits[1:] + hits[:1]))
+        for method in ("rrf", "minmax"):
+            fn = lambda p, m=method: fuse([p[0][0], p[1][0]], [p[0][1], p[1][1]], method=m, top_k=50)
+            lat = _latencies(fn, pairs)
+            out.append(_result(f"fusion.{method}", size, len(pairs), float(lat.sum()) / 1000.0, lat))
+
+    texts_for = lambda q: [bm25.store.text(s) for s in bm25.search_slots(q, 30)[0].tolist()]
+    if "rerank" in benches or "e2e" in benches:
+        why = ""
+        try:
+            from .reranker import CrossEncoderReranker
+            reranker = CrossEncoderReranker(model_name=ce_model)
+        except Exception as e:  # sin modelo descargado / sin sentence-transformers
+            reranker, why = None, f"omitido: {type(e).__name__}: {e}"[:120]
+        if "rerank" in benches:
+            if reranker is None:
+                out.append(BenchResult("rerank", size, 0, 0.0, 0.0, 0.0, 0.0, 0.0, None, why))
+            else:
+                cands = [(q, texts_for(q)) for q in queries]
+                lat = _latencies(lambda c: reranker.score(c[0], c[1]), cands)
+                n_pairs = sum(len(c[1]) for c in cands)
+                out.append(_result("rerank", size, n_pairs, float(lat.sum()) / 1000.0, lat,
+                                   note="items = pares (query, chunk)"))
+
+        if "e2e" in benches:
+            if reranker is None:
+                out.append(BenchResult("e2e", size, 0, 0.0, 0.0, 0.0, 0.0, 0.0, None, why))
+            else:
+                from .pipeline import RagPipeline
+                vec = None
+                if embed_model:
+                    from .vector_local import LocalVectorSearcher
+                    vec = LocalVectorSearcher(model_name=embed_model)
+                pipe = RagPipeline(docs, pinecone_searcher=vec, bm25_index=bm25, ce_model=ce_model)
+                lat = _latencies(lambda q: pipe.retrieve_and_rerank(q, top_retrieve=30, top_final=5), queries)
+                out.append(_result("e2e", size, len(queries), float(lat.sum()) / 1000.0, lat,
+                                   note="retrieve_and_rerank" + (" + vector local" if vec else " (sólo BM25)")))
+    return out
+
+
+def compare(results: List[BenchResult], baseline: List[Dict], tolerance: float = 0.10) -> List[str]:
+    """Regresiones contra el baseline: throughput que cae o p50 que sube más de tolerance."""
+    base = {(b["bench"], b["size"]): b for b in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r.bench, r.size))
+        if b is None or not r.items or not b["items"]:
+            continue
+        if b["throughput"] > 0 and r.throughput < b["throughput"] * (1 - tolerance):
+            regressions.append(f"{r.bench}@{r.size}: throughput {b['throughput']:.1f} -> {r.throughput:.1f}")
+        if b["p50_ms"] > 0 and r.p50_ms > b["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{r.bench}@{r.size}: p50 {b['p50_ms']:.3f} ms -> {r.p50_ms:.3f} ms")
+    return regressions
+
+
+def format_table(results: List[BenchResult], baseline: Optional[List[Dict]] = None) -> str:
+    base = {(b["bench"], b["size"]): b for b in baseline or []}
+    lines = [f"{'bench':<14} {'size':>8} {'items':>9} {'items/s':>12} {'p50 ms':>9} {'p95 ms':>9} "
+             f"{'p99 ms':>9} {'peak MB':>8} {'vs base':>8}  nota"]
+    for r in results:
+        b = base.get((r.bench, r.size))
+        ratio = f"{r.throughput / b['throughput']:.2f}x" if b and b["throughput"] and r.throughput else ""
+        peak = f"{r.peak_mb:.1f}" if r.peak_mb is not None else ""
+        lines.append(f"{r.bench:<14} {r.size:>8} {r.items:>9} {r.throughput:>12.1f} {r.p50_ms:>9.3f} "
+                     f"{r.p95_ms:>9.3f} {r.p99_ms:>9.3f} {peak:>8} {ratio:>8}  {r.note}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks offline de raglib sobre un corpus sintético")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="chunks (1k a 1M)")
+    ap.add_argument("--benches", nargs="+", default=list(BENCHES), choices=BENCHES)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-memory", action="store_true", help="no medir pico de memoria (más rápido)")
+    ap.add_argument("--ce-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    ap.add_argument("--embed-model", default=None, help="activa la rama vectorial local en e2e")
+    ap.add_argument("--out", type=Path, default=None, help="guardar resultados (sirve como baseline)")
+    ap.add_argument("--baseline", type=Path, default=None)
+    ap.add_argument("--tolerance", type=float, default=0.10)
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args(argv)
+
+    results: List[BenchResult] = []
+    for size in args.sizes:
+        results.extend(run_size(size, args.benches, args.queries, args.seed, memory=not args.no_memory,
+                                ce_model=args.ce_model, embed_model=args.embed_model))
+
+    baseline = None
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    print(format_table(results, baseline))
+
+    if args.out is not None:
+        meta = {"seed": args.seed, "queries": args.queries, "python": sys.version.split()[0],
+                "numpy": np.__version__, "platform": platform.platform()}
+        args.out.write_text(json.dumps({"meta": meta, "results": [asdict(r) for r in results]}, indent=2),
+                            encoding="utf-8")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"[REGRESIÓN] {line}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
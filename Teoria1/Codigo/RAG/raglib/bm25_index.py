@@ -1,21 +1,502 @@
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import math
+import threading
 import numpy as np
-from rank_bm25 import BM25Okapi
 from .documents import Document, simple_tokenize
+from .storage import StringColumn, load_array, load_meta, save_array, save_meta, save_strings
+from .chunk_store import ChunkStore, SlotView
+from .tracing import span
+
+_FORMAT = "bm25-okapi-v2"
+
+
+@dataclass(frozen=True)
+class _Segment:
+    """
+    Bloque inmutable del índice invertido en formato CSR:
+      - term_ids: ids globales de término presentes en el bloque (ordenados)
+      - indptr[j]:indptr[j+1] delimita los postings de term_ids[j]
+      - post_docs / post_tfs: slot global del chunk y frecuencia del término
+    """
+    term_ids: np.ndarray
+    indptr: np.ndarray
+    post_docs: np.ndarray
+    post_tfs: np.ndarray
+
+    def postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        j = int(np.searchsorted(self.term_ids, tid))
+        if j == len(self.term_ids) or self.term_ids[j] != tid:
+            return self.post_docs[:0], self.post_tfs[:0]
+        lo, hi = self.indptr[j], self.indptr[j + 1]
+        return self.post_docs[lo:hi], self.post_tfs[lo:hi]
+
+
+@dataclass(frozen=True)
+class _IndexState:
+    """
+    Foto consistente del índice. Las búsquedas leen una sola foto y las
+    actualizaciones publican una nueva, así el índice sigue consultable mientras se modifica.
+    """
+    segments: Tuple[_Segment, ...]
+    alive: np.ndarray      # bool por slot (False = tombstone)
+    live: np.ndarray       # slots vivos, ordenados
+    doc_len: np.ndarray    # tokens por slot
+    df: np.ndarray         # chunks vivos que contienen cada término
+    idf: np.ndarray
+    norm: np.ndarray       # k1 * (1 - b + b * dl / avgdl) por slot
+    dead_postings: int = 0
+
+
+class _Vocab:
+    """
+    Vocabulario término -> term_id sobre una tabla de strings memory-mapped.
+    Las búsquedas hacen bisección sobre los términos ordenados (sin armar un dict
+    en memoria al cargar); los términos agregados después de cargar van a un dict aparte.
+    """
+
+    def __init__(self, terms: StringColumn, sorted_ids: np.ndarray):
+        self._terms = terms
+        self._sorted = sorted_ids
+        self._extra: Dict[str, int] = {}
+
+    def _find(self, term: str) -> Optional[int]:
+        lo, hi = 0, len(self._sorted)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            tid = int(self._sorted[mid])
+            cur = self._terms[tid]
+            if cur == term:
+                return tid
+            if cur < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self._extra.get(term)
+
+    def get(self, term: str, default=None):
+        tid = self._find(term)
+        return default if tid is None else tid
+
+    def __getitem__(self, term: str) -> int:
+        tid = self._find(term)
+        if tid is None:
+            raise KeyError(term)
+        return tid
+
+    def setdefault(self, term: str, default: int) -> int:
+        tid = self._find(term)
+        if tid is None:
+            self._extra[term] = tid = default
+        return tid
+
+    def __len__(self) -> int:
+        return len(self._terms) + len(self._extra)
+
+    def __iter__(self) -> Iterator[str]:
+        # en orden de term_id
+        yield from self._terms
+        yield from self._extra
+
+
+def _build_segment(tokenized: List[List[str]], first_slot: int, vocab: Dict[str, int]) -> _Segment:
+    """
+    Arma un segmento para chunks consecutivos a partir de first_slot.
+    Los términos nuevos se agregan a vocab en orden de primera aparición (igual que BM25Okapi).
+    """
+    terms: List[int] = []
+    docs: List[int] = []
+    tfs: List[int] = []
+    for di, tokens in enumerate(tokenized, start=first_slot):
+        freqs: Dict[str, int] = {}
+        for tok in tokens:
+            freqs[tok] = freqs.get(tok, 0) + 1
+        for tok, tf in freqs.items():
+            terms.append(vocab.setdefault(tok, len(vocab)))
+            docs.append(di)
+            tfs.append(tf)
+    return _csr(np.asarray(terms, dtype=np.int32), np.asarray(docs, dtype=np.int32),
+                np.asarray(tfs, dtype=np.int32))
+
+
+def _csr(terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray) -> _Segment:
+    # orden estable: dentro de cada término los chunks quedan en orden ascendente
+    order = np.argsort(terms, kind="stable")
+    term_ids, counts = np.unique(terms, return_counts=True)
+    indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return _Segment(term_ids.astype(np.int32), indptr, docs[order], tfs[order])
+
+
+def _okapi_idf(df: np.ndarray, n_docs: int, epsilon: float) -> np.ndarray:
+    """
+    IDF de BM25Okapi con piso epsilon * idf_promedio para términos muy frecuentes.
+    Se usa math.log (no np.log) para reproducir bit a bit los valores de rank_bm25;
+    como df toma pocos valores distintos, sólo se calcula una vez por valor.
+    Los términos sin chunks vivos (df == 0) no cuentan para el promedio.
+    """
+    idf = np.zeros(len(df), dtype=np.float64)
+    present = df > 0
+    if not present.any():
+        return idf
+    uniq, inv = np.unique(df[present], return_inverse=True)
+    per_df = np.array([math.log(n_docs - f + 0.5) - math.log(f + 0.5) for f in uniq.tolist()])
+    vals = per_df[inv]
+    # suma secuencial (cumsum), igual que el acumulador de rank_bm25
+    average_idf = float(np.cumsum(vals)[-1]) / len(vals)
+    vals[vals < 0] = epsilon * average_idf
+    idf[present] = vals
+    return idf
+
 
 class BM25Index:
-    def __init__(self, docs: List[Document], chunks_per_doc: Dict[str, List[str]]):
-        self.doc_ids: List[str] = []
-        self.chunks: List[str] = []
-        for d in docs:
-            for ch in chunks_per_doc[d.id]:
-                self.doc_ids.append(d.id)
-                self.chunks.append(ch)
-        self.tokenized = [simple_tokenize(t) for t in self.chunks]
-        self.bm25 = BM25Okapi(self.tokenized)
+    """
+    Índice BM25 (variante Okapi) sobre un índice invertido propio.
+    Sólo puntúa los chunks que contienen algún término de la query y selecciona
+    el top-k con una partición parcial, en lugar de recorrer todo el corpus.
+    Los scores son idénticos a los de rank_bm25.BM25Okapi.
+
+    Admite altas y bajas incrementales: cada alta agrega un segmento nuevo y cada baja
+    marca tombstones; los segmentos se compactan cuando hay muchos o cuando la fracción
+    de postings muertos supera compact_ratio. Los slots (índices globales) son estables.
+    corpus_id + generation identifican el contenido sin recorrerlo en cada consulta: el id es un
+    hash de los chunks calculado una vez al construir (el mismo corpus da el mismo id en otro
+    proceso o tras reiniciar; se guarda con save) y generation cuenta las altas/bajas posteriores.
+    """
+
+    def __init__(
+        self,
+        docs: List[Document],
+        chunks_per_doc: Dict[str, List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        max_segments: int = 8,
+        compact_ratio: float = 0.2,
+        store: Optional[ChunkStore] = None,  # almacén compartido (p. ej. con RagPipeline); slot = slot del almacén
+    ):
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.max_segments, self.compact_ratio = max_segments, compact_ratio
+        self.store = store if store is not None else ChunkStore()
+        self.vocab: Union[Dict[str, int], _Vocab] = {}
+        self._slots_by_doc: Optional[Dict[str, List[int]]] = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self._state = _IndexState(
+            segments=(), alive=np.zeros(0, dtype=bool), live=np.zeros(0, dtype=np.int64),
+            doc_len=np.zeros(0, dtype=np.int32), df=np.zeros(0, dtype=np.int64),
+            idf=np.zeros(0), norm=np.zeros(0),
+        )
+        slots = self.add_documents(docs, chunks_per_doc)
+        self.corpus_id = self.store.content_hash(slots)
+        self.generation = 0  # la construcción no cuenta como alta
+
+    def __len__(self) -> int:
+        return len(self._state.live)
+
+    @property
+    def avgdl(self) -> float:
+        st = self._state
+        return float(st.doc_len[st.live].sum()) / max(1, len(st.live))
+
+    @property
+    def chunks(self) -> SlotView:
+        """Texto por slot (vista sobre el almacén; los slots dados de baja siguen ahí)."""
+        return self.store.texts
+
+    @property
+    def doc_ids(self) -> SlotView:
+        return self.store.doc_ids
+
+    @property
+    def live_slots(self) -> np.ndarray:
+        return self._state.live
+
+    def is_live(self, slots: np.ndarray) -> np.ndarray:
+        alive = self._state.alive
+        slots = np.asarray(slots, dtype=np.int64)
+        ok = (slots >= 0) & (slots < len(alive))
+        ok[ok] = alive[slots[ok]]
+        return ok
+
+    def slots_of(self, doc_id: str) -> List[int]:
+        """Slots vivos de un documento, en orden de chunk (no modificar la lista)."""
+        return self._doc_slots().get(doc_id, [])
+
+    def _doc_slots(self) -> Dict[str, List[int]]:
+        # al cargar desde disco se arma recién cuando hace falta
+        if self._slots_by_doc is None:
+            self._slots_by_doc = {}
+            for slot in self._state.live.tolist():
+                self._slots_by_doc.setdefault(self.store.doc_id(slot), []).append(slot)
+        return self._slots_by_doc
+
+    def _publish(self, segments, alive, doc_len, df, dead_postings: int):
+        live = np.flatnonzero(alive)
+        n = len(live)
+        avgdl = int(doc_len[live].sum()) / n if n else 1.0
+        st = _IndexState(
+            segments=tuple(segments), alive=alive, live=live, doc_len=doc_len, df=df,
+            idf=_okapi_idf(df, n, self.epsilon),
+            norm=self.k1 * (1 - self.b + self.b * doc_len / avgdl),
+            dead_postings=dead_postings,
+        )
+        total = sum(len(s.post_docs) for s in st.segments)
+        if len(st.segments) > self.max_segments or (total and dead_postings / total > self.compact_ratio):
+            st = self._compacted(st)
+        self._state = st  # asignación atómica: las búsquedas en curso siguen con la foto anterior
+
+    def _tombstone(self, doc_ids: Iterable[str], alive: np.ndarray, df: np.ndarray) -> int:
+        """Marca como muertos los slots de doc_ids y descuenta su df. Devuelve postings muertos."""
+        dead = 0
+        for doc_id in doc_ids:
+            for slot in self._doc_slots().pop(doc_id, []):
+                alive[slot] = False
+                terms = {self.vocab[t] for t in simple_tokenize(self.store.text(slot))}
+                df[list(terms)] -= 1
+                dead += len(terms)
+        return dead
+
+    def add_documents(self, docs: List[Document], chunks_per_doc: Dict[str, List[str]]) -> np.ndarray:
+        """
+        Agrega (o reemplaza, si el id ya existe) documentos sin reconstruir el índice.
+        Los chunks se agregan al almacén; actualiza postings, longitudes e IDF y publica
+        la nueva foto de una sola vez. Devuelve los slots nuevos.
+        """
+        with self._lock:
+            st = self._state
+            first = len(self.store)
+            slots = np.fromiter(
+                (s for d in docs for s in self.store.append(d.id, chunks_per_doc[d.id], d.source, d.page)), dtype=np.int64
+            )
+            tokenized = [simple_tokenize(ch) for d in docs for ch in chunks_per_doc[d.id]]
+            seg = _build_segment(tokenized, first, self.vocab)
+
+            df = np.zeros(len(self.vocab), dtype=np.int64)
+            df[:len(st.df)] = st.df
+            # si el almacén es compartido puede haber slots ajenos al índice: quedan muertos
+            gap = first - len(st.alive)
+            alive = np.concatenate([st.alive, np.zeros(gap, dtype=bool), np.ones(len(slots), dtype=bool)])
+            dead = st.dead_postings + self._tombstone([d.id for d in docs], alive, df)
+            df[seg.term_ids] += np.diff(seg.indptr)
+            doc_len = np.concatenate([
+                st.doc_len, np.zeros(gap, dtype=np.int32),
+                np.fromiter((len(t) for t in tokenized), dtype=np.int32, count=len(tokenized)),
+            ])
+
+            slots_by_doc = self._doc_slots()
+            for slot in slots.tolist():
+                slots_by_doc.setdefault(self.store.doc_id(slot), []).append(slot)
+            segments = st.segments + ((seg,) if len(seg.post_docs) else ())
+            self._publish(segments, alive, doc_len, df, dead)
+            self.generation += 1
+            return slots
+
+    def remove_documents(self, doc_ids: Iterable[str]):
+        """Da de baja documentos marcando sus chunks con tombstones (sin reconstruir)."""
+        with self._lock:
+            st = self._state
+            alive, df = st.alive.copy(), st.df.copy()
+            dead = st.dead_postings + self._tombstone(doc_ids, alive, df)
+            self._publish(st.segments, alive, st.doc_len, df, dead)
+            self.generation += 1
+
+    def _compacted(self, st: _IndexState) -> _IndexState:
+        """Une todos los segmentos en uno y descarta los postings de slots muertos."""
+        terms, docs, tfs = [], [], []
+        for seg in st.segments:
+            keep = st.alive[seg.post_docs]
+            terms.append(np.repeat(seg.term_ids, np.diff(seg.indptr))[keep])
+            docs.append(seg.post_docs[keep])
+            tfs.append(seg.post_tfs[keep])
+        segments: Tuple[_Segment, ...] = ()
+        if terms and sum(len(t) for t in terms):
+            segments = (_csr(np.concatenate(terms), np.concatenate(docs), np.concatenate(tfs)),)
+        return _IndexState(segments, st.alive, st.live, st.doc_len, st.df, st.idf, st.norm, 0)
+
+    def compact(self):
+        """Fuerza la compactación (p. ej. después de una baja masiva)."""
+        with self._lock:
+            self._state = self._compacted(self._state)
+
+    def save(self, path: Union[str, Path]):
+        """
+        Guarda el índice como arrays planos (.npy) en la carpeta path: vocabulario, postings,
+        longitudes, df/idf/normalización y el almacén de chunks (ChunkStore).
+        Sólo se escriben los chunks vivos, renumerados en orden de slot.
+        """
+        folder = Path(path)
+        folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            st = self._compacted(self._state)
+            self._state = st
+            terms = list(self.vocab)
+            generation = self.generation
+        live = st.live
+        remap = np.full(len(st.alive), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        seg = st.segments[0] if st.segments else _csr(*(np.zeros(0, dtype=np.int32),) * 3)
+
+        save_array(folder, "term_ids", seg.term_ids)
+        save_array(folder, "indptr", seg.indptr)
+        save_array(folder, "post_docs", remap[seg.post_docs].astype(np.int32))
+        save_array(folder, "post_tfs", seg.post_tfs)
+        save_array(folder, "doc_len", st.doc_len[live])
+        save_array(folder, "df", st.df)
+        save_array(folder, "idf", st.idf)
+        save_array(folder, "norm", st.norm[live])
+        save_strings(folder, "vocab", terms)
+        save_array(folder, "vocab_sorted", np.array(sorted(range(len(terms)), key=terms.__getitem__), dtype=np.int32))
+        self.store.take(live.tolist()).save(folder, "chunks")
+        # meta.json al final: una carpeta sin meta.json es una escritura incompleta
+        save_meta(folder, {
+            "format": _FORMAT, "k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+            "max_segments": self.max_segments, "compact_ratio": self.compact_ratio,
+            "n_chunks": len(live), "n_terms": len(terms), "n_postings": int(len(seg.post_docs)),
+            "corpus_id": self.corpus_id, "generation": generation,
+        })
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "BM25Index":
+        """
+        Abre un índice guardado con save(). Con mmap=True los arrays se mapean en memoria
+        de sólo lectura: el arranque no depende del tamaño del corpus y los procesos que
+        abren la misma carpeta comparten las páginas. Las altas/bajas posteriores funcionan
+        igual (copy-on-write sobre los arrays mapeados).
+        """
+        folder = Path(path)
+        meta = load_meta(folder)
+        if meta.get("format") != _FORMAT:
+            raise ValueError(f"Formato de índice no soportado en {folder}: {meta.get('format')}")
+        self = cls.__new__(cls)
+        self.k1, self.b, self.epsilon = meta["k1"], meta["b"], meta["epsilon"]
+        self.max_segments, self.compact_ratio = meta["max_segments"], meta["compact_ratio"]
+        self.store = ChunkStore.load(folder, "chunks", mmap)
+        self.vocab = _Vocab(StringColumn.load(folder, "vocab", mmap), load_array(folder, "vocab_sorted", mmap))
+        self._slots_by_doc = None
+        self._lock = threading.Lock()
+        # los procesos que abren la misma carpeta ven la misma versión (comparten el caché de resultados)
+        self.corpus_id = meta.get("corpus_id") or self.store.content_hash(range(meta["n_chunks"]))
+        self.generation = meta.get("generation", 0)
+
+        n = meta["n_chunks"]
+        seg = _Segment(*(load_array(folder, name, mmap) for name in ("term_ids", "indptr", "post_docs", "post_tfs")))
+        self._state = _IndexState(
+            segments=(seg,) if meta["n_postings"] else (),
+            alive=np.ones(n, dtype=bool), live=np.arange(n, dtype=np.int64),
+            doc_len=load_array(folder, "doc_len", mmap), df=load_array(folder, "df", mmap),
+            idf=load_array(folder, "idf", mmap), norm=load_array(folder, "norm", mmap),
+        )
+        return self
+
+    def _term_postings(self, st: _IndexState, q: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(slots vivos, contribución BM25) de un término; vacío si no está en el índice."""
+        tid = self.vocab.get(q)
+        docs_parts, contrib_parts = [], []
+        if tid is not None and tid < len(st.idf):
+            for seg in st.segments:
+                docs, tf = seg.postings(tid)
+                if not len(docs):
+                    continue
+                mask = st.alive[docs]
+                docs, tf = docs[mask], tf[mask]
+                docs_parts.append(docs)
+                contrib_parts.append(st.idf[tid] * (tf * (self.k1 + 1) / (tf + st.norm[docs])))
+        if not docs_parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64)
+        return np.concatenate(docs_parts), np.concatenate(contrib_parts)
+
+    def _score(self, st: _IndexState, q_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve (slots, scores) sólo para los chunks vivos con algún término de la query.
+        Las contribuciones se suman en el orden de la query, como en BM25Okapi.
+        """
+        cand, contrib = [], []
+        for q in q_tokens:
+            docs, w = self._term_postings(st, q)
+            cand.append(docs)
+            contrib.append(w)
+        if not cand:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        ids, inv = np.unique(np.concatenate(cand), return_inverse=True)
+        # bincount acumula en orden de entrada -> misma suma que el recorrido denso
+        scores = np.bincount(inv, weights=np.concatenate(contrib), minlength=len(ids))
+        return ids.astype(np.int64), scores
+
+    @staticmethod
+    def _top_k(st: _IndexState, ids: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k por score descendente; empates -> slot mayor primero
+        (mismo orden que argsort estable invertido sobre el vector denso).
+        Si hay menos de top_k candidatos positivos, completa con chunks vivos de score 0.
+        """
+        top_k = min(top_k, len(st.live))
+        if top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k] if len(ids) >= top_k else 0.0
+        if kth <= 0:
+            # los chunks sin términos de la query (score 0) pueden entrar al top-k
+            tail = st.live[-(top_k + len(ids)):]
+            tail = np.setdiff1d(tail, ids, assume_unique=True)[-top_k:]
+            ids = np.concatenate([ids, tail])
+            scores = np.concatenate([scores, np.zeros(len(tail))])
+        elif len(ids) > top_k:
+            keep = np.flatnonzero(scores >= kth)
+            ids, scores = ids[keep], scores[keep]
+        order = np.lexsort((-ids, -scores))[:top_k]
+        return ids[order].astype(np.int64), scores[order]
 
     def search(self, query: str, top_k: int = 50) -> List[Tuple[int, float]]:
-        q_tokens = simple_tokenize(query)
-        scores = self.bm25.get_scores(q_tokens)
-        idx_sorted = np.argsort(scores)[::-1][:top_k]
-        return [(int(i), float(scores[int(i)])) for i in idx_sorted]
+        ids, scores = self.search_slots(query, top_k)
+        return list(zip(ids.tolist(), scores.tolist()))
+
+    def search_slots(self, query: str, top_k: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+        """Como search pero devuelve (slots, scores) como arrays."""
+        st = self._state
+        with span("bm25.tokenize"):
+            q_tokens = simple_tokenize(query)
+        with span("bm25.score", terms=len(q_tokens)) as sp:
+            ids, scores = self._score(st, q_tokens)
+            sp.set(candidates=len(ids))
+        with span("bm25.top_k", top_k=top_k):
+            return self._top_k(st, ids, scores, top_k)
+
+    def search_many(self, queries: List[str], top_k: int = 50) -> List[List[Tuple[int, float]]]:
+        """
+        Versión por lotes de search: cada término distinto se resuelve una sola vez y todas
+        las queries se puntúan en una única pasada (producto disperso queries x chunks
+        resuelto como un scatter-add sobre claves (query, slot)). Mismo resultado que search.
+        """
+        return [list(zip(ids.tolist(), scores.tolist())) for ids, scores in self.search_slots_many(queries, top_k)]
+
+    def search_slots_many(self, queries: List[str], top_k: int = 50) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search_many con resultados (slots, scores) como arrays."""
+        st = self._state
+        n_slots = len(st.alive)
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        keys, weights = [], []
+        with span("bm25.tokenize", batch=len(queries)):
+            tokens = [simple_tokenize(query) for query in queries]
+        with span("bm25.score", batch=len(queries)) as sp:
+            for qi, q_tokens in enumerate(tokens):
+                for q in q_tokens:
+                    if q not in postings:
+                        postings[q] = self._term_postings(st, q)
+                    docs, w = postings[q]
+                    keys.append(qi * n_slots + docs.astype(np.int64))
+                    weights.append(w)
+            if keys:
+                uniq, inv = np.unique(np.concatenate(keys), return_inverse=True)
+                scores = np.bincount(inv, weights=np.concatenate(weights), minlength=len(uniq))
+            else:
+                uniq, scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+            sp.set(terms=len(postings), candidates=len(uniq))
+        # las claves quedan ordenadas por query: se corta el resultado por límites de query
+        bounds = np.searchsorted(uniq, np.arange(len(queries) + 1, dtype=np.int64) * n_slots)
+        out: List[Tuple[np.ndarray, np.ndarray]] = []
+        with span("bm25.top_k", top_k=top_k, batch=len(queries)):
+            for qi in range(len(queries)):
+                lo, hi = bounds[qi], bounds[qi + 1]
+                out.append(self._top_k(st, uniq[lo:hi] - qi * n_slots, scores[lo:hi], top_k))
+        return out
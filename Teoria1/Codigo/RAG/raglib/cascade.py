@@ -0,0 +1,125 @@
+"""
+Re-ranking en cascada
+---------------------
+En lugar de pasar por el CrossEncoder todos los candidatos fusionados, se re-rankea un prefijo
+y se extiende de a tramos sólo mientras haya señales de que puede haber relevantes más abajo:
+- margen: algún chunk del tramo más profundo ya puntuado queda a menos de `margin` del
+  top_final-ésimo score (o lo supera),
+- acuerdo: el top_final del CrossEncoder coincide poco (< `agreement`) con el top_final de la fusión.
+Si ninguna de las dos se cumple el ranking se da por asentado. El presupuesto (pares o ms por
+query) corta siempre. Cascade es un paso a paso: next() da el tramo a puntuar y feed() recibe
+los scores, así lo usan igual la versión sincrónica, la por lotes y la async.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+import time
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CascadePolicy:
+    prefix: int = 10  # candidatos fusionados que siempre se re-rankean (al menos top_final)
+    step: int = 10  # candidatos que se agregan en cada extensión
+    margin: float = 0.0  # en unidades del score del CrossEncoder
+    agreement: float = 0.6  # fracción del top_final compartida con la fusión para darlo por asentado
+    max_pairs: Optional[int] = None  # presupuesto de pares (query, chunk) por query
+    max_ms: Optional[float] = None  # por query, se revisa entre tramos (en lote: el tiempo de la ronda compartida)
+
+
+@dataclass
+class CascadeStats:
+    candidates: int  # candidatos fusionados disponibles
+    pairs: int  # pares que pasaron por el CrossEncoder
+    steps: int
+    stop: str  # "settled" | "exhausted" | "max_pairs" | "max_ms"
+    agreement: float  # acuerdo final entre CrossEncoder y fusión en el top_final
+    ms: float
+
+
+class Cascade:
+    def __init__(self, ids: np.ndarray, top_final: int, policy: CascadePolicy):
+        self.ids = ids
+        self.top_final = top_final
+        self.policy = policy
+        self.scores = np.zeros(0)
+        self.steps = 0
+        self.stop: Optional[str] = None
+        self._t0 = time.perf_counter()
+
+    @property
+    def done(self) -> bool:
+        return self.stop is not None
+
+    def _agreement(self) -> float:
+        k = min(self.top_final, len(self.scores))
+        if k == 0:
+            return 0.0
+        top = np.argsort(-self.scores, kind="stable")[:k]
+        return float((top < k).sum()) / k  # posiciones < k = top_k de la fusión
+
+    def _settled(self) -> bool:
+        n, k = len(self.scores), self.top_final
+        if n <= k:
+            return False
+        kth = np.partition(self.scores, n - k)[n - k]
+        tail = self.scores[max(k, n - self.policy.step):]
+        return tail.max() < kth - self.policy.margin and self._agreement() >= self.policy.agreement
+
+    def next(self) -> np.ndarray:
+        """Slots del próximo tramo a puntuar (vacío si la cascada terminó)."""
+        if self.stop is None:
+            p, n = self.policy, len(self.scores)
+            if n == 0:
+                want = max(p.prefix, self.top_final)
+            elif n >= len(self.ids):
+                self.stop = "exhausted"
+            elif p.max_pairs is not None and n >= p.max_pairs:
+                self.stop = "max_pairs"
+            elif p.max_ms is not None and (time.perf_counter() - self._t0) * 1000.0 >= p.max_ms:
+                self.stop = "max_ms"
+            elif self._settled():
+                self.stop = "settled"
+            else:
+                want = p.step
+            if self.stop is None:
+                if p.max_pairs is not None:
+                    want = min(want, p.max_pairs - n)
+                tranche = self.ids[n:n + want]
+                if len(tranche):
+                    return tranche
+                self.stop = "exhausted"
+        return self.ids[:0]
+
+    def feed(self, scores: np.ndarray):
+        self.scores = np.concatenate([self.scores, np.asarray(scores, dtype=np.float64)])
+        self.steps += 1
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(slots puntuados, sus scores) en el orden de la fusión."""
+        return self.ids[:len(self.scores)], self.scores
+
+    def stats(self) -> CascadeStats:
+        return CascadeStats(len(self.ids), len(self.scores), self.steps, self.stop or "", self._agreement(),
+                            (time.perf_counter() - self._t0) * 1000.0)
+
+
+def summarize(stats: Iterable[CascadeStats]) -> Dict:
+    """Resumen para ajustar la política: pares por query, fracción ahorrada y motivos de corte."""
+    stats = list(stats)
+    if not stats:
+        return {"queries": 0}
+    pairs = np.array([s.pairs for s in stats], dtype=float)
+    cands = np.array([s.candidates for s in stats], dtype=float)
+    return {
+        "queries": len(stats),
+        "pairs_mean": float(pairs.mean()),
+        "pairs_p95": float(np.percentile(pairs, 95)),
+        "pairs_saved": float(1.0 - pairs.sum() / cands.sum()) if cands.sum() else 0.0,
+        "steps_mean": float(np.mean([s.steps for s in stats])),
+        "ms_p50": float(np.percentile([s.ms for s in stats], 50)),
+        "agreement_mean": float(np.mean([s.agreement for s in stats])),
+        "stop": dict(Counter(s.stop for s in stats)),
+    }
+
@@ -0,0 +1,52 @@
+"""
+Caché de chunks direccionada por contenido
+------------------------------------------
+- La clave es un hash del texto del documento + parámetros de chunking
+  (max_tokens, overlap) + CHUNKER_VERSION: si algo cambia, la clave cambia.
+- Se guarda en disco (un JSON por clave) y la comparten documents_to_chunks,
+  RagPipeline y los scripts de ingesta: re-ingerir un corpus sin cambios no re-chunkea.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Union
+import hashlib
+import json
+import os
+import tempfile
+from .documents import CHUNKER_VERSION
+
+
+class ChunkCache:
+    def __init__(self, folder: Union[str, Path]):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, max_tokens: int, overlap: int) -> str:
+        h = hashlib.sha256(f"chunker-v{CHUNKER_VERSION}|{max_tokens}|{overlap}|".encode("utf-8"))
+        h.update((text or "").encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.folder / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[str]]:
+        try:
+            with self._path(key).open("r", encoding="utf-8") as f:
+                chunks = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return chunks
+
+    def put(self, key: str, chunks: List[str]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # escritura atómica: otro proceso nunca ve un archivo a medio escribir
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(chunks, f, ensure_ascii=False)
+        os.replace(tmp, path)
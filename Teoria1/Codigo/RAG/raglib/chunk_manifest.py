@@ -0,0 +1,58 @@
+"""
+Manifiesto de chunks para re-ingesta incremental
+------------------------------------------------
+- Guarda chunk_id -> hash del contenido (texto + metadatos) de lo que ya está en el índice vectorial.
+- diff() compara contra los chunks nuevos y devuelve qué hay que subir y qué borrar,
+  así una corrección en una página no re-embebe ni re-sube todo el corpus.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import hashlib
+import json
+import os
+import tempfile
+
+
+def chunk_hash(meta: Dict) -> str:
+    """Hash del contenido de un chunk: texto + metadatos que se suben con el vector."""
+    payload = json.dumps(meta, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ChunkManifest:
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.hashes: Dict[str, str] = {}
+        if self.path.exists():
+            self.hashes = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def diff(self, ids: List[str], hashes: List[str]) -> Tuple[List[int], List[int], List[str]]:
+        """
+        -> (posiciones de chunks nuevos, posiciones de chunks modificados, ids que ya no existen).
+        Las posiciones son índices en ids/hashes.
+        """
+        added, changed = [], []
+        for i, (cid, h) in enumerate(zip(ids, hashes)):
+            old = self.hashes.get(cid)
+            if old is None:
+                added.append(i)
+            elif old != h:
+                changed.append(i)
+        current = set(ids)
+        removed = [cid for cid in self.hashes if cid not in current]
+        return added, changed, removed
+
+    def replace(self, ids: List[str], hashes: List[str]):
+        self.hashes = dict(zip(ids, hashes))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # escritura atómica: si el proceso se corta, queda el manifiesto anterior
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,299 @@
+"""
+Almacén columnar de chunks
+--------------------------
+Una sola copia de cada chunk, referenciada por índice entero (slot) desde BM25, el pipeline
+y los índices vectoriales:
+- textos en un buffer UTF-8 contiguo + offsets,
+- doc_id, índice local, source y page en arrays paralelos (doc_id y source internados).
+Es de sólo-agregar: reemplazar un documento agrega slots nuevos y los viejos quedan
+sin referencias (se descartan al guardar con take()).
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+import numpy as np
+from .storage import load_array, load_strings, save_array, save_strings
+import hashlib
+
+
+class _Growable:
+    """Array 1-D con capacidad extra (append amortizado); la base puede venir memory-mapped."""
+
+    def __init__(self, dtype, base: Optional[np.ndarray] = None):
+        self._arr = base if base is not None else np.zeros(0, dtype=dtype)
+        self._n = len(self._arr)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._arr[:self._n]
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._arr.dtype)
+        need = self._n + len(values)
+        if need > len(self._arr) or not self._arr.flags.writeable:
+            arr = np.zeros(max(need, 2 * len(self._arr), 1024), dtype=self._arr.dtype)
+            arr[:self._n] = self._arr[:self._n]  # copy-on-write si venía memory-mapped
+            self._arr = arr
+        self._arr[self._n:need] = values
+        self._n = need
+
+
+class _Interned:
+    """Lista de strings distintos + índice string -> posición."""
+
+    def __init__(self, items: Iterable[str] = ()):
+        self.items: List[str] = list(items)
+        self._index: Dict[str, int] = {s: i for i, s in enumerate(self.items)}
+
+    def __call__(self, value: str) -> int:
+        i = self._index.get(value)
+        if i is None:
+            i = self._index[value] = len(self.items)
+            self.items.append(value)
+        return i
+
+
+class SlotView(Sequence):
+    """Vista de sólo lectura slot -> valor sobre el almacén (sin copiar)."""
+
+    def __init__(self, n: Callable[[], int], get: Callable[[int], object]):
+        self._n, self._get = n, get
+
+    def __len__(self) -> int:
+        return self._n()
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self._get(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._get(i)
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self)):
+            yield self._get(i)
+
+
+class ChunkStore:
+    def __init__(self):
+        self._base_buf = np.zeros(0, dtype=np.uint8)  # textos cargados (posiblemente memory-mapped)
+        self._buf = _Growable(np.uint8)               # textos agregados después de cargar
+        self._off = _Growable(np.int64, np.zeros(1, dtype=np.int64))
+        self._doc = _Growable(np.int32)
+        self._local = _Growable(np.int32)
+        self._source = _Growable(np.int32)
+        self._page = _Growable(np.int32)              # -1 = sin página
+        self.doc_names = _Interned()
+        self.sources = _Interned()
+
+    def __len__(self) -> int:
+        return len(self._doc)
+
+    def append(
+        self, doc_id: str, chunks: Sequence[str], source: str = "", page: Optional[int] = None,
+        local: Optional[Sequence[int]] = None,  # índice local de cada chunk (por defecto 0..n-1)
+    ) -> range:
+        """Agrega los chunks de un documento y devuelve sus slots."""
+        first, n = len(self), len(chunks)
+        encoded = [c.encode("utf-8") for c in chunks]
+        ends = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        self._off.extend(self._off.values[-1] + ends)
+        self._buf.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self._doc.extend(np.full(n, self.doc_names(doc_id)))
+        self._local.extend(np.arange(n) if local is None else local)
+        self._source.extend(np.full(n, self.sources(source or "")))
+        self._page.extend(np.full(n, -1 if page is None else page))
+        return range(first, first + n)
+
+    def add_chunks(self, chunks_per_doc: Mapping[str, Sequence[str]], docs_meta: Dict[str, Dict]) -> np.ndarray:
+        """Agrega {doc_id: [chunks]} con source/page de docs_meta; devuelve los slots en orden."""
+        slots: List[range] = []
+        for doc_id, chunks in chunks_per_doc.items():
+            dm = docs_meta.get(doc_id, {}) or {}
+            slots.append(self.append(doc_id, chunks, dm.get("source", ""), dm.get("page", None)))
+        return np.fromiter((s for r in slots for s in r), dtype=np.int64)
+
+    def extend_from(self, other: "ChunkStore", slots: Iterable[int]) -> np.ndarray:
+        """Copia slots de otro almacén (con su doc_id/local_idx originales); devuelve los slots nuevos."""
+        first = len(self)
+        slots = [int(s) for s in slots]
+        encoded = [other.text(s).encode("utf-8") for s in slots]
+        self._off.extend(self._off.values[-1] + np.cumsum([len(b) for b in encoded], dtype=np.int64))
+        self._buf.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self._doc.extend([self.doc_names(other.doc_id(s)) for s in slots])
+        self._local.extend([other.local_idx(s) for s in slots])
+        self._source.extend([self.sources(other.source(s)) for s in slots])
+        self._page.extend(other._page.values[slots] if slots else [])
+        return np.arange(first, len(self), dtype=np.int64)
+
+    # acceso por slot
+
+    def text(self, i: int) -> str:
+        off = self._off.values
+        lo, hi = int(off[i]), int(off[i + 1])
+        nb = len(self._base_buf)
+        if hi <= nb:
+            return bytes(self._base_buf[lo:hi]).decode("utf-8")
+        return bytes(self._buf.values[lo - nb:hi - nb]).decode("utf-8")
+
+    def text_nbytes(self, slots: np.ndarray) -> np.ndarray:
+        """Largo en bytes de cada texto (sin decodificar)."""
+        off = self._off.values
+        return off[np.asarray(slots) + 1] - off[np.asarray(slots)]
+
+    def doc_codes(self, slots: np.ndarray) -> np.ndarray:
+        """Código entero del documento de cada slot (mismo doc_id -> mismo código)."""
+        return self._doc.values[np.asarray(slots, dtype=np.int64)]
+
+    def doc_id(self, i: int) -> str:
+        return self.doc_names.items[self._doc.values[i]]
+
+    def local_idx(self, i: int) -> int:
+        return int(self._local.values[i])
+
+    def source(self, i: int) -> str:
+        return self.sources.items[self._source.values[i]]
+
+    def page(self, i: int) -> Optional[int]:
+        p = int(self._page.values[i])
+        return None if p < 0 else p
+
+    def meta(self, i: int, with_text: bool = True) -> Dict:
+        """Dict de metadatos armado al vuelo (mismo formato que el registro de los buscadores)."""
+        meta = {"doc_id": self.doc_id(i), "local_idx": self.local_idx(i), "source": self.source(i), "page": self.page(i)}
+        if with_text:
+            meta["text"] = self.text(i)
+        return meta
+
+    def content_hash(self, slots: Iterable[int]) -> str:
+        """Hash de (doc_id, source, page, texto) de esos slots: el mismo corpus da el mismo hash en cualquier proceso."""
+        h = hashlib.blake2b(digest_size=16)
+        for s in np.asarray(slots, dtype=np.int64).tolist():
+            h.update(f"{self.doc_id(s)}\x1f{self.source(s)}\x1f{self.page(s)}\x1f{self.text(s)}\x1e".encode("utf-8"))
+        return h.hexdigest()
+
+    def values(self, field: str, slots: np.ndarray) -> np.ndarray:
+        """Columna de metadatos para varios slots (array object, p. ej. para filtros)."""
+        slots = np.asarray(slots, dtype=np.int64)
+        if field == "doc_id":
+            return np.array(self.doc_names.items, dtype=object)[self._doc.values[slots]]
+        if field == "source":
+            return np.array(self.sources.items, dtype=object)[self._source.values[slots]]
+        if field == "local_idx":
+            return self._local.values[slots].astype(object)
+        if field == "page":
+            pages = self._page.values[slots].astype(object)
+            pages[self._page.values[slots] < 0] = None
+            return pages
+        out = np.full(len(slots), None, dtype=object)
+        if field == "text":
+            out[:] = [self.text(s) for s in slots.tolist()]
+        return out
+
+    @property
+    def texts(self) -> SlotView:
+        return SlotView(self.__len__, self.text)
+
+    @property
+    def doc_ids(self) -> SlotView:
+        return SlotView(self.__len__, self.doc_id)
+
+    @property
+    def locations(self) -> SlotView:
+        """slot -> (doc_id, local_idx)."""
+        return SlotView(self.__len__, lambda i: (self.doc_id(i), self.local_idx(i)))
+
+    # persistencia
+
+    def take(self, slots: Iterable[int]) -> "ChunkStore":
+        """Almacén nuevo sólo con esos slots, renumerados en orden."""
+        out = ChunkStore()
+        out.extend_from(self, slots)
+        return out
+
+    def save(self, folder: Path, name: str = "chunks"):
+        save_strings(folder, f"{name}_text", (self.text(i) for i in range(len(self))))
+        save_array(folder, f"{name}_doc", self._doc.values)
+        save_array(folder, f"{name}_local", self._local.values)
+        save_array(folder, f"{name}_source", self._source.values)
+        save_array(folder, f"{name}_page", self._page.values)
+        save_strings(folder, f"{name}_doc_names", self.doc_names.items)
+        save_strings(folder, f"{name}_sources", self.sources.items)
+
+    @classmethod
+    def load(cls, folder: Path, name: str = "chunks", mmap: bool = True) -> "ChunkStore":
+        self = cls()
+        self._base_buf = load_array(folder, f"{name}_text_bytes", mmap)
+        self._off = _Growable(np.int64, load_array(folder, f"{name}_text_offsets", mmap))
+        for col in ("doc", "local", "source", "page"):
+            setattr(self, f"_{col}", _Growable(np.int32, load_array(folder, f"{name}_{col}", mmap)))
+        self.doc_names = _Interned(load_strings(folder, f"{name}_doc_names"))
+        self.sources = _Interned(load_strings(folder, f"{name}_sources"))
+        return self
+
+
+class ChunkRegistry(Mapping):
+    """
+    Registro chunk_id -> metadatos de los buscadores vectoriales. Sólo guarda chunk_id -> slot;
+    el dict de metadatos (doc_id, local_idx, source, page, text) se arma al consultar.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self.slots: Dict[str, int] = {}
+        self.shared = False  # store es de otro (p. ej. RagPipeline): no se le agregan chunks
+
+    def __getitem__(self, chunk_id: str) -> Dict:
+        return self.store.meta(self.slots[chunk_id])
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.slots)
+
+    def __contains__(self, chunk_id) -> bool:
+        return chunk_id in self.slots
+
+    def adopt(self, store: ChunkStore, slots: np.ndarray) -> np.ndarray:
+        """
+        Slots válidos en self.store para chunks que viven en store: si es el mismo almacén
+        (o el registro está vacío y se pasa a compartir el de afuera) no se copia nada.
+        """
+        if store is not self.store:
+            if self.slots:
+                return self.store.extend_from(store, slots)
+            self.store = store
+            self.shared = True
+        return np.asarray(slots, dtype=np.int64)
+
+    def detach(self) -> np.ndarray:
+        """
+        Pasa a un almacén propio con una copia de los chunks registrados, para poder agregar
+        chunks sin tocar el compartido. Devuelve slot viejo -> slot nuevo (-1 = no registrado).
+        """
+        old = self.store
+        if not self.shared:
+            return np.arange(len(old), dtype=np.int64)
+        ids = list(self.slots)
+        src = np.fromiter(self.slots.values(), dtype=np.int64, count=len(ids))
+        remap = np.full(len(old), -1, dtype=np.int64)
+        self.store, self.shared = ChunkStore(), False
+        remap[src] = self.store.extend_from(old, src)
+        self.slots = dict(zip(ids, remap[src].tolist()))
+        return remap
+
+    def set(self, chunk_ids: Iterable[str], slots: Iterable[int]):
+        self.slots.update(zip(chunk_ids, (int(s) for s in slots)))
+
+    def pop(self, chunk_id: str, default=None):
+        slot = self.slots.pop(chunk_id, None)
+        return default if slot is None else self.store.meta(slot)
+
+    def clear(self):
+        self.slots.clear()
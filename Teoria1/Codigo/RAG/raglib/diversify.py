@@ -0,0 +1,49 @@
+"""
+Diversificación por MMR (maximal marginal relevance)
+----------------------------------------------------
+Elige k candidatos maximizando  lambda * relevancia - (1 - lambda) * similitud máxima con los ya elegidos.
+- Similitud: coseno entre embeddings normalizados (una sola matriz n x n por query).
+- Relevancia: por defecto la posición en la lista fusionada (1 para el primero, ~0 para el último),
+  así MMR respeta el ranking híbrido (BM25 + vectorial) en lugar de sólo la similitud con la query.
+- threshold descarta directamente los casi duplicados (p. ej. el mismo párrafo en dos páginas de un PDF).
+"""
+
+from typing import Optional
+import numpy as np
+
+
+def rank_relevance(n: int) -> np.ndarray:
+    """Relevancia lineal por posición: 1, ..., 1/n."""
+    return 1.0 - np.arange(n, dtype=np.float32) / max(n, 1)
+
+
+def mmr(
+    vecs: np.ndarray,  # (n, d) embeddings normalizados de los candidatos, en orden de ranking
+    k: int,
+    lambda_: float = 0.7,
+    relevance: Optional[np.ndarray] = None,  # (n,) mayor = más relevante; None = rank_relevance
+    threshold: Optional[float] = None,  # similitud a partir de la cual un candidato es duplicado
+) -> np.ndarray:
+    """Índices (en vecs) de los elegidos, en orden de selección."""
+    n = len(vecs)
+    if relevance is None:
+        relevance = rank_relevance(n)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    sim = vecs @ vecs.T
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    avail = np.ones(n, dtype=bool)
+    chosen = []
+    for t in range(k):
+        score = lambda_ * relevance - (1.0 - lambda_) * (max_sim if t else 0.0)
+        if threshold is not None and t:
+            avail &= max_sim < threshold
+        score = np.where(avail, score, -np.inf)
+        j = int(np.argmax(score))
+        if not avail[j]:
+            break  # el resto son duplicados
+        chosen.append(j)
+        avail[j] = False
+        max_sim = np.maximum(max_sim, sim[j])
+    return np.asarray(chosen, dtype=np.int64)
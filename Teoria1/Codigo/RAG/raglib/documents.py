@@ -1,7 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence
+import os
 import re
 import unicodedata
+import numpy as np
+
+if TYPE_CHECKING:
+    from .chunk_cache import ChunkCache
+
+# subir cuando cambie la salida de chunk_text / chunk_with_fallback (invalida ChunkCache)
+CHUNKER_VERSION = "1"
 
 @dataclass
 class Document:
@@ -17,8 +26,6 @@ def simple_tokenize(text: str) -> List[str]:
     return _TOKEN_RE.findall((text or "").lower())
 
 # utilidades para chunking basado en oraciones 
-# divide en oraciones simples: punto/exclamación/interrogación + espacio + mayúscula
-_SENT_SPLIT = re.compile(r"(?<=[\.\!\?])\s+(?=[A-ZÁÉÍÓÚÑ])")
 _SOFT_HYPH = re.compile(r"[\u00AD]")               # soft hyphen
 _HARD_HYPH = re.compile(r"(\w)-\n(\w)")            # palabra-\ncontinuación
 
@@ -32,76 +39,118 @@ def _normalize(text: str) -> str:
     t = re.sub(r"\s+", " ", t).strip()
     return t
 
-def _split_sentences(text: str) -> List[str]:
-    if not text:
-        return []
-    # no asumimos que todo empiece en mayúscula; si no hay cortes, devolvemos el texto entero
-    parts = _SENT_SPLIT.split(text.strip())
-    if len(parts) <= 1:
-        return [text.strip()]
-    # limpiar espacios
-    return [" ".join(p.split()) for p in parts if p.strip()]
-
-def _count_tokens(t: str) -> int:
-    return len(simple_tokenize(t))
-
-def _slide_merge(sents: List[str], max_tok: int, overlap: int) -> List[str]:
+# oraciones: punto/exclamación/interrogación + espacio + mayúscula (sobre texto normalizado)
+_SENT_START = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZÁÉÍÓÚÑ")
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def _word_token_counts(norm: str) -> np.ndarray:
+    """
+    Tokens por palabra (palabras = norm separado por espacios) con una sola pasada del
+    tokenizador sobre la página: cada token se reemplaza por una "t" y se cuentan por palabra.
+    Ningún token cruza un espacio, así que el conteo de cualquier secuencia de palabras
+    es la suma de sus conteos.
     """
-    Arma chunks concatenando oraciones hasta max_tok.
-    Aplica solapamiento de ~overlap tokens usando la cola del chunk previo.
-    Hace split adicional por ; : si una oración es enorme.
+    cps = _codepoints(_TOKEN_RE.sub("t", norm.lower()))
+    word_of = np.cumsum(cps == 32)
+    return np.bincount(word_of[cps == ord("t")], minlength=int(word_of[-1]) + 1)
+
+def _sentence_bounds(norm: str, n_words: int) -> List[int]:
+    """Índices de palabra donde empieza cada oración (+ n_words al final)."""
+    cps = _codepoints(norm)
+    sp = np.flatnonzero(cps == 32)  # norm está compactado: un espacio entre palabras
+    prev = cps[sp - 1]
+    cand = np.flatnonzero((prev == ord(".")) | (prev == ord("!")) | (prev == ord("?")))
+    cuts = [int(k) + 1 for k in cand if norm[sp[k] + 1] in _SENT_START]
+    return [0] + cuts + [n_words]
+
+def iter_chunks(text: str, max_tokens: int = 200, overlap: int = 60) -> Iterator[str]:
     """
-    chunks: List[str] = []
-    buf: List[str] = []
+    Chunking basado en oraciones, como generador y tokenizando la página una sola vez.
+    Arma chunks concatenando oraciones hasta max_tokens; si una oración es enorme la parte
+    por ; : y recorta. Cada chunk es una lista de ids de palabra: los conteos salen de sumas
+    de prefijos y el solapamiento (~overlap palabras) es un slice del chunk anterior.
+    """
+    if not text:
+        return
+    norm = _normalize(text)
+    if not norm:
+        return
+    words = norm.split(" ")
+    counts = _word_token_counts(norm)
+    prefix = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(counts, out=prefix[1:])
+    texts: List[str] = words          # texto por id de palabra (+ variantes sin ; : final)
+    cnt: List[int] = counts.tolist()  # tokens por id de palabra
+
+    cap = max_tokens + 20
+    buf: List[int] = []
     buf_tokens = 0
+    last: Optional[List[int]] = None  # último chunk armado (aunque no pase el filtro final)
 
-    def flush():
-        nonlocal buf, buf_tokens
+    def flush() -> Optional[str]:
+        nonlocal buf, buf_tokens, last
+        out = None
         if buf_tokens >= 40:  # mínimo útil
-            txt = " ".join(buf).split()
-            # hard cap suave (max_tok + 20)
-            if len(txt) > max_tok + 20:
-                txt = txt[:max_tok + 20]
-            chunks.append(" ".join(txt))
+            # hard cap suave (max_tok + 20 palabras)
+            last = buf[:cap]
+            nt = buf_tokens if len(buf) <= cap else sum(map(cnt.__getitem__, last))
+            # filtro final de longitud: descarta < 20 tokens y > 220 tokens
+            if 20 <= nt <= 220:
+                out = " ".join(map(texts.__getitem__, last))
         buf, buf_tokens = [], 0
+        return out
+
+    def push(ids: List[int], nt: int) -> Optional[str]:
+        nonlocal buf, buf_tokens
+        out = None
+        if buf_tokens + nt > max_tokens:
+            out = flush()
+            if last is not None:
+                # overlap: tomar cola del último chunk
+                buf = last[-overlap:]
+                buf_tokens = sum(map(cnt.__getitem__, buf))
+        buf.extend(ids)
+        buf_tokens += nt
+        return out
 
-    for s in sents:
-        st = _count_tokens(s)
-        # si una oración es enorme, intentá partir por ; :
-        if st > max_tok:
-            pieces = re.split(r"[;:]\s+", s)
-            for p in pieces:
-                pt = _count_tokens(p)
-                if pt == 0:
-                    continue
-                if pt > max_tok:
-                    # si sigue siendo enorme, recortá
-                    p = " ".join(p.split()[:max_tok])
-                    pt = _count_tokens(p)
-                if buf_tokens + pt <= max_tok:
-                    buf.append(p); buf_tokens += pt
-                else:
-                    flush()
-                    # overlap: tomar cola del último chunk
-                    if chunks:
-                        tail = " ".join(chunks[-1].split()[-overlap:])
-                        buf, buf_tokens = [tail], _count_tokens(tail)
-                    buf.append(p); buf_tokens += pt
+    bounds = _sentence_bounds(norm, len(words))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        st = int(prefix[b] - prefix[a])
+        if st <= max_tokens:
+            ch = push(range(a, b), st)
+            if ch is not None:
+                yield ch
             continue
 
-        # caso normal
-        if buf_tokens + st <= max_tok:
-            buf.append(s); buf_tokens += st
-        else:
-            flush()
-            if chunks:
-                tail = " ".join(chunks[-1].split()[-overlap:])
-                buf, buf_tokens = [tail], _count_tokens(tail)
-            buf.append(s); buf_tokens += st
+        # si una oración es enorme, partir por ; : (el separador se descarta)
+        pieces: List[List[int]] = [[]]
+        for j in range(a, b):
+            if j < b - 1 and words[j].endswith((";", ":")):
+                if len(words[j]) > 1:
+                    texts.append(words[j][:-1])
+                    cnt.append(cnt[j])
+                    pieces[-1].append(len(texts) - 1)
+                pieces.append([])
+            else:
+                pieces[-1].append(j)
+        for piece in pieces:
+            pt = sum(map(cnt.__getitem__, piece))
+            if pt == 0:
+                continue
+            if pt > max_tokens:
+                # si sigue siendo enorme, recortá
+                piece = piece[:max_tokens]
+                pt = sum(map(cnt.__getitem__, piece))
+            ch = push(piece, pt)
+            if ch is not None:
+                yield ch
 
     if buf:
-        flush()
-    return chunks
+        ch = flush()
+        if ch is not None:
+            yield ch
 
 def chunk_text(text: str, max_tokens: int = 200, overlap: int = 60) -> List[str]:
     """
@@ -111,18 +160,64 @@ def chunk_text(text: str, max_tokens: int = 200, overlap: int = 60) -> List[str]
       - descarta chunks < 20 tokens
       - recorta > 220 tokens
     """
-    if not text:
-        return []
-    norm = _normalize(text)
-    sents = _split_sentences(norm)
-    if not sents:
-        return []
-    chunks = _slide_merge(sents, max_tok=max_tokens, overlap=overlap)
-
-    # filtro final de longitud
-    out: List[str] = []
-    for ch in chunks:
-        nt = _count_tokens(ch)
-        if 20 <= nt <= 220:  
-            out.append(ch)
-    return out
+    return list(iter_chunks(text, max_tokens, overlap))
+
+def chunk_with_fallback(text: str, max_tokens: int = 400, overlap: int = 100) -> List[str]:
+    """
+    chunk_text + respaldo para páginas cortas: si chunk_text() devuelve [],
+    genera un solo chunk recortado a ~max_tokens palabras para que el doc no quede fuera del índice.
+    """
+    chunks = chunk_text(text, max_tokens, overlap)
+    if not chunks:
+        words = (text or "").split()
+        if words:
+            chunks = [" ".join(words[:max_tokens])]
+    return chunks
+
+# por debajo de este volumen de texto el arranque del pool cuesta más de lo que ahorra
+_PARALLEL_MIN_CHARS = 1_000_000
+
+def _chunk_batch(args) -> List[List[str]]:
+    texts, max_tokens, overlap = args
+    return [chunk_with_fallback(t, max_tokens, overlap) for t in texts]
+
+def _chunk_texts(texts: List[str], max_tokens: int, overlap: int, workers: int) -> List[List[str]]:
+    sizes = np.fromiter((len(t or "") for t in texts), dtype=np.int64, count=len(texts))
+    if workers <= 1 or len(texts) < 2 or sizes.sum() < _PARALLEL_MIN_CHARS:
+        return _chunk_batch((texts, max_tokens, overlap))
+
+    # cortes por volumen acumulado: ~4 lotes por worker para balancear la carga
+    n_batches = min(len(texts), workers * 4)
+    cum = np.cumsum(sizes)
+    cuts = np.searchsorted(cum, cum[-1] * np.arange(1, n_batches) / n_batches, side="right")
+    edges = np.unique(np.concatenate([[0], cuts, [len(texts)]]))
+    batches = [(texts[lo:hi], max_tokens, overlap) for lo, hi in zip(edges[:-1].tolist(), edges[1:].tolist())]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return [chunks for batch in ex.map(_chunk_batch, batches) for chunks in batch]
+
+def chunk_documents(
+    docs: Sequence[Document],
+    max_tokens: int = 400,
+    overlap: int = 100,
+    workers: Optional[int] = 1,
+    cache: Optional["ChunkCache"] = None,
+) -> Dict[str, List[str]]:
+    """
+    Chunkea documentos -> {doc_id: [chunk1, chunk2, ...]} en el orden original.
+    Con workers > 1 (None = todos los núcleos) reparte los textos en un pool de procesos,
+    en lotes contiguos de tamaño (caracteres) parecido; corpus chicos van por el camino serial.
+    Con cache (ChunkCache) sólo se chunkean los textos que no estaban cacheados.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    texts = [d.text for d in docs]
+    if cache is None:
+        results = _chunk_texts(texts, max_tokens, overlap, workers)
+    else:
+        keys = [cache.key(t, max_tokens, overlap) for t in texts]
+        results = [cache.get(k) for k in keys]
+        miss = [i for i, r in enumerate(results) if r is None]
+        fresh = _chunk_texts([texts[i] for i in miss], max_tokens, overlap, workers)
+        for i, chunks in zip(miss, fresh):
+            results[i] = chunks
+            cache.put(keys[i], chunks)
+    return {d.id: chunks for d, chunks in zip(docs, results)}
@@ -0,0 +1,237 @@
+"""
+Caché persistente de embeddings
+-------------------------------
+- Clave: hash de 64 bits de (modelo, normalize_embeddings, texto).
+- En disco: segmentos inmutables (matriz .npy float32/float16 memory-mapped + array de claves);
+  el índice en memoria es el array de claves ordenado (búsqueda por searchsorted).
+- Los embeddings nuevos quedan en memoria hasta flush(), que escribe un segmento nuevo
+  (y compacta si hay demasiados). Sólo se guardan los de la ingesta (upsert/sync, que hacen
+  flush); los que se piden en el camino de consulta (persist=False, p. ej. MMR) no se acumulan.
+- Las queries no se persisten: van a un LRU en memoria.
+- Una carpeta puede compartirse entre modelos, siempre que tengan la misma dimensión, y entre
+  procesos (p. ej. la ingesta y el pipeline): flush() publica meta.json bajo un lock de archivo
+  (meta.lock), sumando los segmentos que hayan publicado los demás; la compactación borra los
+  segmentos viejos recién después de publicar el manifiesto nuevo.
+- Un mismo objeto puede usarse desde varios hilos.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+from .storage import load_array, save_array
+
+_FORMAT = "embedding-cache-v1"
+_LOCK_STALE = 300.0  # segundos: un meta.lock más viejo quedó de un proceso que murió
+
+
+def embedding_key(model_name: str, normalize: bool, text: str) -> int:
+    h = hashlib.blake2b(f"{model_name}|{int(normalize)}|".encode("utf-8"), digest_size=8)
+    h.update((text or "").encode("utf-8"))
+    return int.from_bytes(h.digest(), "little")
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        folder: Union[str, Path],
+        dtype: str = "float32",   # "float16" ocupa la mitad (con pérdida de precisión)
+        query_cache_size: int = 4096,
+        max_segments: int = 8,
+        mmap: bool = True,
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"dtype inválido: {dtype!r} (usar 'float32' o 'float16')")
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.query_cache_size = query_cache_size
+        self.max_segments = max_segments
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self._queries: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._pending: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()  # LRU de queries, pendientes, contadores y el índice publicado
+        self._flush_lock = threading.Lock()  # un flush a la vez dentro del proceso
+        with self._folder_lock():
+            self._segments = self._read_manifest()
+            self._keys, self._seg, self._row, self._vecs = self._load_index(self._segments)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys) + len(self._pending)
+
+    @contextmanager
+    def _folder_lock(self):
+        """Lock entre procesos sobre la carpeta (archivo creado con O_EXCL)."""
+        path = self.folder / "meta.lock"
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - path.stat().st_mtime > _LOCK_STALE:
+                        path.unlink(missing_ok=True)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.01)
+        os.close(fd)
+        try:
+            yield
+        finally:
+            path.unlink(missing_ok=True)
+
+    def _read_manifest(self) -> List[str]:
+        manifest = self.folder / "meta.json"
+        if not manifest.exists():
+            return []
+        meta = json.loads(manifest.read_text(encoding="utf-8"))
+        if meta.get("format") != _FORMAT:
+            raise ValueError(f"Formato de caché no soportado en {self.folder}: {meta.get('format')}")
+        return list(meta["segments"])
+
+    def _load_index(self, segments: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[np.ndarray]]:
+        """Arma el índice (claves ordenadas -> segmento, fila) desde los segmentos."""
+        vecs = [load_array(self.folder, f"{s}_vectors", self.mmap) for s in segments]
+        keys = [load_array(self.folder, f"{s}_keys", mmap=False) for s in segments]
+        seg = [np.full(len(k), i, dtype=np.int32) for i, k in enumerate(keys)]
+        row = [np.arange(len(k), dtype=np.int64) for k in keys]
+        keys_all = np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+        order = np.argsort(keys_all, kind="stable")
+        return (
+            keys_all[order],
+            np.concatenate(seg)[order] if seg else np.zeros(0, dtype=np.int32),
+            np.concatenate(row)[order] if row else np.zeros(0, dtype=np.int64),
+            vecs,
+        )
+
+    @staticmethod
+    def _lookup(index_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """Posición en el índice ordenado de cada clave (-1 si no está en disco)."""
+        if not len(index_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(index_keys, keys), len(index_keys) - 1)
+        return np.where(index_keys[pos] == keys, pos, -1)
+
+    def encode(
+        self, model, model_name: str, texts: Sequence[str], normalize: bool = True, query: bool = False,
+        persist: bool = True,
+    ) -> np.ndarray:
+        """
+        Como model.encode(texts, normalize_embeddings=normalize) pero sólo codifica los textos
+        que no estaban cacheados. Con query=True usa el LRU en memoria en lugar del disco.
+        Con persist=False se leen los cacheados pero los nuevos no quedan pendientes de flush().
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        keys = np.fromiter((embedding_key(model_name, normalize, t) for t in texts), dtype=np.uint64, count=len(texts))
+        out: List = [None] * len(texts)
+        with self._lock:
+            if query:
+                for i, k in enumerate(keys.tolist()):
+                    v = self._queries.get(k)
+                    if v is not None:
+                        self._queries.move_to_end(k)
+                        out[i] = v
+            else:
+                pos = self._lookup(self._keys, keys)
+                for i in np.flatnonzero(pos >= 0).tolist():
+                    out[i] = self._vecs[self._seg[pos[i]]][self._row[pos[i]]]
+                for i, k in enumerate(keys.tolist()):
+                    if out[i] is None and k in self._pending:
+                        out[i] = self._pending[k]
+            miss = [i for i, v in enumerate(out) if v is None]
+            if query:
+                self.query_hits += len(texts) - len(miss)
+                self.query_misses += len(miss)
+            else:
+                self.hits += len(texts) - len(miss)
+                self.misses += len(miss)
+        if miss:
+            # textos repetidos dentro del mismo batch se codifican una sola vez (fuera del lock)
+            uniq: Dict[int, int] = {}
+            for i in miss:
+                uniq.setdefault(int(keys[i]), i)
+            embs = model.encode([texts[i] for i in uniq.values()], convert_to_numpy=True, normalize_embeddings=normalize)
+            fresh = dict(zip(uniq, np.asarray(embs, dtype=np.float32)))
+            for i in miss:
+                out[i] = fresh[int(keys[i])]
+            with self._lock:
+                if query:
+                    for k, v in fresh.items():
+                        self._queries[k] = v
+                        self._queries.move_to_end(k)
+                    while len(self._queries) > self.query_cache_size:
+                        self._queries.popitem(last=False)
+                elif persist:
+                    self._pending.update((k, v.astype(self.dtype)) for k, v in fresh.items())
+        return np.stack(out).astype(np.float32, copy=False)
+
+    def flush(self):
+        """Escribe los embeddings pendientes como un segmento nuevo (y compacta si hace falta)."""
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+            if not pending:
+                return
+            name = f"seg_{uuid.uuid4().hex[:12]}"
+            keys = np.fromiter(pending.keys(), dtype=np.uint64, count=len(pending))
+            save_array(self.folder, f"{name}_vectors", np.stack(list(pending.values())).astype(self.dtype))
+            save_array(self.folder, f"{name}_keys", keys)
+            with self._folder_lock():
+                # los segmentos que publicaron otros procesos desde la última lectura se conservan
+                segments = [s for s in self._read_manifest() if s != name] + [name]
+                dropped: List[str] = []
+                if len(segments) > self.max_segments:
+                    segments, dropped = self._compact(segments), segments
+                self._write_manifest(segments)
+                index = self._load_index(segments)
+                for s in dropped:  # recién ahora: el manifiesto publicado ya no los referencia
+                    for part in ("vectors", "keys"):
+                        try:
+                            (self.folder / f"{s}_{part}.npy").unlink(missing_ok=True)
+                        except OSError:  # abierto por otro proceso (Windows): queda huérfano
+                            pass
+            with self._lock:
+                self._segments = segments
+                self._keys, self._seg, self._row, self._vecs = index
+                for k in pending:
+                    self._pending.pop(k, None)
+
+    def _compact(self, segments: List[str]) -> List[str]:
+        """Une esos segmentos en uno nuevo (descartando claves duplicadas); devuelve [nuevo]."""
+        keys, seg, row, vecs_in = self._load_index(segments)
+        uniq = np.concatenate([[True], keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, bool)
+        seg, row = seg[uniq], row[uniq]
+        vecs = np.empty((len(seg), vecs_in[0].shape[1]), dtype=self.dtype)
+        for i, v in enumerate(vecs_in):
+            vecs[seg == i] = v[row[seg == i]]
+        name = f"seg_{uuid.uuid4().hex[:12]}"
+        save_array(self.folder, f"{name}_vectors", vecs)
+        save_array(self.folder, f"{name}_keys", keys[uniq])
+        return [name]
+
+    def _write_manifest(self, segments: List[str]):
+        # meta.json se escribe al final y de forma atómica (archivo temporal propio de cada escritura):
+        # referencia sólo segmentos completos
+        fd, tmp = tempfile.mkstemp(dir=self.folder, prefix="meta.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"format": _FORMAT, "segments": segments}, indent=2))
+        os.replace(tmp, self.folder / "meta.json")
+
+    def clear_queries(self):
+        with self._lock:
+            self._queries.clear()
@@ -0,0 +1,101 @@
+"""
+Evaluación de recuperación en paralelo
+--------------------------------------
+- Las queries se reparten en lotes; cada lote hace retrieve_with_metadata_many + rerank_many
+  en un hilo (la búsqueda vectorial y el CrossEncoder liberan el GIL), así un lote re-rankea
+  mientras otro recupera.
+- Las métricas salen todas juntas de una matriz (queries x rangos) de relevancia (metrics.ir_metrics),
+  con labels graduados si los qrels son {query: {doc_id: label}}.
+- El resultado es columnar: un array por métrica (una fila por query y k), sin armar filas en Python.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Mapping, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from .metrics import ir_metrics, relevance_matrix
+
+
+def _doc_ids(rows) -> List[str]:
+    """IDs de documento en orden, sin repetidos (varios chunks del mismo documento cuentan una vez)."""
+    return list(dict.fromkeys(r[0] for r in rows))
+
+
+def run_queries(
+    pipeline,
+    queries: Sequence[str],
+    top_retrieve: int = 50,
+    top_final: int = 10,
+    batch_size: int = 64,
+    workers: int = 4,
+) -> Tuple[List[List[str]], List[List[str]]]:
+    """(documentos antes del re-ranqueo, documentos después) por query, procesando lotes en paralelo."""
+    def run(batch: List[str]):
+        cands = pipeline.retrieve_with_metadata_many(batch, top_k=top_retrieve)
+        rers = pipeline.reranker.rerank_many(batch, cands)
+        return [_doc_ids(c) for c in cands], [_doc_ids(r[:top_final]) for r in rers]
+
+    batches = [list(queries[i:i + batch_size]) for i in range(0, len(queries), batch_size)]
+    pre: List[List[str]] = []
+    post: List[List[str]] = []
+    if workers <= 1 or len(batches) <= 1:
+        results = map(run, batches)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval") as pool:
+            results = list(pool.map(run, batches))  # map conserva el orden de los lotes
+    for p, q in results:
+        pre.extend(p)
+        post.extend(q)
+    return pre, post
+
+
+def score_runs(
+    queries: Sequence[str],
+    runs: Mapping[str, Sequence[Sequence[str]]],  # {"pre": rankings, "post": rankings}
+    qrels: Mapping,
+    ks: Sequence[int] = (5, 10),
+) -> Dict[str, np.ndarray]:
+    """Columnas query, k y <métrica>_<run> (mrr no depende de k: se repite en cada k)."""
+    ks = list(ks)
+    judged = [qrels.get(q, ()) for q in queries]
+    cols: Dict[str, np.ndarray] = {
+        "query": np.repeat(np.asarray(queries, dtype=object), len(ks)),
+        "k": np.tile(np.asarray(ks), len(queries)),
+    }
+    mrrs = {}
+    for name, ranked in runs.items():
+        m = ir_metrics(relevance_matrix(ranked, judged), judged, ks)
+        for metric in ("precision", "recall", "ndcg"):
+            cols[f"{metric}_{name}"] = np.stack([m[f"{metric}@{k}"] for k in ks], axis=1).ravel()
+        mrrs[f"mrr_{name}"] = np.repeat(m["mrr"], len(ks))
+    cols.update(mrrs)
+    return cols
+
+
+def evaluate_pipeline(
+    pipeline,
+    qrels: Mapping,  # {query: set(doc_ids)} o {query: {doc_id: label}}
+    ks: Sequence[int] = (5, 10),
+    top_retrieve: int = 50,
+    top_final: int = 10,
+    batch_size: int = 64,
+    workers: int = 4,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(métricas por query y k, promedios macro por k), antes y después del re-ranqueo."""
+    queries = list(qrels.keys())
+    pre, post = run_queries(pipeline, queries, top_retrieve, top_final, batch_size, workers)
+    df = pd.DataFrame(score_runs(queries, {"pre": pre, "post": post}, qrels, ks))
+    agg = df.groupby("k").mean(numeric_only=True).reset_index()
+    return df, agg
+
+
+def save_results(df: pd.DataFrame, path: Union[str, Path]) -> Path:
+    """Guarda las métricas por query: .parquet (requiere pyarrow) o .csv."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
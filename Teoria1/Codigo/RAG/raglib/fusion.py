@@ -1,12 +1,103 @@
-from typing import List, Dict
+"""
+Fusión de rankings
+------------------
+Todo trabaja sobre arrays de ids enteros (y scores) con NumPy:
+- "rrf": Reciprocal Rank Fusion, con peso opcional por lista.
+- "minmax" / "zscore": combinación lineal de los scores normalizados por lista
+  (un candidato ausente en una lista toma el mínimo normalizado de esa lista).
+- top_k: selección parcial (argpartition) en lugar de ordenar toda la unión.
+Los empates se resuelven por primera aparición, como el dict de rrf_combine.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+
+
+def _normalize(scores: np.ndarray, method: str) -> np.ndarray:
+    if method == "minmax":
+        lo, hi = scores.min(), scores.max()
+        return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+    std = scores.std()
+    return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+
+
+def _top(uniq: np.ndarray, fused: np.ndarray, first: np.ndarray, top_k: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Mejores top_k por score (desc) y primera aparición; sólo ordena los candidatos del corte."""
+    if top_k is not None and top_k < len(uniq):
+        if top_k <= 0:
+            return uniq[:0], fused[:0]
+        kth = -np.partition(-fused, top_k - 1)[top_k - 1]
+        cut = np.flatnonzero(fused >= kth)  # incluye empates con el k-ésimo
+        order = cut[np.lexsort((first[cut], -fused[cut]))][:top_k]
+    else:
+        order = np.lexsort((first, -fused))
+    return uniq[order], fused[order]
+
+
+def fuse(
+    ranked_ids: Sequence[np.ndarray],
+    scores: Optional[Sequence[Optional[np.ndarray]]] = None,
+    method: str = "rrf",
+    weights: Optional[Sequence[float]] = None,
+    k: float = 60.0,
+    top_k: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fusiona listas de ids ordenadas (mejor primero) -> (ids, score fusionado), orden descendente.
+    scores (uno por lista, alineado con sus ids) es obligatorio para "minmax" y "zscore".
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Método de fusión inválido: {method!r} (usar {', '.join(FUSION_METHODS)})")
+    lists = [np.asarray(r, dtype=np.int64) for r in ranked_ids]
+    weights = [1.0] * len(lists) if weights is None else [float(w) for w in weights]
+    if len(weights) != len(lists):
+        raise ValueError(f"Se esperaban {len(lists)} pesos y llegaron {len(weights)}")
+    if not lists or not sum(len(r) for r in lists):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    ids = np.concatenate(lists)
+    uniq, first, inv = np.unique(ids, return_index=True, return_inverse=True)
+    if method == "rrf":
+        contrib = np.concatenate([w / (k + np.arange(len(r)) + 1.0) for r, w in zip(lists, weights)])
+        fused = np.bincount(inv, weights=contrib, minlength=len(uniq))
+    else:
+        if scores is None or len(scores) != len(lists) or any(s is None for s in scores):
+            raise ValueError(f"La fusión {method!r} necesita los scores de cada lista")
+        base, parts = 0.0, []
+        for r, s, w in zip(lists, scores, weights):
+            s = np.asarray(s, dtype=np.float64)
+            if len(s) != len(r):
+                raise ValueError("Cada lista de scores debe tener el mismo largo que sus ids")
+            if not len(s):
+                parts.append(s)
+                continue
+            norm = _normalize(s, method)
+            # ausente = mínimo normalizado de la lista: se suma como base y se descuenta a los presentes
+            base += w * norm.min()
+            parts.append(w * (norm - norm.min()))
+        fused = base + np.bincount(inv, weights=np.concatenate(parts), minlength=len(uniq))
+    return _top(uniq, fused, first, top_k)
+
+
+def rrf_combine_ids(*ranked_lists: np.ndarray, k: float = 60.0) -> np.ndarray:
+    """
+    rrf_combine sobre ids enteros (slots) con NumPy: mismo puntaje y mismo orden
+    (empates según la primera aparición, como el dict de rrf_combine).
+    """
+    return fuse(ranked_lists, k=k)[0]
+
 
 def rrf_combine(*ranked_lists: List[str], k: float = 60.0) -> List[str]:
     """
     Recibe múltiples listas ordenadas (BM25, vectorial, dense) y devuelve una lista fusionada usando RRF.
     """
-    scores: Dict[str, float] = {}
-    for ranked in ranked_lists:
-        for rank, item in enumerate(ranked):
-            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1.0)
-    sorted_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    return [item for item, _ in sorted_items]
+    items = [item for ranked in ranked_lists for item in ranked]
+    if not items:
+        return []
+    # strings -> códigos enteros, y la fusión corre vectorizada
+    names, codes = np.unique(np.array(items, dtype=object), return_inverse=True)
+    bounds = np.cumsum([0] + [len(r) for r in ranked_lists])
+    fused = rrf_combine_ids(*(codes[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])), k=k)
+    return names[fused].tolist()
@@ -20,3 +20,12 @@ def load_qrels_csv(path: Path) -> Dict[str, Set[str]]:
     for q, sub in df.groupby("query"):
         out[str(q)] = set(map(str, sub["doc_id"].tolist()))
     return out
+
+def load_qrels_graded_csv(path: Path) -> Dict[str, Dict[str, float]]:
+    """Como load_qrels_csv pero conservando el label: {query: {doc_id: label}} (sólo label > 0)."""
+    df = pd.read_csv(path)
+    df = df[df["label"] > 0]
+    out: Dict[str, Dict[str, float]] = {}
+    for q, d, l in zip(df["query"].astype(str), df["doc_id"].astype(str), df["label"].astype(float)):
+        out.setdefault(q, {})[d] = max(l, out.get(q, {}).get(d, 0.0))
+    return out
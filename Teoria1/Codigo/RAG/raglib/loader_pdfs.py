@@ -4,15 +4,22 @@ Loader de PDFs → Document + chunking
 - Lee PDFs con pdfplumber (página por página).
 - Limpia el texto (quita saltos raros/espacios).
 - Convierte cada página en un Document con metadatos: id, texto, source, page.
+- iter_pdf_documents reparte archivos (y tramos de páginas de los PDFs grandes) en un pool
+  de procesos y entrega los Document como generador, en orden determinista.
 """
 
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict
-from .documents import Document, chunk_text
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from .documents import Document, chunk_documents
+from .chunk_cache import ChunkCache
+import os
 import re
+import sys
+import time
 import unicodedata
-from typing import Iterable, Tuple
-
 
 
 # Librería para leer PDFs
@@ -23,6 +30,7 @@ except Exception as e:
         "Para usar loader_pdfs necesitás instalar pdfplumber:\n"
         "   pip install pdfplumber\n"
     ) from e
+from pdfminer.pdftypes import resolve1  # dependencia de pdfplumber
 
 
 _NONWORD = re.compile(r"[^A-Za-zÁÉÍÓÚÜÑáéíóúüñ0-9.,;:?!¿¡()\"'–—\-/%\[\]<> ]")
@@ -150,6 +158,26 @@ def _clean(text: str) -> str:
 
 
 
+def _page_documents(pdf, base_id: str, source: str) -> List[Document]:
+    """Documents de las páginas abiertas en pdf (todas, o las de pdfplumber.open(..., pages=...))."""
+    docs: List[Document] = []
+    for page in pdf.pages:
+        i = page.page_number  # número real en el archivo, también al abrir sólo un tramo
+        text = _clean(page.extract_text() or "")
+        page.close()  # libera la caché de objetos de la página (PDFs grandes)
+        if not text.strip():
+            continue
+        docs.append(
+            Document(
+                id=f"{base_id}_p{i}",       # identificador único del documento: usa el nombre base del archivo (sin .pdf) + "_p" + número de página (ej: contrato_p3)
+                text=text,                  # el texto ya limpio y normalizado de esa página (resultado de _clean(page.extract_text()))
+                source=source,              # nombre del PDF
+                page=i                      # número de página
+            )
+        )
+    return docs
+
+
 def pdf_to_documents(pdf_path: Path, doc_id_prefix: str = None) -> List[Document]:
     """
     Lee un PDF y devuelve una lista de Document:
@@ -159,42 +187,184 @@ def pdf_to_documents(pdf_path: Path, doc_id_prefix: str = None) -> List[Document
     if not pdf_path.exists():
         raise FileNotFoundError(f"No existe el archivo: {pdf_path}")
 
-    docs: List[Document] = []
-    base_id = (doc_id_prefix or pdf_path.stem)
-
     with pdfplumber.open(str(pdf_path)) as pdf:
-        for i, page in enumerate(pdf.pages, start=1):
-            text = _clean(page.extract_text() or "")
-            if not text.strip():
-                continue
-            docs.append(
-                Document(
-                    id=f"{base_id}_p{i}",       # identificador único del documento: usa el nombre base del archivo (sin .pdf) + "_p" + número de página (ej: contrato_p3)
-                    text=text,                  # el texto ya limpio y normalizado de esa página (resultado de _clean(page.extract_text()))
-                    source=str(pdf_path.name),  # nombre del PDF
-                    page=i                      # número de página
-                )
-            )
-    return docs
+        return _page_documents(pdf, doc_id_prefix or pdf_path.stem, str(pdf_path.name))
+
+
+@dataclass
+class PdfReport:
+    """Resultado de la extracción de un archivo (ver iter_pdf_documents)."""
+    path: str
+    pages: int = 0
+    documents: int = 0
+    seconds: float = 0.0  # tiempo de extracción sumado entre tramos (en los workers)
+    error: Optional[str] = None  # el archivo (o alguno de sus tramos) falló; el resto del lote sigue
+
+
+@dataclass
+class _Part:
+    docs: List[Document]
+    pages: int  # páginas totales del archivo
+    seconds: float
+    error: Optional[str] = None
 
 
+def _page_count(pdf) -> int:
+    """Páginas del archivo según el catálogo, sin recorrer el árbol de páginas (-1 si no se puede leer)."""
+    try:
+        return int(resolve1(resolve1(pdf.doc.catalog["Pages"])["Count"]))
+    except Exception:
+        return -1
 
-def folder_pdfs_to_documents(folder: Path, recursive: bool = True) -> List[Document]:
+
+def _extract_part(path: str, first: int = 1, last: Optional[int] = None, pages: Optional[int] = None) -> _Part:
+    """
+    Worker: páginas first..last (1-based, inclusive; last=None = hasta el final) de un PDF.
+    pages = cantidad de páginas ya conocida (tramos siguientes al primero): no se vuelve a contar.
+    Los errores vuelven como dato, no como excepción.
+    """
+    t0 = time.perf_counter()
+    try:
+        if pages is not None:
+            last = pages if last is None else min(last, pages)
+        wanted = None if first == 1 and last is None else range(first, sys.maxsize if last is None else last + 1)
+        with pdfplumber.open(path, pages=wanted) as pdf:
+            n = pages if pages is not None else _page_count(pdf)
+            docs = _page_documents(pdf, Path(path).stem, Path(path).name)
+            if n < 0 and wanted is None:
+                n = len(pdf.pages)
+        if n < 0:  # catálogo ilegible: contar recorriendo el árbol de páginas
+            with pdfplumber.open(path) as pdf:
+                n = len(pdf.pages)
+        return _Part(docs, n, time.perf_counter() - t0)
+    except Exception as e:
+        return _Part([], 0, time.perf_counter() - t0, f"{type(e).__name__}: {e}")
+
+
+@dataclass
+class _File:
+    path: str
+    report: PdfReport
+    parts: Deque[Future] = field(default_factory=deque)  # tramos pedidos y no entregados, en orden de páginas
+    first: Optional[Future] = None  # primer tramo, hasta conocer la cantidad de páginas
+    pages: Optional[int] = None
+    next_page: int = 1  # primera página del próximo tramo a pedir
+
+    def known(self) -> bool:
+        if self.pages is None and self.first is not None and self.first.done():
+            self.pages, self.first = self.first.result().pages, None
+        return self.pages is not None
+
+    def finished(self) -> bool:
+        return self.known() and self.next_page > self.pages and not self.parts
+
+
+def _pdf_paths(folder: Path, recursive: bool) -> List[Path]:
+    pattern = "**/*.pdf" if recursive else "*.pdf"
+    return sorted(folder.glob(pattern))  # orden estable entre corridas y sistemas de archivos
+
+
+def iter_pdf_documents(
+    folder: Path,
+    recursive: bool = True,
+    workers: Optional[int] = None,  # None = todos los núcleos; 1 = en el proceso actual
+    pages_per_task: int = 32,  # PDFs más largos se reparten en tramos de estas páginas
+    on_report: Optional[Callable[[PdfReport], None]] = None,  # tiempos y errores por archivo
+) -> Iterator[Document]:
+    """
+    Genera los Document (uno por página con texto) de todos los PDFs de la carpeta,
+    en el mismo orden que la versión serial: archivos ordenados por ruta, páginas en orden.
+    Un PDF que falla se reporta (on_report / [WARN], al terminar sus páginas) y no corta el lote.
+    """
+    if pages_per_task < 1:  # se valida al llamar, no al pedir el primer Document
+        raise ValueError(f"pages_per_task debe ser >= 1 (recibido {pages_per_task})")
+    paths = [str(p) for p in _pdf_paths(folder, recursive)]
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    return _iter_documents(paths, workers, pages_per_task, on_report)
+
+
+def _iter_documents(paths: List[str], workers: int, pages_per_task: int,
+                    on_report: Optional[Callable[[PdfReport], None]]) -> Iterator[Document]:
+    def report(rep: PdfReport) -> None:
+        if rep.error:
+            print(f"[WARN] {rep.path}: {rep.error}")
+        if on_report is not None:
+            on_report(rep)
+
+    if workers <= 1:
+        for path in paths:
+            part = _extract_part(path)
+            yield from part.docs
+            report(PdfReport(path, part.pages, len(part.docs), part.seconds, part.error))
+        return
+
+    window = workers * 2  # tramos corriendo a la vez; los terminados sin entregar se acotan a 2 * window
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        files: Deque[_File] = deque()
+        try:
+            yield from _drain(ex, paths, files, window, pages_per_task, report)
+        finally:
+            for f in files:  # el consumidor cortó antes: no esperar tramos que nadie va a leer
+                for p in f.parts:
+                    p.cancel()
+
+
+def _drain(ex, paths: List[str], files: Deque[_File], window: int, pages_per_task: int, report) -> Iterator[Document]:
+    nxt = 0
+    while files or nxt < len(paths):
+        running = sum(1 for f in files for p in f.parts if not p.done())
+        buffered = sum(len(f.parts) for f in files)
+        # tramos restantes de los PDFs ya contados: el archivo en cabeza primero, y ése sólo se acota
+        # por sus propios tramos pendientes para que los buffers de los demás no lo frenen
+        for k, f in enumerate(files):
+            while (running < window and f.known() and f.next_page <= f.pages
+                   and (len(f.parts) if k == 0 else buffered) < 2 * window):
+                last = f.next_page + pages_per_task - 1
+                f.parts.append(ex.submit(_extract_part, f.path, f.next_page, last, f.pages))
+                f.next_page = last + 1
+                running, buffered = running + 1, buffered + 1
+        while nxt < len(paths) and running < window and buffered < 2 * window:
+            f = _File(paths[nxt], PdfReport(paths[nxt]), next_page=pages_per_task + 1)
+            f.first = ex.submit(_extract_part, f.path, 1, pages_per_task)
+            f.parts.append(f.first)
+            files.append(f)
+            nxt += 1
+            running, buffered = running + 1, buffered + 1
+        # entregar en orden los tramos ya terminados del archivo en cabeza
+        head, progressed = files[0], False
+        while head.parts and head.parts[0].done():
+            part = head.parts.popleft().result()
+            if head.pages is None:
+                head.pages, head.first = part.pages, None
+            rep = head.report
+            rep.pages, rep.documents, rep.seconds = head.pages, rep.documents + len(part.docs), rep.seconds + part.seconds
+            rep.error = rep.error or part.error
+            progressed = True
+            yield from part.docs
+        if head.finished():
+            files.popleft()
+            report(head.report)
+            continue
+        if not progressed:
+            wait([p for f in files for p in f.parts if not p.done()], return_when=FIRST_COMPLETED)
+
+
+def folder_pdfs_to_documents(folder: Path, recursive: bool = True, workers: Optional[int] = 1) -> List[Document]:
     """
     Carga TODOS los PDFs de una carpeta (y subcarpetas si recursive=True).
     Devuelve lista de Documents (cada uno corresponde a una página).
+    Con workers > 1 (None = todos los núcleos) extrae en un pool de procesos (ver iter_pdf_documents);
+    para no armar la lista completa en memoria usar directamente iter_pdf_documents.
     """
-    pattern = "**/*.pdf" if recursive else "*.pdf"
-    docs: List[Document] = []
-    for pdf_path in folder.glob(pattern):
-        docs.extend(pdf_to_documents(pdf_path))
-    return docs
+    return list(iter_pdf_documents(folder, recursive, workers=workers))
 
 
 def documents_to_chunks(
     docs: List[Document],
     max_tokens_chunk: int = 400,
-    overlap: int = 100
+    overlap: int = 100,
+    workers: Optional[int] = 1,
+    cache: Optional[ChunkCache] = None,
 ) -> Dict[str, List[str]]:
     """
     Convierte cada Document en sus chunks de texto.
@@ -202,24 +372,10 @@ def documents_to_chunks(
 
     Extra: si una página es muy corta y chunk_text() devuelve [],
     generamos al menos un chunk de respaldo para que el doc no quede fuera del índice.
+    Con workers > 1 (None = todos los núcleos) el chunking corre en un pool de procesos.
+    Con cache (ChunkCache) se reutilizan los chunks de textos ya procesados.
     """
-    out: Dict[str, List[str]] = {}
-    for d in docs:
-        chunks = chunk_text(d.text, max_tokens_chunk, overlap)
-
-        if not chunks:
-            # fallback para páginas cortas: un solo chunk recortado a ~max_tokens_chunk palabras
-            txt = " ".join((d.text or "").split())
-            if txt:
-                words = txt.split()
-                if len(words) > max_tokens_chunk:
-                    words = words[:max_tokens_chunk]
-                chunks = [" ".join(words)]
-            else:
-                chunks = []  # si realmente está vacío, dejamos vacío
-
-        out[d.id] = chunks
-    return out
+    return chunk_documents(docs, max_tokens_chunk, overlap, workers=workers, cache=cache)
 
 
 
@@ -1,4 +1,4 @@
-from typing import List, Set
+from typing import Dict, List, Mapping, Optional, Sequence, Set
 import numpy as np
 
 def precision_at_k(pred_ids: List[str], rel_ids: Set[str], k: int) -> float:
@@ -16,3 +16,67 @@ def mrr(pred_ids: List[str], rel_ids: Set[str]) -> float:
     for i,d in enumerate(pred_ids,1):
         if d in rel_ids: return 1.0/i
     return 0.0
+
+
+# ---- Versión vectorizada: todas las queries a la vez sobre una matriz de relevancia ----
+
+_DISCOUNTS = 1.0 / np.log2(np.arange(2, 258))  # 1/log2(rank+1), se agranda si hace falta
+
+def _discounts(n: int) -> np.ndarray:
+    global _DISCOUNTS
+    if n > len(_DISCOUNTS):
+        _DISCOUNTS = 1.0 / np.log2(np.arange(2, 2 * n + 2))
+    return _DISCOUNTS[:n]
+
+def _as_graded(rel) -> Dict[str, float]:
+    """Set de ids (binario) o {doc_id: label} -> {doc_id: ganancia}."""
+    return rel if isinstance(rel, Mapping) else {d: 1.0 for d in rel}
+
+def relevance_matrix(ranked: Sequence[Sequence[str]], qrels: Sequence, depth: Optional[int] = None) -> np.ndarray:
+    """
+    Matriz (queries x rangos) con la ganancia (label) de cada documento predicho, 0 si no es relevante.
+    qrels[i] es el set de relevantes de la query i o un dict {doc_id: label}.
+    """
+    if depth is None:
+        depth = max((len(r) for r in ranked), default=0)
+    rel = np.zeros((len(ranked), max(depth, 1)))
+    for i, (pred, q) in enumerate(zip(ranked, qrels)):
+        get = _as_graded(q).get
+        gains = [get(d, 0.0) for d in pred[:depth]]
+        rel[i, :len(gains)] = gains
+    return rel
+
+def ideal_matrix(qrels: Sequence, depth: int) -> np.ndarray:
+    """Ganancias ideales (labels ordenados de mayor a menor) por query, para el IDCG."""
+    ideal = np.zeros((len(qrels), max(depth, 1)))
+    for i, q in enumerate(qrels):
+        gains = sorted((g for g in _as_graded(q).values() if g > 0), reverse=True)[:depth]
+        ideal[i, :len(gains)] = gains
+    return ideal
+
+def ir_metrics(rel: np.ndarray, qrels: Sequence, ks: Sequence[int]) -> Dict[str, np.ndarray]:
+    """
+    precision@k, recall@k y ndcg@k para cada k, y mrr, como arrays de una fila por query.
+    Con labels graduados nDCG usa la ganancia lineal (label); precision/recall/mrr usan label > 0.
+    Con labels 0/1 coincide con precision_at_k, recall_at_k, ndcg_at_k y mrr.
+    """
+    if not ks or min(ks) < 1:
+        raise ValueError("ks debe tener valores >= 1")
+    n_q, depth = rel.shape
+    hit = rel > 0
+    hits = np.cumsum(hit, axis=1)
+    n_rel = np.array([sum(1 for g in _as_graded(q).values() if g > 0) for q in qrels], dtype=float)
+    kmax = max(ks)
+    disc = _discounts(max(depth, kmax))
+    dcg = np.cumsum(rel * disc[:depth], axis=1)
+    idcg = np.cumsum(ideal_matrix(qrels, kmax) * disc[:kmax], axis=1)
+    out: Dict[str, np.ndarray] = {}
+    for k in ks:
+        h = hits[:, min(k, depth) - 1]
+        out[f"precision@{k}"] = h / k
+        out[f"recall@{k}"] = np.divide(h, n_rel, out=np.zeros(n_q), where=n_rel > 0)
+        ik = idcg[:, k - 1]
+        out[f"ndcg@{k}"] = np.divide(dcg[:, min(k, depth) - 1], ik, out=np.zeros(n_q), where=ik > 0)
+    first = hit.argmax(axis=1)
+    out["mrr"] = np.where(hit.any(axis=1), 1.0 / (first + 1), 0.0)
+    return out
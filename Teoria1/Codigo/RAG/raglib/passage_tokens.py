@@ -0,0 +1,70 @@
+"""
+Token ids de los chunks para el CrossEncoder
+-------------------------------------------
+- El texto de un slot del ChunkStore no cambia (los slots sólo se agregan), así que cada chunk
+  se tokeniza una sola vez y sus ids quedan en un array plano tipo CSR:
+  ids[start[slot]:start[slot] + length[slot]].
+- En cada query sólo se tokeniza la query; los pares se arman concatenando ids (ver reranker).
+"""
+
+from typing import Iterable, Sequence
+import threading
+import numpy as np
+from .chunk_store import _Growable
+
+
+class PassageTokens:
+    def __init__(self, dtype=np.int32):
+        self._ids = _Growable(dtype)
+        self._start = np.full(0, -1, dtype=np.int64)  # -1 = slot todavía sin tokenizar
+        self._len = np.zeros(0, dtype=np.int32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int((self._start >= 0).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return self._ids.values.nbytes + self._start.nbytes + self._len.nbytes
+
+    def missing(self, slots: Iterable[int]) -> np.ndarray:
+        """Slots (sin repetir) que todavía no tienen tokens."""
+        slots = np.unique(np.asarray(slots, dtype=np.int64))
+        start = self._start
+        known = slots < len(start)
+        todo = ~known
+        todo[known] = start[slots[known]] < 0
+        return slots[todo]
+
+    def put(self, slots: Sequence[int], ids: Sequence[Sequence[int]]):
+        if not len(slots):
+            return
+        lengths = np.fromiter((len(x) for x in ids), dtype=np.int32, count=len(ids))
+        flat = np.fromiter((t for x in ids for t in x), dtype=self._ids.values.dtype, count=int(lengths.sum()))
+        slots = np.asarray(slots, dtype=np.int64)
+        with self._lock:
+            n = int(slots.max()) + 1
+            start, length = self._start, self._len
+            if n > len(start):
+                # arrays nuevos: los lectores concurrentes siguen viendo los anteriores, completos
+                cap = max(n, 2 * len(start), 1024)
+                start = np.concatenate([start, np.full(cap - len(start), -1, dtype=np.int64)])
+                length = np.concatenate([length, np.zeros(cap - len(length), dtype=np.int32)])
+            offsets = len(self._ids) + np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+            self._ids.extend(flat)
+            length[slots] = lengths
+            start[slots] = offsets
+            self._start, self._len = start, length
+
+    def get(self, slot: int) -> np.ndarray:
+        s = self._start[slot]
+        return self._ids.values[s:s + self._len[slot]]
+
+    def lengths(self, slots: np.ndarray) -> np.ndarray:
+        return self._len[np.asarray(slots, dtype=np.int64)]
+
+    def clear(self):
+        with self._lock:
+            self._ids = _Growable(self._ids.values.dtype)
+            self._start = np.full(0, -1, dtype=np.int64)
+            self._len = np.zeros(0, dtype=np.int32)
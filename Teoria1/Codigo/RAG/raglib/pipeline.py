@@ -1,12 +1,54 @@
-from typing import Dict, List, Tuple, Optional
-from .documents import Document, chunk_text
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Mapping, Tuple, Optional, Union
+import asyncio
+import threading
+import time
+import numpy as np
+from .documents import Document, chunk_documents
+from .chunk_cache import ChunkCache
 from .bm25_index import BM25Index
+from .chunk_store import ChunkStore, SlotView
 from .reranker import CrossEncoderReranker
-from .fusion import rrf_combine
-from .vector_pinecone import PineconeSearcher, make_chunk_id, parse_chunk_id
+from .fusion import FUSION_METHODS, fuse
+from .batching import MicroBatcher
+from .cascade import Cascade, CascadePolicy, summarize
+from .diversify import mmr
+from .result_cache import ResultCache
+from .tracing import span
+from .vector_pinecone import PineconeSearcher, make_chunk_id
+from .vector_local import LocalVectorSearcher
 from .rag_summary import generar_rag_summary
 
 
+class _DocChunksView(Mapping):
+    """doc_id -> [textos de sus chunks vivos], armado al vuelo desde el almacén."""
+
+    def __init__(self, pipeline: "RagPipeline"):
+        self._p = pipeline
+
+    def __getitem__(self, doc_id: str) -> List[str]:
+        if doc_id not in self._p.docs:
+            raise KeyError(doc_id)
+        return [self._p.store.text(s) for s in self._p.bm25.slots_of(doc_id)]
+
+    def __len__(self) -> int:
+        return len(self._p.docs)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._p.docs)
+
+
+@dataclass
+class HybridResult:
+    """Resultado de retrieve_hybrid_concurrent: degraded=True si alguna rama faltó (errors dice cuál y por qué)."""
+    chunk_ids: List[str]
+    slots: np.ndarray
+    degraded: bool = False
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
 class RagPipeline:
     """
     Pipeline híbrido: BM25 local + (opcional) Pinecone vectorial + CrossEncoder (re-ranking).
@@ -15,51 +57,158 @@ class RagPipeline:
     def __init__(
         self,
         docs: List[Document],
-        pinecone_searcher: Optional[PineconeSearcher] = None,
+        pinecone_searcher: Optional[Union[PineconeSearcher, LocalVectorSearcher]] = None,  # o índice local
         max_tokens_chunk: int = 400,
         overlap: int = 100,
         ce_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
         device: Optional[str] = None,
+        ce_backend: str = "torch",  # "torch" | "onnx" | "onnx-int8" (ver CrossEncoderReranker)
+        ce_max_length: Optional[int] = None,  # tokens por par (query, chunk) en el CrossEncoder
+        ce_pretokenize: Optional[str] = "lazy",  # chunks tokenizados una vez: "lazy" | "index" | None
         do_upsert: bool = True,  # si hay pinecone_searcher=True, controla si se suben los chunks
+        bm25_index: Optional[BM25Index] = None,  # índice ya construido (p. ej. BM25Index.load) -> no se re-chunkea
+        workers: Optional[int] = 1,  # procesos para el chunking (None = todos los núcleos)
+        chunk_cache: Optional[ChunkCache] = None,  # caché de chunks en disco compartida con la ingesta
+        fusion: str = "rrf",  # "rrf" | "minmax" | "zscore" (ver fusion.fuse)
+        fusion_weights: Optional[Tuple[float, float]] = None,  # pesos (BM25, vectorial)
+        concurrent: bool = False,  # BM25 y la búsqueda vectorial en paralelo (hilos)
+        bm25_timeout: Optional[float] = None,  # segundos por rama en modo concurrente (None = sin límite)
+        vec_timeout: Optional[float] = None,
+        batch_max_size: int = 32,  # API async: queries por batch de embeddings
+        batch_max_wait_ms: float = 5.0,  # API async: espera máxima para juntar un batch
+        rerank_max_pairs: int = 256,  # API async: pares (query, chunk) por batch del CrossEncoder
+        result_cache: Optional[ResultCache] = None,  # caché de resultados de retrieve_and_rerank
+        cascade: Optional[CascadePolicy] = None,  # re-ranking en cascada con presupuesto (ver cascade.py)
+        diversity: str = "cap",  # "cap" (per_doc_cap por documento) | "mmr" (embeddings, ver diversify.py)
+        mmr_lambda: float = 0.7,  # peso de la relevancia frente a la redundancia
+        mmr_threshold: Optional[float] = 0.95,  # coseno a partir del cual un chunk es casi duplicado
+        mmr_fetch: float = 1.5,  # candidatos pedidos a la fusión = top_k * mmr_fetch (con "cap" son top_k * 3)
     ):
         # Mapa rápido por id
         self.docs = {d.id: d for d in docs}
-        self.doc_list = docs
+        self.doc_list = list(docs)
+        self.max_tokens_chunk = max_tokens_chunk
+        self.overlap = overlap
+        self.workers = workers
+        self.chunk_cache = chunk_cache
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Método de fusión inválido: {fusion!r} (usar {', '.join(FUSION_METHODS)})")
+        self.fusion = fusion
+        self.fusion_weights = fusion_weights
+        self.concurrent = concurrent
+        self.bm25_timeout = bm25_timeout
+        self.vec_timeout = vec_timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self.rerank_max_pairs = rerank_max_pairs
+        self._batchers: Dict[str, MicroBatcher] = {}
+        self.ce_model = ce_model
+        self.result_cache = result_cache
+        self.cascade = cascade
+        if diversity not in ("cap", "mmr"):
+            raise ValueError(f"diversity inválido: {diversity!r} (usar 'cap' o 'mmr')")
+        if diversity == "mmr" and pinecone_searcher is None:
+            raise ValueError("diversity='mmr' necesita embeddings: pasar un buscador vectorial")
+        self.diversity = diversity
+        self.mmr_lambda = mmr_lambda
+        self.mmr_threshold = mmr_threshold
+        self.mmr_fetch = mmr_fetch
+        self.cascade_log: "deque" = deque(maxlen=10000)  # CascadeStats de las últimas queries
+        self._invalidations = 0  # invalidate_results() (cambios que el pipeline no ve)
 
-        # Chunking con fallback (no perder páginas cortas)
-        self.chunks_per_doc: Dict[str, List[str]] = {}
-        for d in docs:
-            chunks = chunk_text(d.text, max_tokens_chunk, overlap)
-            if not chunks:
-                txt = " ".join((d.text or "").split())
-                if txt:
-                    words = txt.split()
-                    if len(words) > max_tokens_chunk:
-                        words = words[:max_tokens_chunk]
-                    chunks = [" ".join(words)]
-                else:
-                    chunks = []
-            self.chunks_per_doc[d.id] = chunks
-
-        # Índice BM25 (sobre los mismos chunks)
-        self.bm25 = BM25Index(docs, self.chunks_per_doc)
+        if bm25_index is not None:
+            # chunks tomados del índice persistido (su ChunkStore)
+            self.bm25 = bm25_index
+        else:
+            # Índice BM25 (sobre los mismos chunks)
+            self.bm25 = BM25Index(docs, self._chunk_docs(docs))
+        # Un único almacén de chunks (slot BM25 = slot del almacén); Pinecone y las vistas lo referencian
+        self.store: ChunkStore = self.bm25.store
 
         # Vector search 
         self.vec = pinecone_searcher
+        if diversity == "mmr" and isinstance(self.vec, PineconeSearcher):
+            self.vec.include_values = True  # MMR reutiliza los vectores que ya devolvió la búsqueda
         if self.vec is not None and do_upsert:
-            docs_meta = {d.id: {"source": d.source, "page": d.page} for d in docs}
-            self.vec.upsert_chunks(self.chunks_per_doc, docs_meta)
+            self.vec.upsert_slots(self.store, self.bm25.live_slots)
+        elif isinstance(self.vec, PineconeSearcher):
+            # namespace ya cargada (otro proceso o corrida anterior): sus ids se traducen por (doc_id, idx_local)
+            self.vec.attach(self.store, self._locate)
 
         # Re-ranker
-        self.reranker = CrossEncoderReranker(model_name=ce_model, device=device)
+        if ce_pretokenize not in ("lazy", "index", None):
+            raise ValueError(f"ce_pretokenize inválido: {ce_pretokenize!r} (usar 'lazy', 'index' o None)")
+        self.ce_pretokenize = ce_pretokenize
+        self.reranker = CrossEncoderReranker(
+            model_name=ce_model, device=device, backend=ce_backend, max_length=ce_max_length,
+            token_cache=ce_pretokenize is not None,
+        )
+        if ce_pretokenize == "index" and self.reranker.pretokenized:
+            self.reranker.pretokenize(self.store, self.bm25.live_slots)
+
+    def _chunk_docs(self, docs: List[Document]) -> Dict[str, List[str]]:
+        # Chunking con fallback (no perder páginas cortas)
+        return chunk_documents(
+            docs, self.max_tokens_chunk, self.overlap, workers=self.workers, cache=self.chunk_cache
+        )
+
+    # vistas sobre el almacén (compatibles con las listas/dicts de antes, sin copiar textos)
+    @property
+    def chunks_per_doc(self) -> Mapping[str, List[str]]:
+        return _DocChunksView(self)
 
-        # Índices globales (para mapear BM25 -> (doc_id, idx_local))
-        self.global_chunks: List[str] = []
-        self.global_map: List[Tuple[str, int]] = []
+    @property
+    def global_chunks(self) -> SlotView:
+        return self.store.texts
+
+    @property
+    def global_map(self) -> SlotView:
+        """slot -> (doc_id, idx_local)."""
+        return self.store.locations
+
+    def add_documents(self, docs: List[Document], do_upsert: bool = True):
+        """
+        Agrega (o reemplaza, si el id ya existe) documentos sin reconstruir el pipeline.
+        Sólo se chunkean los documentos nuevos; BM25 se actualiza de forma incremental
+        y en Pinecone se suben los chunks nuevos y se borran los que quedaron sobrantes.
+        """
+        new_chunks = self._chunk_docs(docs)
+        stale: List[str] = []
         for d in docs:
-            for i, ch in enumerate(self.chunks_per_doc[d.id]):
-                self.global_chunks.append(ch)
-                self.global_map.append((d.id, i))
+            old_n = len(self.bm25.slots_of(d.id))
+            stale.extend(make_chunk_id(d.id, i) for i in range(len(new_chunks[d.id]), old_n))
+
+        for d in docs:
+            if d.id not in self.docs:
+                self.doc_list.append(d)
+            else:
+                self.doc_list = [d if x.id == d.id else x for x in self.doc_list]
+            self.docs[d.id] = d
+        # el BM25 agrega los chunks al almacén y publica la nueva foto de una vez:
+        # las consultas en curso no se bloquean
+        slots = self.bm25.add_documents(docs, new_chunks)
+
+        if self.vec is not None and do_upsert:
+            self.vec.upsert_slots(self.store, slots)
+            self.vec.delete_chunks(stale)
+        if self.ce_pretokenize == "index" and self.reranker.pretokenized:
+            self.reranker.pretokenize(self.store, slots)
+
+    def remove_documents(self, doc_ids: List[str]):
+        """Da de baja documentos del BM25 (tombstones) y de Pinecone."""
+        doc_ids = [i for i in doc_ids if i in self.docs]
+        stale: List[str] = []
+        for doc_id in doc_ids:
+            stale.extend(make_chunk_id(doc_id, i) for i in range(len(self.bm25.slots_of(doc_id))))
+        self.bm25.remove_documents(doc_ids)
+        for doc_id in doc_ids:
+            self.docs.pop(doc_id, None)
+        gone = set(doc_ids)
+        self.doc_list = [d for d in self.doc_list if d.id not in gone]
+        if self.vec is not None:
+            self.vec.delete_chunks(stale)
 
     def retrieve_hybrid(
         self,
@@ -70,25 +219,196 @@ class RagPipeline:
         """
         Devuelve lista de chunk_ids (doc_id::chunk_i) por ranking fusionado.
         """
-        # BM25
-        bm25_hits: List[str] = []
-        for gi, _score in self.bm25.search(query, top_k=top_k):
-            doc_id, local_i = self.global_map[gi]
-            bm25_hits.append(make_chunk_id(doc_id, local_i))
+        return [self.chunk_id(s) for s in self.retrieve_ids(query, top_k, meta_filter).tolist()]
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 50,
+        meta_filter: Optional[dict] = None,
+    ) -> List[List[str]]:
+        """
+        Versión por lotes de retrieve_hybrid: BM25 puntúa todas las queries en una pasada
+        y los embeddings de las queries se calculan en un único batch.
+        """
+        return [[self.chunk_id(s) for s in ids.tolist()] for ids in self.retrieve_many_ids(queries, top_k, meta_filter)]
+
+    def _locate(self, doc_id: str, local_idx: int) -> int:
+        """(doc_id, idx_local) -> slot vivo del almacén (-1 si no existe)."""
+        slots = self.bm25.slots_of(doc_id)
+        return slots[local_idx] if 0 <= local_idx < len(slots) else -1
+
+    def chunk_id(self, slot: int) -> str:
+        """Slot del almacén -> id string (doc_id::chunk_i), sólo para mostrar o hablar con Pinecone."""
+        return make_chunk_id(self.store.doc_id(slot), self.store.local_idx(slot))
+
+    def retrieve_hybrid_concurrent(
+        self,
+        query: str,
+        top_k: int = 50,
+        meta_filter: Optional[dict] = None,
+        bm25_timeout: Optional[float] = None,
+        vec_timeout: Optional[float] = None,
+    ) -> HybridResult:
+        """
+        BM25 y la búsqueda vectorial corren a la vez, cada una con su timeout (por defecto los
+        del pipeline). Si una rama se atrasa o falla se fusiona sólo la otra y el resultado
+        queda marcado como degraded; si fallan las dos se lanza RuntimeError.
+        """
+        slots, errors = self._retrieve_concurrent(
+            lambda: self.bm25.search_slots(query, top_k=top_k),
+            lambda: self.vec.search_slots(query, top_k=top_k, meta_filter=meta_filter),
+            lambda b, v: self._fuse_legs(b, v, top_k),
+            bm25_timeout, vec_timeout,
+        )
+        return HybridResult([self.chunk_id(s) for s in slots.tolist()], slots, bool(errors), errors)
+
+    def _leg_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-leg")
+            return self._pool
+
+    def close(self):
+        """Libera los hilos del modo concurrente (las ramas atrasadas terminan solas)."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    @staticmethod
+    def _leg(name: str, fut: Future, deadline: Optional[float], errors: Dict[str, str]):
+        try:
+            return fut.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            fut.cancel()
+            errors[name] = "timeout"
+        except Exception as e:  # red, Pinecone caído, etc.: se degrada en lugar de fallar
+            errors[name] = f"{type(e).__name__}: {e}"
+        return None
+
+    def _retrieve_concurrent(
+        self,
+        bm25_call: Callable,
+        vec_call: Callable,
+        fuse_call: Callable,
+        bm25_timeout: Optional[float] = None,
+        vec_timeout: Optional[float] = None,
+    ):
+        """Corre las dos ramas en paralelo y fusiona lo que llegue a tiempo -> (resultado, errores por rama)."""
+        bm25_timeout = self.bm25_timeout if bm25_timeout is None else bm25_timeout
+        vec_timeout = self.vec_timeout if vec_timeout is None else vec_timeout
+        pool = self._leg_pool()
+        t0 = time.monotonic()
+        bm25_fut = pool.submit(bm25_call)
+        vec_fut = pool.submit(vec_call) if self.vec is not None else None
+        errors: Dict[str, str] = {}
+        bm25_res = self._leg("bm25", bm25_fut, None if bm25_timeout is None else t0 + bm25_timeout, errors)
+        vec_res = None
+        if vec_fut is not None:
+            vec_res = self._leg("vector", vec_fut, None if vec_timeout is None else t0 + vec_timeout, errors)
+        self._check_legs(bm25_res, vec_res, errors)
+        return fuse_call(bm25_res, vec_res), errors
+
+    @staticmethod
+    def _check_legs(bm25_res, vec_res, errors: Dict[str, str]):
+        if bm25_res is None and vec_res is None:
+            raise RuntimeError(f"Fallaron todas las ramas de la búsqueda híbrida: {errors}")
+
+    def _fuse_legs(self, bm25_hits, vec_hits, top_k: int) -> np.ndarray:
+        if bm25_hits is None:  # rama BM25 caída: sólo vectorial
+            bm25_hits = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        return self._fuse(bm25_hits, vec_hits, top_k)
+
+    def retrieve_ids(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> np.ndarray:
+        """Como retrieve_hybrid pero con ids enteros (slots del almacén): no se arman strings."""
+        return self._retrieve_ids(query, top_k, meta_filter)[0]
+
+    def _retrieve_ids(self, query: str, top_k: int, meta_filter: Optional[dict]) -> Tuple[np.ndarray, Dict[str, str]]:
+        """-> (slots, errores por rama); errores vacío = respuesta completa (no degradada)."""
+        with span("pipeline.retrieve", top_k=top_k, concurrent=self.concurrent) as sp:
+            ids, errors = self._retrieve_legs(query, top_k, meta_filter)
+            sp.set(results=len(ids), degraded=bool(errors), errors=errors or None)
+            return ids, errors
+
+    def _retrieve_legs(self, query: str, top_k: int, meta_filter: Optional[dict]) -> Tuple[np.ndarray, Dict[str, str]]:
+        if self.concurrent:
+            return self._retrieve_concurrent(
+                lambda: self.bm25.search_slots(query, top_k=top_k),
+                lambda: self.vec.search_slots(query, top_k=top_k, meta_filter=meta_filter),
+                lambda b, v: self._fuse_legs(b, v, top_k),
+            )
+        bm25_hits = self.bm25.search_slots(query, top_k=top_k)
+        vec_hits = None
+        if self.vec is not None:
+            vec_hits = self.vec.search_slots(query, top_k=top_k, meta_filter=meta_filter)
+        return self._fuse(bm25_hits, vec_hits, top_k), {}
+
+    def retrieve_many_ids(
+        self, queries: List[str], top_k: int = 50, meta_filter: Optional[dict] = None
+    ) -> List[np.ndarray]:
+        return self._retrieve_many_ids(queries, top_k, meta_filter)[0]
+
+    def _retrieve_many_ids(
+        self, queries: List[str], top_k: int, meta_filter: Optional[dict]
+    ) -> Tuple[List[np.ndarray], Dict[str, str]]:
+        with span("pipeline.retrieve", top_k=top_k, batch=len(queries), concurrent=self.concurrent) as sp:
+            ids_all, errors = self._retrieve_many_legs(queries, top_k, meta_filter)
+            sp.set(degraded=bool(errors), errors=errors or None)
+            return ids_all, errors
 
-        # Vector
-        vec_hits: List[str] = []
+    def _retrieve_many_legs(
+        self, queries: List[str], top_k: int, meta_filter: Optional[dict]
+    ) -> Tuple[List[np.ndarray], Dict[str, str]]:
+        if self.concurrent:
+            return self._retrieve_concurrent(
+                lambda: self.bm25.search_slots_many(queries, top_k=top_k),
+                lambda: self.vec.search_slots_many(queries, top_k=top_k, meta_filter=meta_filter),
+                lambda b, v: [
+                    self._fuse_legs(b[i] if b is not None else None, v[i] if v is not None else None, top_k)
+                    for i in range(len(queries))
+                ],
+            )
+        bm25_all = self.bm25.search_slots_many(queries, top_k=top_k)
+        vec_all: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(queries)
         if self.vec is not None:
-            vec_res = self.vec.search(query, top_k=top_k, meta_filter=meta_filter)
-            vec_hits = [cid for (cid, _s, _m) in vec_res]
+            vec_all = self.vec.search_slots_many(queries, top_k=top_k, meta_filter=meta_filter)
+        return [self._fuse(b, v, top_k) for b, v in zip(bm25_all, vec_all)], {}
 
-        # Fusión (si no hay vector, usa solo BM25)
-        if vec_hits:
-            combined = rrf_combine(bm25_hits, vec_hits)
-        else:
-            combined = bm25_hits
+    def _vec_slots(self, slots: np.ndarray) -> np.ndarray:
+        """Slots del almacén del buscador vectorial -> slots vivos del pipeline (-1 si ya no existe)."""
+        vs = self.vec.store
+        live = self.bm25.is_live(slots) if vs is self.store else np.zeros(len(slots), dtype=bool)
+        if live.all():
+            return slots
+        # almacén propio del buscador o chunk ya reemplazado: traducir por (doc_id, idx_local)
+        out = slots.copy()
+        for j in np.flatnonzero(~live).tolist():
+            doc_slots = self.bm25.slots_of(vs.doc_id(slots[j]))
+            local_i = vs.local_idx(slots[j])
+            out[j] = doc_slots[local_i] if local_i < len(doc_slots) else -1
+        return out
 
-        return combined[:top_k]
+    def _fuse(
+        self,
+        bm25_hits: Tuple[np.ndarray, np.ndarray],
+        vec_hits: Optional[Tuple[np.ndarray, np.ndarray]],
+        top_k: int,
+    ) -> np.ndarray:
+        # Fusión (si no hay vector, usa solo BM25); los scores de cada lista van a la fusión
+        if vec_hits is None or not len(vec_hits[0]):
+            return bm25_hits[0][:top_k]
+        vec_ids = self._vec_slots(vec_hits[0])
+        keep = vec_ids >= 0
+        with span("fusion", method=self.fusion, bm25=len(bm25_hits[0]), vector=int(keep.sum())):
+            ids, _ = fuse(
+                [bm25_hits[0], vec_ids[keep]],
+                [bm25_hits[1], vec_hits[1][keep]],
+                method=self.fusion,
+                weights=self.fusion_weights,
+                top_k=top_k,
+            )
+        return ids
 
     def retrieve_with_metadata(
         self,
@@ -100,33 +420,275 @@ class RagPipeline:
         """
         Devuelve [(doc_id, chunk_text, meta)] con límite por documento para favorecer diversidad.
         """
-        cids = self.retrieve_hybrid(query, top_k=top_k * 3, meta_filter=meta_filter)
-        out: List[Tuple[str, str, Dict]] = []
-        seen: Dict[str, int] = {}
-        for cid in cids:
-            doc_id, local_i = parse_chunk_id(cid)
-            seen[doc_id] = seen.get(doc_id, 0)
-            if seen[doc_id] >= per_doc_cap:
-                continue
-            seen[doc_id] += 1
-
-            ch = self.chunks_per_doc[doc_id][local_i]
-            # Metadatos: primero del registro local (si hay vector); si no, a partir del doc
+        ids, errors = self._retrieve_ids(query, self._fetch(top_k), meta_filter)
+        return self._tuples(self._select([ids], top_k, per_doc_cap, errors)[0])
+
+    def retrieve_with_metadata_many(
+        self,
+        queries: List[str],
+        top_k: int = 20,
+        per_doc_cap: int = 2,
+        meta_filter: Optional[dict] = None,
+    ) -> List[List[Tuple[str, str, Dict]]]:
+        """Versión por lotes de retrieve_with_metadata (ver retrieve_many)."""
+        ids_all, errors = self._retrieve_many_ids(queries, self._fetch(top_k), meta_filter)
+        return [self._tuples(ids) for ids in self._select(ids_all, top_k, per_doc_cap, errors)]
+
+    def _fetch(self, top_k: int) -> int:
+        """Candidatos a pedir a la fusión: el límite por documento necesita sobre-pedir más que MMR."""
+        return top_k * 3 if self.diversity == "cap" else int(np.ceil(top_k * self.mmr_fetch))
+
+    def _select(
+        self, ids_all: List[np.ndarray], top_k: int, per_doc_cap: int, errors: Optional[Dict[str, str]] = None
+    ) -> List[np.ndarray]:
+        """
+        Diversificación de cada lista fusionada: per_doc_cap o MMR (per_doc_cap no se usa).
+        errors son los de las ramas: si la vectorial faltó (o falla al pedir los embeddings)
+        MMR no se intenta y se usa per_doc_cap, como con diversity="cap".
+        """
+        errors = {} if errors is None else errors
+        if self.diversity == "cap" or "vector" in errors or not ids_all:
+            return [self._capped(ids, top_k, per_doc_cap) for ids in ids_all]
+        with span("pipeline.mmr", candidates=sum(len(ids) for ids in ids_all), top_k=top_k) as sp:
+            # un solo pedido de embeddings para todas las listas (del índice o de la caché)
+            vecs = self._mmr_vectors(np.concatenate(ids_all), errors)
+            if vecs is None:
+                sp.set(degraded=True)
+                return [self._capped(ids, top_k, per_doc_cap) for ids in ids_all]
+            out, pos = [], 0
+            for ids in ids_all:
+                v = vecs[pos:pos + len(ids)]
+                pos += len(ids)
+                out.append(ids[mmr(v, top_k, self.mmr_lambda, threshold=self.mmr_threshold)])
+            return out
+
+    def _mmr_vectors(self, ids: np.ndarray, errors: Dict[str, str]) -> Optional[np.ndarray]:
+        """
+        vectors_of con la misma política que la rama vectorial: en modo concurrente o con
+        vec_timeout corre en el pool de ramas con ese timeout y un error queda en errors["vector"]
+        (-> None); en modo serial sin timeout se llama directo y los errores se propagan.
+        """
+        if not self.concurrent and self.vec_timeout is None:
+            return self.vec.vectors_of(self.store, ids)
+        fut = self._leg_pool().submit(self.vec.vectors_of, self.store, ids)
+        deadline = None if self.vec_timeout is None else time.monotonic() + self.vec_timeout
+        return self._leg("vector", fut, deadline, errors)
+
+    def _capped(self, ids: np.ndarray, top_k: int, per_doc_cap: int) -> np.ndarray:
+        """Primeros top_k ids respetando como máximo per_doc_cap chunks por documento (en orden)."""
+        with span("pipeline.cap", candidates=len(ids), per_doc_cap=per_doc_cap):
+            docs = self.store.doc_codes(ids)
+            order = np.argsort(docs, kind="stable")
+            d = docs[order]
+            starts = np.flatnonzero(np.concatenate([[True], d[1:] != d[:-1]])) if len(d) else np.zeros(0, dtype=np.int64)
+            rank = np.empty(len(ids), dtype=np.int64)
+            rank[order] = np.arange(len(d)) - np.repeat(starts, np.diff(np.append(starts, len(d))))
+            return ids[rank < per_doc_cap][:top_k]
+
+    def _tuples(self, ids: np.ndarray, scores: Optional[np.ndarray] = None) -> List[Tuple]:
+        """Slots -> [(doc_id, chunk_text, meta)] (+ score si se pasa); acá recién se arman strings y dicts."""
+        out = []
+        for j, slot in enumerate(ids.tolist()):
+            ch = self.store.text(slot)
+            meta = self.store.meta(slot, with_text=False)
             if self.vec is not None:
-                meta = self.vec.registry.get(cid, {})
+                meta["text"] = ch  # mismo formato que el registro del buscador vectorial
+            out.append((meta["doc_id"], ch, meta) if scores is None else (meta["doc_id"], ch, meta, float(scores[j])))
+        return out
+
+    def _reranked(self, ids: np.ndarray, scores: np.ndarray, top_final: int) -> List[Tuple[str, str, Dict, float]]:
+        order = np.argsort(-scores, kind="stable")[:top_final]
+        return self._tuples(ids[order], scores[order])
+
+    # caché de resultados: las entradas se invalidan solas cuando cambia la versión del corpus
+
+    @property
+    def corpus_version(self) -> str:
+        """
+        Id del índice BM25 (hash de los chunks al construir, persistido con save) + contador de
+        altas/bajas: cambia con cada add_documents / remove_documents sin recorrer los chunks.
+        """
+        return f"{self.bm25.corpus_id}-{self.bm25.generation}-{self._invalidations}"
+
+    def invalidate_results(self):
+        """Para cambios que el pipeline no ve (p. ej. sync_chunks del índice vectorial desde otro proceso)."""
+        self._invalidations += 1  # la versión cambia: las entradas anteriores dejan de valer
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def _cache_key(self, query: str, top_retrieve: int, top_final: int, meta_filter: Optional[dict]) -> Optional[str]:
+        if self.result_cache is None:
+            return None
+        self.result_cache.set_version(self.corpus_version)
+        config = {
+            "ce": self.ce_model, "ce_backend": self.reranker.backend, "ce_max_length": self.reranker.max_length,
+            "fusion": self.fusion, "weights": self.fusion_weights,
+            "cascade": asdict(self.cascade) if self.cascade is not None else None,
+            "diversity": self.diversity if self.diversity == "cap" else
+            ["mmr", self.mmr_lambda, self.mmr_threshold, self.mmr_fetch],
+            "vec": getattr(self.vec, "model_name", None), "ns": getattr(self.vec, "namespace", None),
+        }
+        return self.result_cache.key(query, top_retrieve, top_final, meta_filter, config)
+
+    def retrieve_and_rerank(
+        self, query: str, top_retrieve: int = 30, top_final: int = 5, meta_filter: Optional[dict] = None
+    ):
+        with span("pipeline.retrieve_and_rerank", top_retrieve=top_retrieve, top_final=top_final) as sp:
+            key = self._cache_key(query, top_retrieve, top_final, meta_filter)
+            if key is not None:
+                hit = self.result_cache.get(key)
+                sp.set(cache_hit=hit is not None)
+                if hit is not None:
+                    return hit
+            ids, errors = self._retrieve_ids(query, self._fetch(top_retrieve), meta_filter)
+            ids = self._select([ids], top_retrieve, 2, errors)[0]
+            if self.cascade is None:
+                scores = self.reranker.score_slots(query, ids, self.store)
             else:
-                d = self.docs[doc_id]
-                meta = {"doc_id": doc_id, "local_idx": local_i, "source": d.source, "page": d.page}
+                ids, scores = self._cascade([query], [ids], top_final)[0]
+            res = self._reranked(ids, scores, top_final)
+            if key is not None and not errors:  # una respuesta degradada no se cachea
+                self.result_cache.put(key, res)
+            return res
 
-            out.append((doc_id, ch, meta))
-            if len(out) >= top_k:
-                break
+    def retrieve_and_rerank_many(
+        self, queries: List[str], top_retrieve: int = 30, top_final: int = 5, meta_filter: Optional[dict] = None
+    ):
+        """Versión por lotes de retrieve_and_rerank: todos los pares van al CrossEncoder en un solo batch."""
+        keys = [self._cache_key(q, top_retrieve, top_final, meta_filter) for q in queries]
+        out = [self.result_cache.get(k) if k is not None else None for k in keys]
+        todo = [i for i, r in enumerate(out) if r is None]
+        if not todo:
+            return out
+        ids_all, errors = self._retrieve_many_ids([queries[i] for i in todo], self._fetch(top_retrieve), meta_filter)
+        ids_all = self._select(ids_all, top_retrieve, 2, errors)
+        if self.cascade is None:
+            scores_all = self.reranker.score_slots_many([queries[i] for i in todo], ids_all, self.store)
+        else:
+            ids_all, scores_all = zip(*self._cascade([queries[i] for i in todo], ids_all, top_final))
+        for i, ids, scores in zip(todo, ids_all, scores_all):
+            out[i] = self._reranked(ids, scores, top_final)
+            if keys[i] is not None and not errors:
+                self.result_cache.put(keys[i], out[i])
         return out
 
-    def retrieve_and_rerank(self, query: str, top_retrieve: int = 30, top_final: int = 5):
-        cand = self.retrieve_with_metadata(query, top_k=top_retrieve)
-        reranked = self.reranker.rerank(query, cand)
-        return reranked[:top_final]
+    def _cascade(self, queries: List[str], ids_all: List[np.ndarray], top_final: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Cascada por query; en cada ronda los tramos de todas las queries activas van juntos al CrossEncoder."""
+        runs = [Cascade(ids, top_final, self.cascade) for ids in ids_all]
+        with span("rerank.cascade", queries=len(runs)) as sp:
+            while True:
+                tranches = [c.next() for c in runs]
+                active = [i for i, t in enumerate(tranches) if len(t)]
+                if not active:
+                    break
+                scores = self.reranker.score_slots_many(
+                    [queries[i] for i in active], [tranches[i] for i in active], self.store
+                )
+                for i, sc in zip(active, scores):
+                    runs[i].feed(sc)
+            stats = [c.stats() for c in runs]
+            sp.set(pairs=sum(x.pairs for x in stats), candidates=sum(x.candidates for x in stats))
+        self.cascade_log.extend(stats)
+        return [c.result() for c in runs]
+
+    def cascade_summary(self) -> Dict:
+        """Estadísticas de la cascada sobre las últimas queries (pares, ahorro, motivos de corte)."""
+        return summarize(self.cascade_log)
+
+    # API async: los embeddings de queries y los pares del CrossEncoder de requests
+    # concurrentes se juntan en micro-batches (ver batching.MicroBatcher)
+
+    def _batcher(self, name: str) -> MicroBatcher:
+        b = self._batchers.get(name)
+        if b is None:
+            if name == "encode":
+                b = MicroBatcher(
+                    lambda qs: list(self.vec.encode_queries(qs)), self.batch_max_size, self.batch_max_wait_ms,
+                    name="batch.encode",
+                )
+            else:
+                b = MicroBatcher(
+                    lambda items: self.reranker.score_slots_many(
+                        [q for q, _ in items], [ids for _, ids in items], self.store
+                    ),
+                    self.rerank_max_pairs, self.batch_max_wait_ms, size=lambda item: max(1, len(item[1])),
+                    name="batch.rerank",
+                )
+            self._batchers[name] = b
+        return b
+
+    async def _avec_search(self, query: str, top_k: int, meta_filter: Optional[dict]):
+        q = await self._batcher("encode").submit(query)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.vec.search_slots_vector, q, top_k, meta_filter)
+
+    @staticmethod
+    async def _aleg(name: str, aw, timeout: Optional[float], errors: Dict[str, str]):
+        try:
+            return await asyncio.wait_for(aw, timeout)
+        except asyncio.TimeoutError:
+            errors[name] = "timeout"
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+        return None
+
+    async def aretrieve_ids(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> np.ndarray:
+        """
+        Versión async de retrieve_ids: BM25 (en un hilo) y la rama vectorial corren a la vez,
+        con los timeouts del pipeline y la misma degradación que el modo concurrente.
+        """
+        return (await self._aretrieve_ids(query, top_k, meta_filter))[0]
+
+    async def _aretrieve_ids(self, query: str, top_k: int, meta_filter: Optional[dict]):
+        loop = asyncio.get_running_loop()
+        errors: Dict[str, str] = {}
+        legs = [self._aleg(
+            "bm25", loop.run_in_executor(None, self.bm25.search_slots, query, top_k), self.bm25_timeout, errors
+        )]
+        if self.vec is not None:
+            legs.append(self._aleg("vector", self._avec_search(query, top_k, meta_filter), self.vec_timeout, errors))
+        with span("pipeline.retrieve", top_k=top_k, mode="async") as sp:
+            bm25_res, *rest = await asyncio.gather(*legs)
+            sp.set(degraded=bool(errors), errors=errors or None)
+        vec_res = rest[0] if rest else None
+        self._check_legs(bm25_res, vec_res, errors)
+        return self._fuse_legs(bm25_res, vec_res, top_k), errors
+
+    async def aretrieve_hybrid(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> List[str]:
+        return [self.chunk_id(s) for s in (await self.aretrieve_ids(query, top_k, meta_filter)).tolist()]
+
+    async def aretrieve_with_metadata(
+        self, query: str, top_k: int = 20, per_doc_cap: int = 2, meta_filter: Optional[dict] = None
+    ) -> List[Tuple[str, str, Dict]]:
+        ids, errors = await self._aretrieve_ids(query, self._fetch(top_k), meta_filter)
+        loop = asyncio.get_running_loop()  # MMR pide embeddings: fuera del event loop
+        return self._tuples((await loop.run_in_executor(None, self._select, [ids], top_k, per_doc_cap, errors))[0])
+
+    async def aretrieve_and_rerank(
+        self, query: str, top_retrieve: int = 30, top_final: int = 5, meta_filter: Optional[dict] = None
+    ):
+        key = self._cache_key(query, top_retrieve, top_final, meta_filter)
+        if key is not None:
+            hit = self.result_cache.get(key)
+            if hit is not None:
+                return hit
+        ids, errors = await self._aretrieve_ids(query, self._fetch(top_retrieve), meta_filter)
+        ids = (await asyncio.get_running_loop().run_in_executor(None, self._select, [ids], top_retrieve, 2, errors))[0]
+        if self.cascade is None:
+            scores = await self._batcher("rerank").submit((query, ids))
+        else:
+            c = Cascade(ids, top_final, self.cascade)
+            while True:
+                tranche = c.next()
+                if not len(tranche):
+                    break
+                c.feed(await self._batcher("rerank").submit((query, tranche)))
+            self.cascade_log.append(c.stats())
+            ids, scores = c.result()
+        res = self._reranked(ids, np.asarray(scores), top_final)
+        if key is not None and not errors:
+            self.result_cache.put(key, res)
+        return res
 
     def build_summary_context(self, reranked: List[Tuple[str, str, Dict, float]]) -> str:
         docs = []
@@ -140,7 +702,8 @@ class RagPipeline:
             )
         # Intentar resumen; si falla (sin API key), devolver concatenación
         try:
-            return generar_rag_summary(docs)
+            with span("pipeline.summary", docs=len(docs)):
+                return generar_rag_summary(docs)
         except Exception:
             return "\n\n---\n\n".join(
                 f"{d['text']}\n[{d['source']}" + (f", p. {d['page']}]" if d.get("page") else "]")
@@ -1,13 +1,20 @@
 import os
 from openai import OpenAI
 from dotenv import load_dotenv
+from .tracing import span
 
 # Carga las variables del .env
 load_dotenv()
 
-# Accede a la API key desde la variable de entorno
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+_client = None
+
+def _get_client() -> OpenAI:
+    # se crea en el primer resumen: importar raglib no exige OPENAI_API_KEY (benchmarks, evaluación offline)
+    global _client
+    if _client is None:
+        # Accede a la API key desde la variable de entorno
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 def generar_rag_summary(documentos):
     """
@@ -20,9 +27,10 @@ def generar_rag_summary(documentos):
         prompt += f"[{doc['source']}, p. {doc['page']}]: {doc['text']}\n"
     prompt += "\nResumen:\n"
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
+    with span("summary.llm", docs=len(documentos), prompt_chars=len(prompt)):
+        response = _get_client().chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+        )
     return response.choices[0].message.content.strip()
@@ -1,13 +1,242 @@
 from typing import Dict, List, Tuple, Optional
+import numpy as np
+import torch
 from sentence_transformers import CrossEncoder
+from .passage_tokens import PassageTokens
+from .tracing import span
+
+RERANK_BACKENDS = ("torch", "onnx", "onnx-int8")
+# ONNX int8 (cuantización dinámica) que los modelos cross-encoder/* publican en el Hub;
+# con otro modelo: sentence_transformers.export_dynamic_quantized_onnx_model y onnx_file=...
+DEFAULT_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def length_buckets(lengths: np.ndarray, max_batch_size: int, max_batch_tokens: int) -> List[np.ndarray]:
+    """
+    Índices ordenados por largo, agrupados en batches donde (cantidad x largo del más largo)
+    no pasa de max_batch_tokens: el padding queda acotado al largo de textos parecidos.
+    """
+    order = np.argsort(lengths, kind="stable")
+    buckets, start = [], 0
+    for i in range(1, len(order) + 1):
+        if i == len(order) or i - start >= max_batch_size or (i - start + 1) * lengths[order[i]] > max_batch_tokens:
+            buckets.append(order[start:i])
+            start = i
+    return buckets
+
+
+def _find(seq: List[int], sub: List[int], start: int) -> int:
+    for i in range(start, len(seq) - len(sub) + 1):
+        if seq[i:i + len(sub)] == sub:
+            return i
+    raise ValueError("no se pudo deducir el formato de pares del tokenizer")
+
 
 class CrossEncoderReranker:
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", device: Optional[str] = None):
-        self.model = CrossEncoder(model_name, device=device)
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        device: Optional[str] = None,
+        backend: str = "torch",  # "torch" | "onnx" | "onnx-int8" (ONNX Runtime en CPU)
+        max_length: Optional[int] = None,  # tokens por par (None = el del modelo); lo que sobra se trunca
+        bucket: bool = True,  # agrupar pares por largo (menos padding)
+        max_batch_tokens: int = 16384,  # tope de tokens con padding por batch al agrupar
+        onnx_file: Optional[str] = None,  # archivo ONNX dentro del repo del modelo
+        token_cache: bool = True,  # score_slots: tokens de cada chunk calculados una sola vez
+    ):
+        if backend not in RERANK_BACKENDS:
+            raise ValueError(f"backend inválido: {backend!r} (usar {', '.join(RERANK_BACKENDS)})")
+        self.backend = backend
+        self.bucket = bucket
+        self.max_batch_tokens = max_batch_tokens
+        self.token_cache = token_cache
+        self.passages = PassageTokens()
+        self._store = None  # ChunkStore al que corresponden los slots de self.passages
+        self._template = None
+        kwargs = {"device": device, "max_length": max_length}
+        if backend != "torch":
+            kwargs["backend"] = "onnx"
+            file_name = onnx_file or (DEFAULT_INT8_FILE if backend == "onnx-int8" else None)
+            if file_name:
+                kwargs["model_kwargs"] = {"file_name": file_name}
+        try:
+            self.model = CrossEncoder(model_name, **kwargs)
+        except ImportError as e:
+            raise ImportError(
+                f"backend={backend!r} requiere ONNX Runtime: pip install \"sentence-transformers[onnx]\""
+            ) from e
+        # max_seq_length en versiones nuevas (max_length quedó deprecado); si no, el del tokenizer
+        limit = getattr(self.model, "max_seq_length", None) or max_length
+        if not limit:
+            limit = getattr(getattr(self.model, "tokenizer", None), "model_max_length", None)
+        self.max_length = limit if limit and limit < 100_000 else 512  # sin límite: ~1e30
+
+    def _lengths(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        # aproximación barata (~4 caracteres por token); sólo sirve para ordenar y armar batches
+        est = np.fromiter((len(q) + len(t) for q, t in pairs), dtype=np.int64, count=len(pairs)) // 4 + 3
+        return np.minimum(est, self.max_length)
+
+    def _predict(self, pairs: List[Tuple[str, str]], queries: int = 1, batch_size: int = 32, **kwargs):
+        with span("rerank.predict", pairs=len(pairs), queries=queries) as sp:
+            if not self.bucket or len(pairs) <= 1:
+                return self.model.predict(pairs, batch_size=batch_size, **kwargs)
+            buckets = length_buckets(self._lengths(pairs), batch_size, self.max_batch_tokens)
+            sp.set(batches=len(buckets))
+            out = np.concatenate([
+                np.asarray(self.model.predict([pairs[i] for i in idx.tolist()], batch_size=len(idx), **kwargs))
+                for idx in buckets
+            ])
+            scores = np.empty_like(out)
+            scores[np.concatenate(buckets)] = out  # de vuelta al orden de pairs
+            return scores
 
     def rerank(self, query: str, candidates: List[Tuple[str, str, Dict]]) -> List[Tuple[str, str, Dict, float]]:
         pairs = [(query, c[1]) for c in candidates]
-        scores = self.model.predict(pairs)
+        scores = self._predict(pairs)
         out = [(c[0], c[1], c[2], float(s)) for c, s in zip(candidates, scores)]
         out.sort(key=lambda x: x[3], reverse=True)
         return out
+
+    def rerank_many(
+        self, queries: List[str], candidates: List[List[Tuple[str, str, Dict]]], batch_size: int = 64
+    ) -> List[List[Tuple[str, str, Dict, float]]]:
+        """Re-rankea varias queries juntando todos los pares (query, chunk) en una sola llamada a predict."""
+        pairs = [(q, c[1]) for q, cands in zip(queries, candidates) for c in cands]
+        scores = self._predict(pairs, len(queries), batch_size=batch_size) if pairs else []
+        out, pos = [], 0
+        for cands in candidates:
+            res = [(c[0], c[1], c[2], float(s)) for c, s in zip(cands, scores[pos:pos + len(cands)])]
+            res.sort(key=lambda x: x[3], reverse=True)
+            out.append(res)
+            pos += len(cands)
+        return out
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        """Scores del CrossEncoder para (query, texto), en el orden de texts."""
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(self._predict([(query, t) for t in texts]))
+
+    def score_many(self, queries: List[str], texts: List[List[str]], batch_size: int = 64) -> List[np.ndarray]:
+        """score para varias queries en una sola llamada a predict."""
+        pairs = [(q, t) for q, ts in zip(queries, texts) for t in ts]
+        scores = np.asarray(self._predict(pairs, len(queries), batch_size=batch_size)) if pairs else np.zeros(0, dtype=np.float32)
+        bounds = np.cumsum([0] + [len(ts) for ts in texts])
+        return [scores[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    # Pares armados con token ids: cada chunk se tokeniza una vez (PassageTokens, por slot)
+    # y en cada llamada sólo se tokenizan las queries.
+
+    @property
+    def pretokenized(self) -> bool:
+        return self.token_cache and getattr(self.model, "tokenizer", None) is not None and hasattr(self.model, "model")
+
+    def _tokens_for(self, store) -> PassageTokens:
+        if store is not self._store:
+            self.passages.clear()  # slots de otro almacén
+            self._store = store
+        return self.passages
+
+    def pretokenize(self, store, slots, batch_size: int = 1024) -> int:
+        """Tokeniza los chunks de esos slots que falten (al indexar o en el primer uso); devuelve cuántos."""
+        tokens = self._tokens_for(store)
+        todo = tokens.missing(slots)
+        if len(todo):
+            with span("rerank.pretokenize", chunks=len(todo)):
+                for i in range(0, len(todo), batch_size):
+                    part = todo[i:i + batch_size].tolist()
+                    enc = self.model.tokenizer(
+                        [store.text(s) for s in part], add_special_tokens=False, truncation=True,
+                        max_length=self.max_length,
+                    )
+                    tokens.put(part, enc["input_ids"])
+        return len(todo)
+
+    def _pair_template(self):
+        """Tokens especiales y token types alrededor de (query, chunk), deducidos de un par de prueba."""
+        if self._template is None:
+            tok = self.model.tokenizer
+            enc = tok("a", "b", return_token_type_ids=True)
+            ids = list(enc["input_ids"])
+            types = list(enc.get("token_type_ids") or [0] * len(ids))
+            a = tok("a", add_special_tokens=False)["input_ids"]
+            b = tok("b", add_special_tokens=False)["input_ids"]
+            i = _find(ids, a, 0)
+            j = _find(ids, b, i + len(a))
+            seg = lambda lo, hi: (np.array(ids[lo:hi], dtype=np.int64), np.array(types[lo:hi], dtype=np.int64))
+            self._template = (
+                seg(0, i), types[i], seg(i + len(a), j), types[j], seg(j + len(b), len(ids)),
+                "token_type_ids" in tok.model_input_names, tok.pad_token_id or 0,
+            )
+        return self._template
+
+    def score_slots(self, query: str, slots: np.ndarray, store) -> np.ndarray:
+        """score sobre chunks de un ChunkStore, en el orden de slots."""
+        return self.score_slots_many([query], [slots], store)[0]
+
+    def score_slots_many(self, queries: List[str], slots_lists: List[np.ndarray], store, batch_size: int = 64) -> List[np.ndarray]:
+        """score_many sobre slots: sin tokenizer a mano (p. ej. otro tipo de modelo) usa los textos."""
+        if not self.pretokenized:
+            texts = [[store.text(s) for s in np.asarray(ss).tolist()] for ss in slots_lists]
+            return self.score_many(queries, texts, batch_size)
+        slots_lists = [np.asarray(ss, dtype=np.int64) for ss in slots_lists]
+        bounds = np.cumsum([0] + [len(ss) for ss in slots_lists])
+        if not bounds[-1]:
+            return [np.zeros(0, dtype=np.float32) for _ in slots_lists]
+        slots = np.concatenate(slots_lists)
+        tokens = self._tokens_for(store)
+        self.pretokenize(store, slots)
+        with span("rerank.predict", pairs=len(slots), queries=len(queries)) as sp:
+            q_ids = self.model.tokenizer(
+                list(queries), add_special_tokens=False, truncation=True, max_length=self.max_length
+            )["input_ids"]
+            qidx = np.repeat(np.arange(len(queries)), np.diff(bounds))
+            scores = self._predict_ids(q_ids, qidx, slots, tokens, batch_size, sp)
+        return [scores[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    def _predict_ids(self, q_ids, qidx: np.ndarray, slots: np.ndarray, tokens: PassageTokens, batch_size: int, sp):
+        (pre, tpre), tq, (mid, tmid), tp, (suf, tsuf), with_types, pad = self._pair_template()
+        budget = self.max_length - len(pre) - len(mid) - len(suf)
+        ql = np.array([len(q) for q in q_ids], dtype=np.int64)[qidx]
+        pl = tokens.lengths(slots).astype(np.int64)
+        # truncado "longest_first" como el tokenizer: se recorta el más largo; si los dos pasan
+        # de la mitad del presupuesto quedan en ceil/floor(budget / 2)
+        fits = ql + pl <= budget
+        one = np.minimum(ql, pl) <= budget - np.minimum(ql, pl)
+        lq = np.where(fits | (one & (ql <= pl)), ql, np.where(one, budget - pl, (budget + 1) // 2))
+        lp = np.where(fits | (one & (pl < ql)), pl, np.where(one, budget - ql, budget // 2))
+        total = lq + lp + (self.max_length - budget)
+        if self.bucket:
+            buckets = length_buckets(total, batch_size, self.max_batch_tokens)
+        else:
+            buckets = [np.arange(i, min(i + batch_size, len(total))) for i in range(0, len(total), batch_size)]
+        sp.set(batches=len(buckets))
+        scores = np.empty(len(total), dtype=np.float32)
+        for idx in buckets:
+            width = int(total[idx].max())
+            input_ids = np.full((len(idx), width), pad, dtype=np.int64)
+            mask = np.zeros((len(idx), width), dtype=np.int64)
+            types = np.zeros((len(idx), width), dtype=np.int64)
+            for r, k in enumerate(idx.tolist()):
+                q = q_ids[qidx[k]][:lq[k]]
+                p = tokens.get(slots[k])[:lp[k]]
+                n = int(total[k])
+                input_ids[r, :n] = np.concatenate([pre, q, mid, p, suf])
+                mask[r, :n] = 1
+                if with_types:
+                    types[r, :n] = np.concatenate([tpre, np.full(len(q), tq), tmid, np.full(len(p), tp), tsuf])
+            feats = {"input_ids": input_ids, "attention_mask": mask}
+            if with_types:
+                feats["token_type_ids"] = types
+            scores[idx] = self._forward(feats)
+        return scores
+
+    def _forward(self, feats: Dict[str, np.ndarray]) -> np.ndarray:
+        with torch.inference_mode():
+            out = self.model.model(**{k: torch.from_numpy(v).to(self.model.device) for k, v in feats.items()},
+                                   return_dict=True)
+            logits = out.logits
+            if getattr(self.model, "activation_fn", None) is not None:
+                logits = self.model.activation_fn(logits)
+            scores = logits.float().cpu().numpy()
+        return scores[:, 0] if scores.ndim == 2 and scores.shape[1] == 1 else scores
@@ -0,0 +1,159 @@
+"""
+Caché de resultados de retrieve_and_rerank
+------------------------------------------
+- Clave: hash de (query normalizada, top_retrieve, top_final, meta_filter, configuración del pipeline).
+- Cada entrada guarda la versión del corpus con la que se calculó: si el corpus cambia
+  (upsert, documentos agregados o quitados) la versión cambia y las entradas viejas dejan de valer.
+- LRU en memoria con TTL y, opcionalmente, un nivel en disco (un JSON por clave, dentro de
+  una carpeta por versión) que sobrevive reinicios y se comparte entre procesos: la versión de
+  RagPipeline sale de un hash de los chunks, así que el mismo corpus cae en la misma carpeta.
+  Las carpetas de otras versiones se borran por antigüedad con gc(), que set_version llama
+  al cambiar de versión; nunca se borra una carpeta que otro proceso pueda estar usando.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _SPACES.sub(" ", (query or "").strip().lower())
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 3600.0,  # segundos (None = sin vencimiento)
+        folder: Optional[Union[str, Path]] = None,  # nivel en disco opcional
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.folder = Path(folder) if folder is not None else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.version: Optional[str] = None
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # clave -> (vence, JSON)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, top_retrieve: int, top_final: int, meta_filter: Optional[dict], config: Dict) -> str:
+        payload = json.dumps(
+            [normalize_query(query), top_retrieve, top_final, meta_filter, config], sort_keys=True, default=str
+        )
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+            "hit_rate": self.hit_rate, "entries": len(self._mem), "version": self.version,
+        }
+
+    def set_version(self, version: str):
+        """
+        Versión actual del corpus; si cambió se vacía la memoria. En disco sólo se borran las
+        carpetas vencidas (gc): otros procesos pueden seguir usando otra versión (p. ej. durante
+        un deploy escalonado).
+        """
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._mem.clear()
+        self.gc()
+
+    def gc(self, max_age: Optional[float] = None) -> int:
+        """
+        Borra del disco las carpetas de otras versiones sin escrituras hace más de max_age segundos
+        (por defecto el TTL: sus entradas ya vencieron todas). Devuelve cuántas borró.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        if self.folder is None or max_age is None or not self.folder.exists():
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for d in self.folder.iterdir():
+            if not d.is_dir() or d.name == self.version:
+                continue
+            # put() escribe en version/xx/: la última escritura es el mtime más nuevo de esas subcarpetas
+            last = max([d.stat().st_mtime] + [s.stat().st_mtime for s in d.iterdir() if s.is_dir()])
+            if last < cutoff:
+                shutil.rmtree(d, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _path(self, key: str) -> Path:
+        return self.folder / self.version / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[Tuple]]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._decode(entry[1])
+            if entry is not None:
+                del self._mem[key]
+        if self.folder is not None and self.version is not None:
+            try:
+                with self._path(key).open("r", encoding="utf-8") as f:
+                    disk = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                disk = None
+            if disk is not None and (disk["expires"] is None or disk["expires"] > now):
+                payload = json.dumps(disk["value"], ensure_ascii=False)
+                with self._lock:
+                    self._remember(key, disk["expires"], payload)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return self._decode(payload)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: List[Tuple]):
+        expires = None if self.ttl is None else time.time() + self.ttl
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, expires, payload)
+        if self.folder is not None and self.version is not None:
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # escritura atómica: otro proceso nunca ve un archivo a medio escribir
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f'{{"expires": {json.dumps(expires)}, "value": {payload}}}')
+            os.replace(tmp, path)
+
+    def _remember(self, key: str, expires: Optional[float], payload: str):
+        self._mem[key] = (expires, payload)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    @staticmethod
+    def _decode(payload: str) -> List[Tuple]:
+        # se guarda serializado: cada get devuelve objetos nuevos (el llamador puede modificarlos)
+        return [tuple(row) for row in json.loads(payload)]
+
+    def clear(self):
+        """Vacía la memoria; el disco no se toca (otros procesos pueden estar leyéndolo, ver gc)."""
+        with self._lock:
+            self._mem.clear()
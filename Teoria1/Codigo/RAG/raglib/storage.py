@@ -0,0 +1,101 @@
+"""
+Utilidades de persistencia en arrays planos
+-------------------------------------------
+- Cada array se guarda como .npy y se puede abrir memory-mapped (sólo lectura),
+  así varios procesos comparten una única copia en el page cache.
+- Las listas de strings se guardan como un buffer UTF-8 contiguo + array de offsets.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+import json
+import numpy as np
+
+
+def save_array(folder: Path, name: str, arr: np.ndarray):
+    np.save(folder / f"{name}.npy", np.ascontiguousarray(arr), allow_pickle=False)
+
+
+def load_array(folder: Path, name: str, mmap: bool = True) -> np.ndarray:
+    return np.load(folder / f"{name}.npy", mmap_mode="r" if mmap else None, allow_pickle=False)
+
+
+def save_meta(folder: Path, meta: Dict):
+    (folder / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+
+def load_meta(folder: Path) -> Dict:
+    return json.loads((folder / "meta.json").read_text(encoding="utf-8"))
+
+
+def encode_strings(items: Iterable[str]):
+    """Lista de strings -> (buffer uint8 con UTF-8 concatenado, offsets int64 de largo n+1)."""
+    encoded = [s.encode("utf-8") for s in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return buf, offsets
+
+
+def save_strings(folder: Path, name: str, items: Iterable[str]):
+    buf, offsets = encode_strings(items)
+    save_array(folder, f"{name}_bytes", buf)
+    save_array(folder, f"{name}_offsets", offsets)
+
+
+class StringColumn(Sequence):
+    """
+    Secuencia de strings respaldada por un buffer UTF-8 + offsets (posiblemente memory-mapped).
+    Las altas y modificaciones posteriores viven en memoria sobre la base inmutable.
+    """
+
+    def __init__(self, buf: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self._buf = buf if buf is not None else np.zeros(0, dtype=np.uint8)
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._base_n = len(self._offsets) - 1
+        self._extra: List[str] = []
+        self._patched: Dict[int, str] = {}
+
+    @classmethod
+    def load(cls, folder: Path, name: str, mmap: bool = True) -> "StringColumn":
+        return cls(load_array(folder, f"{name}_bytes", mmap), load_array(folder, f"{name}_offsets", mmap))
+
+    def __len__(self) -> int:
+        return self._base_n + len(self._extra)
+
+    def _get(self, i: int) -> str:
+        if i in self._patched:
+            return self._patched[i]
+        if i >= self._base_n:
+            return self._extra[i - self._base_n]
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._buf[lo:hi]).decode("utf-8")
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self._get(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._get(i)
+
+    def __setitem__(self, i: int, value: str):
+        if i >= self._base_n:
+            self._extra[i - self._base_n] = value
+        else:
+            self._patched[i] = value
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self._get(i)
+
+    def append(self, value: str):
+        self._extra.append(value)
+
+    def extend(self, values: Iterable[str]):
+        self._extra.extend(values)
+
+
+def load_strings(folder: Path, name: str) -> List[str]:
+    return list(StringColumn.load(folder, name, mmap=False))
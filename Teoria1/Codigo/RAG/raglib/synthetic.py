@@ -0,0 +1,118 @@
+"""
+Corpus y queries sintéticos (reproducibles)
+-------------------------------------------
+- Documentos en español y en inglés: palabras frecuentes de cada idioma + un vocabulario
+  de términos inventados con distribución tipo Zipf, y términos propios de cada tema
+  para que las queries tengan documentos relevantes bien definidos.
+- Todo sale de un numpy Generator con semilla: misma semilla -> mismo corpus y mismas queries.
+- El tamaño se pide en chunks aproximados (cada documento trae entre 1 y 6 "chunks" de
+  words_per_chunk palabras); el número real depende del chunker (max_tokens / overlap).
+"""
+
+from typing import Dict, List, Set, Tuple
+import numpy as np
+from .documents import Document
+
+_ES = (
+    "el la de que y en a los se del las un por con no una su para es al lo como más pero sus le "
+    "ya o este sí porque esta entre cuando muy sin sobre también me hasta hay donde quien desde "
+    "todo nos durante todos uno les ni contra otros ese eso ante ellos e esto mí antes algunos "
+    "qué unos yo otro otras otra él tanto esa estos mucho quienes nada muchos cual poco ella "
+    "estar estas algunas algo nosotros sistema datos modelo proceso análisis resultado estudio "
+    "método valor función forma parte caso tiempo trabajo información desarrollo problema"
+).split()
+_EN = (
+    "the of and to in a is that for it as was with be by on not he this are or his from at "
+    "which but have an they you were her she there been one all we their has would when if "
+    "more will about up out them what some could other into than its then these two may "
+    "system data model process analysis result study method value function form part case "
+    "time work information development problem network learning training query index"
+).split()
+_SYLLABLES = (
+    "ba be bi bo bu ca ce ci co cu da de di do du fa fe fi fo fu ga ge gi go gu la le li lo lu "
+    "ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu "
+    "va ve vi vo tra tre tri pro pre cla cle ser ter tor mar ran ton len"
+).split()
+
+
+def _pseudo_words(rng: np.random.Generator, n: int) -> List[str]:
+    """n palabras inventadas distintas (2 a 4 sílabas)."""
+    out, seen = [], set()
+    syl = np.array(_SYLLABLES, dtype=object)
+    while len(out) < n:
+        k = int(rng.integers(2, 5))
+        w = "".join(syl[rng.integers(0, len(syl), size=k)])
+        if w not in seen:
+            seen.add(w)
+            out.append(w)
+    return out
+
+
+def _zipf_cdf(n: int, s: float = 1.1) -> np.ndarray:
+    p = np.cumsum(1.0 / np.arange(1, n + 1) ** s)
+    return p / p[-1]
+
+
+def synthetic_corpus(
+    n_chunks: int,
+    seed: int = 0,
+    words_per_chunk: int = 90,  # con chunks de 120 tokens y solapamiento 30 (~90 palabras nuevas por chunk)
+    vocab_size: int = 20000,
+    n_topics: int = 200,
+    langs: Tuple[str, ...] = ("es", "en"),
+) -> List[Document]:
+    """Documentos sintéticos (tipo páginas de PDF) que suman ~n_chunks chunks."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array(_pseudo_words(rng, vocab_size), dtype=object)
+    vocab_cdf = _zipf_cdf(vocab_size)  # muestreo por searchsorted (rng.choice con p es O(vocab) por llamada)
+    topic_terms = rng.integers(0, vocab_size, size=(n_topics, 12))
+    common = {"es": np.array(_ES, dtype=object), "en": np.array(_EN, dtype=object)}
+
+    docs: List[Document] = []
+    total = 0
+    while total < n_chunks:
+        i = len(docs)
+        lang = langs[i % len(langs)]
+        topic = int(rng.integers(0, n_topics))
+        n_words = int(rng.integers(1, 7)) * words_per_chunk
+        # mezcla: 45% palabras frecuentes del idioma, 45% vocabulario Zipf, 10% términos del tema
+        kind = rng.random(n_words)
+        words = np.empty(n_words, dtype=object)
+        m = kind < 0.45
+        words[m] = common[lang][rng.integers(0, len(common[lang]), size=int(m.sum()))]
+        m = (kind >= 0.45) & (kind < 0.9)
+        words[m] = vocab[np.minimum(np.searchsorted(vocab_cdf, rng.random(int(m.sum()))), vocab_size - 1)]
+        m = kind >= 0.9
+        words[m] = vocab[topic_terms[topic][rng.integers(0, 12, size=int(m.sum()))]]
+        # oraciones de 8 a 20 palabras, con mayúscula inicial y punto final
+        sentences, pos = [], 0
+        while pos < n_words:
+            k = int(rng.integers(8, 21))
+            s = " ".join(words[pos:pos + k])
+            sentences.append(s[:1].upper() + s[1:] + ".")
+            pos += k
+        docs.append(Document(f"syn{i:07d}", " ".join(sentences), f"synthetic_{lang}_{topic:03d}.pdf", i % 300 + 1))
+        total += n_words // words_per_chunk
+    return docs
+
+
+def synthetic_queries(
+    docs: List[Document], n_queries: int, seed: int = 0, min_terms: int = 2, max_terms: int = 5
+) -> Tuple[List[str], Dict[str, Set[str]]]:
+    """
+    Queries armadas con palabras de un documento elegido al azar -> (queries, qrels) con
+    qrels {query: {doc_id}} en el formato de load_qrels_csv.
+    """
+    rng = np.random.default_rng(seed + 1)
+    queries: List[str] = []
+    qrels: Dict[str, Set[str]] = {}
+    for j in rng.integers(0, len(docs), size=n_queries).tolist():
+        words = [w.strip(".").lower() for w in docs[j].text.split()]
+        words = [w for w in words if len(w) > 3]
+        if not words:
+            continue
+        k = int(rng.integers(min_terms, max_terms + 1))
+        q = " ".join(words[i] for i in rng.integers(0, len(words), size=k).tolist())
+        queries.append(q)
+        qrels.setdefault(q, set()).add(docs[j].id)
+    return queries, qrels
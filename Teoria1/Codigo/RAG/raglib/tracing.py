@@ -0,0 +1,192 @@
+"""
+Trazas por etapa del camino de consulta
+---------------------------------------
+- span("bm25.score", queries=3) mide el tiempo de pared de un bloque; dentro del bloque
+  sp.set(candidates=n) agrega contadores (candidatos, tamaños de batch, etc.).
+- Los spans se publican en un sink enchufable: MemorySink (histogramas en memoria),
+  JsonlSink (una línea JSON por span) u OTelSink (OpenTelemetry, si está instalado).
+- Sin sink configurado (por defecto) span() devuelve un objeto no-op compartido:
+  el costo es una llamada a función y un if.
+"""
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import json
+import threading
+import time
+import numpy as np
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+_sink = None
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration_ms", "error", "_t0", "_sink")
+
+    def __init__(self, name: str, sink, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.duration_ms = 0.0
+        self._sink = sink
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000.0
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self._sink.emit(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict:
+        out = {"name": self.name, "start": self.start, "duration_ms": self.duration_ms, **self.attrs}
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+def span(name: str, **attrs):
+    """Context manager que mide una etapa (no-op si no hay sink)."""
+    sink = _sink
+    if sink is None:
+        return _NOOP
+    return Span(name, sink, attrs)
+
+
+def set_sink(sink) -> None:
+    """Activa las trazas con ese sink (None las desactiva)."""
+    global _sink
+    _sink = sink
+
+
+def get_sink():
+    return _sink
+
+
+class MemorySink:
+    """Histogramas en memoria: duraciones y atributos numéricos por etapa."""
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._durations: Dict[str, List[float]] = defaultdict(list)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._attrs: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._lock = threading.Lock()
+
+    def emit(self, sp: Span):
+        with self._lock:
+            self._counts[sp.name] += 1
+            if sp.error is not None:
+                self._errors[sp.name] += 1
+            durs = self._durations[sp.name]
+            durs.append(sp.duration_ms)
+            if len(durs) > self.max_samples:
+                del durs[: len(durs) - self.max_samples]  # ventana con las muestras más recientes
+            for k, v in sp.attrs.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    vals = self._attrs[sp.name][k]
+                    vals.append(float(v))
+                    if len(vals) > self.max_samples:
+                        del vals[: len(vals) - self.max_samples]
+
+    def summary(self, percentiles=(50, 90, 99)) -> Dict[str, Dict]:
+        """{etapa: {count, errors, mean_ms, p50_ms, ..., <atributo>_mean}}."""
+        with self._lock:
+            out = {}
+            for name, durs in self._durations.items():
+                d = np.asarray(durs)
+                row = {"count": self._counts[name], "errors": self._errors[name], "mean_ms": float(d.mean())}
+                for p, v in zip(percentiles, np.percentile(d, percentiles)):
+                    row[f"p{p}_ms"] = float(v)
+                for k, vals in self._attrs[name].items():
+                    row[f"{k}_mean"] = float(np.mean(vals))
+                out[name] = row
+            return out
+
+    def report(self) -> str:
+        lines = [f"{'etapa':<28} {'n':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}"]
+        for name, row in sorted(self.summary().items()):
+            lines.append(
+                f"{name:<28} {row['count']:>6} {row['p50_ms']:>9.2f} {row['p90_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+            )
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._errors.clear()
+            self._attrs.clear()
+
+
+class JsonlSink:
+    """Una línea JSON por span (append), para analizar después."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, sp: Span):
+        line = json.dumps(sp.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class OTelSink:
+    """Publica cada etapa como span de OpenTelemetry (requiere opentelemetry-api)."""
+
+    def __init__(self, tracer_name: str = "raglib"):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("OTelSink requiere opentelemetry-api: pip install opentelemetry-api") from e
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def emit(self, sp: Span):
+        start_ns = int(sp.start * 1e9)
+        otel = self._tracer.start_span(sp.name, start_time=start_ns)
+        for k, v in sp.attrs.items():
+            otel.set_attribute(k, v if isinstance(v, (bool, int, float, str)) else str(v))
+        if sp.error is not None:
+            otel.set_attribute("error.type", sp.error)
+        otel.end(end_time=start_ns + int(sp.duration_ms * 1e6))
+
+
+class FanoutSink:
+    """Reenvía cada span a varios sinks."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def emit(self, sp: Span):
+        for s in self.sinks:
+            s.emit(sp)
@@ -0,0 +1,398 @@
+"""
+Índice vectorial local (en proceso)
+-----------------------------------
+Alternativa a PineconeSearcher con el mismo contrato (upsert_chunks / search / registry),
+para trabajar offline, en CI o con corpus de algunos millones de chunks sin ida y vuelta de red.
+- mode="exact": producto matricial con NumPy + top-k parcial (argpartition).
+- mode="ivf": k-means esférico sobre los vectores; cada query sólo puntúa las n_probe listas
+  más cercanas (aproximado).
+- Los vectores se guardan en un .npy que se abre memory-mapped al cargar.
+- Soporta filtros de metadatos con la sintaxis de Pinecone ($eq, $ne, $in, $nin,
+  $gt, $gte, $lt, $lte, $and, $or).
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from .vector_pinecone import embedding_dimension, make_chunk_id, place_chunks
+from .chunk_store import ChunkRegistry, ChunkStore
+from .embedding_cache import EmbeddingCache
+from .chunk_manifest import ChunkManifest, chunk_hash
+from .storage import load_array, load_meta, save_array, save_meta
+from .tracing import span
+
+_FORMAT = "local-vectors-v2"
+
+_CMP: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda x, v: x == v,
+    "$ne": lambda x, v: x != v,
+    "$gt": lambda x, v: x is not None and x > v,
+    "$gte": lambda x, v: x is not None and x >= v,
+    "$lt": lambda x, v: x is not None and x < v,
+    "$lte": lambda x, v: x is not None and x <= v,
+    "$in": lambda x, v: x in v,
+    "$nin": lambda x, v: x not in v,
+}
+
+
+@dataclass
+class LocalVectorSearcher:
+    """
+    Maneja embeddings + upsert + query sobre un índice en memoria (o memory-mapped).
+    Guarda registro local (chunk_id -> meta) igual que PineconeSearcher.
+    """
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    path: Optional[str] = None   # carpeta de persistencia; si existe se carga al iniciar
+    mode: str = "exact"          # "exact" | "ivf"
+    n_lists: Optional[int] = None  # listas IVF (por defecto ~sqrt(N))
+    n_probe: int = 8
+    mmap: bool = True
+    namespace: str = "default"   # sólo informativo, por compatibilidad con PineconeSearcher
+    embedding_cache: Optional[EmbeddingCache] = None  # caché persistente de embeddings (opcional)
+    store: Optional[ChunkStore] = None  # almacén de chunks (se comparte con RagPipeline)
+
+    def __post_init__(self):
+        if self.mode not in ("exact", "ivf"):
+            raise ValueError(f"mode inválido: {self.mode!r} (usar 'exact' o 'ivf')")
+        if self.store is None:
+            self.store = ChunkStore()
+        self.model = SentenceTransformer(self.model_name)
+        self.dim = embedding_dimension(self.model)
+        self.clear_namespace()
+        if self.path and (Path(self.path) / "meta.json").exists():
+            self._load(Path(self.path))
+
+    def clear_namespace(self):
+        """Borra todos los vectores del índice local."""
+        self._vecs = np.zeros((0, self.dim), dtype=np.float32)
+        self._n = 0                         # filas usadas de _vecs (el resto es capacidad libre)
+        self._ids: List[Optional[str]] = []  # chunk_id por fila (None = borrada)
+        self._slot = np.zeros(0, dtype=np.int64)  # slot del almacén por fila (-1 = borrada)
+        self._row: Dict[str, int] = {}
+        self.registry = ChunkRegistry(self.store)  # chunk_id -> meta (armada desde el almacén)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._slot_rows: Optional[np.ndarray] = None  # slot -> fila (-1 = sin vector), se arma al usarse
+        self._reset_ivf()
+
+    def _reset_ivf(self):
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_n = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def _encode(self, texts: List[str], query: bool = False, persist: bool = True) -> np.ndarray:
+        with span("vector.encode", batch=len(texts), query=query):
+            if self.embedding_cache is None:
+                return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+            return self.embedding_cache.encode(
+                self.model, self.model_name, texts, normalize=True, query=query, persist=persist
+            )
+
+    # escritura
+
+    def _reserve(self, extra: int):
+        need = self._n + extra
+        if need > len(self._vecs) or not self._vecs.flags.writeable:
+            cap = max(need, 2 * len(self._vecs), 1024)
+            vecs = np.zeros((cap, self.dim), dtype=np.float32)
+            vecs[:self._n] = self._vecs[:self._n]  # copy-on-write si venía memory-mapped
+            self._vecs = vecs
+            slot = np.full(cap, -1, dtype=np.int64)
+            slot[:self._n] = self._slot[:self._n]
+            self._slot = slot
+
+    def _alive(self) -> np.ndarray:
+        return self._slot[:self._n] >= 0
+
+    def _write(self, ids: List[str], embs: np.ndarray, slots: np.ndarray):
+        self._reserve(len(ids))
+        self.registry.set(ids, slots)
+        for cid, v, slot in zip(ids, embs, slots.tolist()):
+            row = self._row.get(cid)
+            if row is None:
+                row = self._n
+                self._n += 1
+                self._ids.append(cid)
+                self._row[cid] = row
+            self._vecs[row] = v
+            self._slot[row] = slot
+            if row < len(self._assign):
+                self._assign[row] = -1  # el vector cambió: reasignar a su lista IVF
+        self._columns.clear()
+        self._slot_rows = None
+        self._lists = None
+
+    def upsert_chunks(self, chunks_per_doc: Dict[str, List[str]], docs_meta: Dict[str, Dict]):
+        self._upsert_slots(self._place(chunks_per_doc, docs_meta)[1])
+
+    def _place(self, chunks_per_doc: Dict[str, List[str]], docs_meta: Dict[str, Dict]) -> Tuple[List[str], np.ndarray]:
+        ids, slots = place_chunks(self.registry, chunks_per_doc, docs_meta, on_detach=self._detached)
+        self.store = self.registry.store
+        return ids, slots
+
+    def _detached(self, remap: np.ndarray):
+        """El registro dejó el almacén compartido: las filas pasan a apuntar a su copia."""
+        slot = self._slot[:self._n]
+        alive = slot >= 0
+        slot[alive] = remap[slot[alive]]
+        self._columns.clear()
+        self._slot_rows = None
+
+    def upsert_slots(self, store: ChunkStore, slots: np.ndarray):
+        """Sube chunks que ya están en un ChunkStore (el de RagPipeline) sin duplicar el texto."""
+        slots = self.registry.adopt(store, slots)
+        self.store = self.registry.store
+        self._upsert_slots(slots)
+
+    def sync_chunks(
+        self, chunks_per_doc: Dict[str, List[str]], docs_meta: Dict[str, Dict], manifest: ChunkManifest
+    ) -> Dict[str, int]:
+        """Re-ingesta incremental contra el manifiesto (ver PineconeSearcher.sync_chunks)."""
+        ids, slots = self._place(chunks_per_doc, docs_meta)
+        hashes = [chunk_hash(self.store.meta(s)) for s in slots.tolist()]
+        added, changed, removed = manifest.diff(ids, hashes)
+        todo = added + changed
+        self.registry.set(ids, slots)
+        self._upsert_slots(slots[todo])
+        self.delete_chunks(removed)
+        manifest.replace(ids, hashes)
+        manifest.save()
+        stats = {"added": len(added), "changed": len(changed), "removed": len(removed),
+                 "unchanged": len(ids) - len(todo)}
+        print(f"[SYNC] local mode={self.mode} {stats}")
+        return stats
+
+    def _upsert_slots(self, slots: np.ndarray):
+        if not len(slots):
+            return
+        st = self.store
+        ids = [make_chunk_id(st.doc_id(s), st.local_idx(s)) for s in slots.tolist()]
+        embs = self._encode([st.text(s) for s in slots.tolist()])
+        self._write(ids, np.asarray(embs, dtype=np.float32), slots)
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
+        print(f"[UPSERT] local mode={self.mode} vectors={len(ids)} total={len(self)}")
+
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Borra chunks por id del índice y del registro local."""
+        for cid in chunk_ids:
+            row = self._row.pop(cid, None)
+            if row is not None:
+                self._ids[row] = None
+                self._slot[row] = -1
+                self.registry.pop(cid, None)
+        self._columns.clear()
+        self._slot_rows = None
+        self._lists = None
+
+    # filtros de metadatos
+
+    def _column(self, field: str) -> np.ndarray:
+        col = self._columns.get(field)
+        if col is None:
+            col = self.store.values(field, np.maximum(self._slot[:self._n], 0))  # filas borradas: las descarta la máscara
+            self._columns[field] = col
+        return col
+
+    def _match(self, flt: Dict) -> np.ndarray:
+        mask = np.ones(self._n, dtype=bool)
+        for key, cond in flt.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._match(sub)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self._match(sub) for sub in cond]) if cond else False
+            else:
+                ops = cond if isinstance(cond, dict) else {"$eq": cond}
+                col = self._column(key)
+                for op, v in ops.items():
+                    if op not in _CMP:
+                        raise ValueError(f"Operador de filtro no soportado: {op}")
+                    if op in ("$in", "$nin"):
+                        v = set(v)
+                    fn = _CMP[op]
+                    mask &= np.fromiter((fn(x, v) for x in col), dtype=bool, count=self._n)
+        return mask
+
+    def _candidates(self, meta_filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Filas vivas que cumplen el filtro (None = todas las filas vivas, sin filtro)."""
+        if not meta_filter and len(self._row) == self._n:
+            return None
+        mask = self._alive()
+        if meta_filter:
+            mask &= self._match(meta_filter)
+        return np.flatnonzero(mask)
+
+    # IVF
+
+    def _train_ivf(self):
+        live = np.flatnonzero(self._alive())
+        k = self.n_lists or max(1, int(np.sqrt(len(live))))
+        k = min(k, len(live))
+        rng = np.random.default_rng(0)
+        sample = self._vecs[rng.choice(live, size=min(len(live), 256 * k), replace=False)]
+        cent = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+        for _ in range(10):  # k-means esférico (vectores normalizados -> producto punto)
+            lab = np.argmax(sample @ cent.T, axis=1)
+            sums = np.zeros_like(cent)
+            np.add.at(sums, lab, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            cent = np.where(empty[:, None], cent, sums / np.where(norms == 0, 1, norms))
+        self._centroids = cent.astype(np.float32)
+        self._trained_n = len(live)
+        self._assign = np.full(self._n, -1, dtype=np.int32)
+
+    def _ivf_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(filas ordenadas por lista, offsets) -> filas de la lista j = rows[off[j]:off[j+1]]."""
+        if self._centroids is None or len(self) > 2 * self._trained_n:
+            self._train_ivf()
+        if self._lists is None:
+            if len(self._assign) < self._n:
+                self._assign = np.concatenate([self._assign, np.full(self._n - len(self._assign), -1, np.int32)])
+            todo = np.flatnonzero(self._assign[:self._n] < 0)
+            for lo in range(0, len(todo), 65536):
+                part = todo[lo:lo + 65536]
+                self._assign[part] = np.argmax(self._vecs[part] @ self._centroids.T, axis=1)
+            rows = np.flatnonzero(self._alive())
+            lab = self._assign[rows]
+            order = np.argsort(lab, kind="stable")
+            offsets = np.zeros(len(self._centroids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(lab, minlength=len(self._centroids)), out=offsets[1:])
+            self._lists = (rows[order], offsets)
+        return self._lists
+
+    def _ivf_rows(self, q: np.ndarray) -> np.ndarray:
+        rows, offsets = self._ivf_lists()
+        n_probe = min(self.n_probe, len(self._centroids))
+        probe = np.argpartition(-(self._centroids @ q), n_probe - 1)[:n_probe]
+        return np.sort(np.concatenate([rows[offsets[j]:offsets[j + 1]] for j in probe]))
+
+    # búsqueda
+
+    def _top_rows(self, q: np.ndarray, top_k: int, cand: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(filas, scores) de los top_k vectores más similares, de mayor a menor."""
+        with span("vector.search", mode=self.mode, top_k=top_k) as sp:
+            if self.mode == "ivf" and len(self):
+                rows = self._ivf_rows(q)
+                cand = rows if cand is None else np.intersect1d(rows, cand, assume_unique=True)
+            scores = self._vecs[:self._n] @ q if cand is None else self._vecs[cand] @ q
+            sp.set(candidates=len(scores))
+            k = min(top_k, len(scores))
+            if k <= 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            part = np.argpartition(-scores, k - 1)[:k]
+            part = part[np.argsort(-scores[part], kind="stable")]
+            return (part if cand is None else cand[part]), scores[part]
+
+    def _top(self, q: np.ndarray, top_k: int, cand: Optional[np.ndarray]) -> List[Tuple[str, float, Dict]]:
+        rows, scores = self._top_rows(q, top_k, cand)
+        out = []
+        for r, s in zip(rows.tolist(), scores.tolist()):
+            cid = self._ids[r]
+            out.append((cid, float(s), self.registry[cid]))
+        return out
+
+    def search(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> List[Tuple[str, float, Dict]]:
+        """
+        Devuelve [(chunk_id, score, meta)], score mayor = más similar (coseno)
+        """
+        q = self._encode([query], query=True)[0]
+        return self._top(np.asarray(q, dtype=np.float32), top_k, self._candidates(meta_filter))
+
+    def search_many(
+        self, queries: List[str], top_k: int = 50, meta_filter: Optional[dict] = None, workers: int = 1
+    ) -> List[List[Tuple[str, float, Dict]]]:
+        """Versión por lotes de search: un solo batch de embeddings y el filtro se evalúa una vez."""
+        if not queries:
+            return []
+        embs = np.asarray(self._encode(queries, query=True), dtype=np.float32)
+        cand = self._candidates(meta_filter)
+        return [self._top(q, top_k, cand) for q in embs]
+
+    def search_slots(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Como search pero devuelve (slots del almacén, scores): sin armar ids ni metadatos."""
+        return self.search_slots_many([query], top_k, meta_filter)[0]
+
+    def search_slots_many(
+        self, queries: List[str], top_k: int = 50, meta_filter: Optional[dict] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not queries:
+            return []
+        embs = np.asarray(self._encode(queries, query=True), dtype=np.float32)
+        cand = self._candidates(meta_filter)
+        out = []
+        for q in embs:
+            rows, scores = self._top_rows(q, top_k, cand)
+            out.append((self._slot[rows], scores))
+        return out
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings de queries (para juntarlos en batch desde afuera, ver search_slots_vector)."""
+        return np.asarray(self._encode(queries, query=True), dtype=np.float32)
+
+    def search_slots_vector(
+        self, q: np.ndarray, top_k: int = 50, meta_filter: Optional[dict] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """search_slots con el embedding de la query ya calculado."""
+        rows, scores = self._top_rows(np.asarray(q, dtype=np.float32), top_k, self._candidates(meta_filter))
+        return self._slot[rows], scores
+
+    def _rows_of(self, slots: np.ndarray) -> np.ndarray:
+        inv = self._slot_rows
+        if inv is None:
+            rows = np.flatnonzero(self._alive())
+            inv = np.full(int(self._slot[rows].max()) + 1 if len(rows) else 0, -1, dtype=np.int64)
+            inv[self._slot[rows]] = rows
+            self._slot_rows = inv
+        out = np.full(len(slots), -1, dtype=np.int64)
+        ok = slots < len(inv)
+        out[ok] = inv[slots[ok]]
+        return out
+
+    def vectors_of(self, store: ChunkStore, slots: np.ndarray) -> np.ndarray:
+        """
+        Embeddings normalizados de esos slots de store (p. ej. para MMR): salen del índice sin
+        recalcular; los que no están indexados (u otro almacén) se codifican.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        rows = self._rows_of(slots) if store is self.store else np.full(len(slots), -1, dtype=np.int64)
+        out = np.empty((len(slots), self.dim), dtype=np.float32)
+        have = rows >= 0
+        out[have] = self._vecs[rows[have]]
+        if not have.all():
+            miss = np.flatnonzero(~have)
+            out[miss] = self._encode([store.text(s) for s in slots[miss].tolist()], persist=False)
+        return out
+
+    # persistencia
+
+    def save(self, path: Optional[str] = None):
+        """Guarda vectores (.npy, memory-mappable) y los chunks (ChunkStore) en la carpeta path."""
+        folder = Path(path or self.path)
+        folder.mkdir(parents=True, exist_ok=True)
+        rows = np.flatnonzero(self._alive())
+        save_array(folder, "vectors", self._vecs[rows])
+        self.store.take(self._slot[rows]).save(folder, "chunks")
+        save_meta(folder, {"format": _FORMAT, "model_name": self.model_name, "dim": self.dim, "n": len(rows)})
+
+    def _load(self, folder: Path):
+        meta = load_meta(folder)
+        if meta.get("format") != _FORMAT:
+            raise ValueError(f"Formato de índice no soportado en {folder}: {meta.get('format')}")
+        if meta["model_name"] != self.model_name or meta["dim"] != self.dim:
+            raise ValueError(f"El índice en {folder} se armó con {meta['model_name']} (dim={meta['dim']}).")
+        self._vecs = load_array(folder, "vectors", self.mmap)
+        self.store = ChunkStore.load(folder, "chunks", self.mmap)
+        self.registry = ChunkRegistry(self.store)
+        self._n = len(self.store)
+        self._ids = [make_chunk_id(d, i) for d, i in self.store.locations]
+        self._slot = np.arange(self._n, dtype=np.int64)
+        self._row = {cid: i for i, cid in enumerate(self._ids)}
+        self.registry.set(self._ids, self._slot)
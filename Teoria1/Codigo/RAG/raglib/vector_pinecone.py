@@ -1,12 +1,19 @@
 from __future__ import annotations
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterable, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
 import os
+import queue
+import threading
+import time
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone, ServerlessSpec
-from typing import Dict, List, Tuple, Optional
-
-
+from .embedding_cache import EmbeddingCache
+from .chunk_manifest import ChunkManifest, chunk_hash
+from .chunk_store import ChunkRegistry, ChunkStore
+from .tracing import span
 
 
 # Convención de IDs de chunk: f"{doc_id}::chunk_{local_idx}"
@@ -18,6 +25,56 @@ def parse_chunk_id(chunk_id: str) -> Tuple[str, int]:
     i = int(rest.replace("chunk_", ""))
     return doc_id, i
 
+def place_chunks(
+    registry: ChunkRegistry,
+    chunks_per_doc: Dict[str, List[str]],
+    docs_meta: Dict[str, Dict],
+    on_detach: Optional[Callable[[np.ndarray], None]] = None,
+) -> Tuple[List[str], np.ndarray]:
+    """
+    (chunk_ids, slots) de {doc_id: [chunks]} en el almacén del registro: los chunks ya registrados
+    con el mismo texto, source y page reusan su slot; sólo se agregan los nuevos o modificados
+    (el almacén es de sólo-agregar: re-sincronizar no vuelve a copiar el corpus).
+    Si el almacén es el de RagPipeline (compartido) no se le agrega nada, porque el BM25 no vería
+    esos slots: el registro pasa a uno propio (ChunkRegistry.detach) y on_detach recibe el mapa
+    slot viejo -> nuevo para que el buscador actualice sus referencias.
+    """
+    st, known = registry.store, registry.slots
+    ids: List[str] = []
+    slots: List[int] = []
+    todo: List[Tuple[str, List[str], str, Optional[int], List[int], int]] = []
+    for doc_id, chunks in chunks_per_doc.items():
+        dm = docs_meta.get(doc_id, {}) or {}
+        source, page = dm.get("source", "") or "", dm.get("page", None)
+        new_local: List[int] = []
+        for i, text in enumerate(chunks):
+            cid = make_chunk_id(doc_id, i)
+            slot = known.get(cid)
+            if slot is None or st.text(slot) != text or st.source(slot) != source or st.page(slot) != page:
+                slot = -1
+                new_local.append(i)
+            ids.append(cid)
+            slots.append(slot)
+        if new_local:
+            todo.append((doc_id, chunks, source, page, new_local, len(slots) - len(chunks)))
+    if todo and registry.shared:
+        remap = registry.detach()
+        slots = [int(remap[s]) if s >= 0 else -1 for s in slots]
+        if on_detach is not None:
+            on_detach(remap)
+    for doc_id, chunks, source, page, new_local, first in todo:
+        added = registry.store.append(doc_id, [chunks[i] for i in new_local], source, page, local=new_local)
+        for i, slot in zip(new_local, added):
+            slots[first + i] = slot
+    return ids, np.asarray(slots, dtype=np.int64)
+
+
+def embedding_dimension(model: SentenceTransformer) -> int:
+    """Dimensión de los embeddings (get_embedding_dimension en versiones nuevas, el nombre viejo si no)."""
+    get = getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension
+    return get()
+
+
 def ensure_pinecone_index(
     pc: Pinecone,
     name: str,
@@ -47,6 +104,10 @@ class PineconeSearcher:
     region: str = "us-east-1"
     api_key: Optional[str] = None
     namespace: str = "default"  # configurable
+    embedding_cache: Optional[EmbeddingCache] = None  # caché persistente de embeddings (opcional)
+    store: Optional[ChunkStore] = None  # almacén de chunks (se comparte con RagPipeline)
+    include_values: bool = False  # pedir los vectores en cada query (los reutiliza vectors_of, p. ej. MMR)
+    values_cache_size: int = 4096  # vectores recibidos que se recuerdan (LRU por chunk_id)
 
     def __post_init__(self):
         key = self.api_key or os.getenv("PINECONE_API_KEY")
@@ -54,11 +115,24 @@ class PineconeSearcher:
             raise RuntimeError("Falta PINECONE_API_KEY en entorno o parámetro api_key.")
         self.pc = Pinecone(api_key=key)
         self.model = SentenceTransformer(self.model_name)
-        dim = self.model.get_sentence_embedding_dimension()
-        ensure_pinecone_index(self.pc, self.index_name, dim, cloud=self.cloud, region=self.region)
+        self.dim = embedding_dimension(self.model)
+        ensure_pinecone_index(self.pc, self.index_name, self.dim, cloud=self.cloud, region=self.region)
         self.index = self.pc.Index(self.index_name)
-        # registro local: chunk_id -> dict(text, doc_id, local_idx, source, page)
-        self.registry: Dict[str, Dict] = {}
+        # registro local: chunk_id -> dict(text, doc_id, local_idx, source, page), armado desde el almacén
+        if self.store is None:
+            self.store = ChunkStore()
+        self.registry = ChunkRegistry(self.store)
+        self._values: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._values_lock = threading.Lock()
+        self._locate: Optional[Callable[[str, int], int]] = None  # ver attach
+
+    def _encode(self, texts: List[str], query: bool = False, persist: bool = True) -> np.ndarray:
+        with span("vector.encode", batch=len(texts), query=query):
+            if self.embedding_cache is None:
+                return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+            return self.embedding_cache.encode(
+                self.model, self.model_name, texts, normalize=True, query=query, persist=persist
+            )
 
     def _ns_vector_count(self) -> int:
         """Cantidad de vectores en la namespace actual."""
@@ -93,45 +167,290 @@ class PineconeSearcher:
             # No detengas la ejecución por esto; sólo avisa
             print(f"[WARN] clear_namespace saltado: {e}")
 
-    def upsert_chunks(self, chunks_per_doc: Dict[str, List[str]], docs_meta: Dict[str, Dict]):
-        vectors = []
-        for doc_id, chunks in chunks_per_doc.items():
-            if not chunks:
-                continue
-            embs = self.model.encode(chunks, convert_to_numpy=True, normalize_embeddings=True)
-            for i, (ch, v) in enumerate(zip(chunks, embs)):
-                chunk_id = make_chunk_id(doc_id, i)
-                meta = {
-                    "doc_id": doc_id,
-                    "local_idx": i,
-                    "source": (docs_meta.get(doc_id, {}) or {}).get("source", ""),
-                    "page": (docs_meta.get(doc_id, {}) or {}).get("page", None),
-                    "text": ch,
-                }
-                self.registry[chunk_id] = meta
-                vectors.append({"id": chunk_id, "values": v.tolist(), "metadata": meta})
-
-        print(f"[UPSERT] index={self.index_name} ns={self.namespace} vectors={len(vectors)} (antes={self._ns_vector_count()})")
+    def upsert_chunks(
+        self,
+        chunks_per_doc: Dict[str, List[str]],
+        docs_meta: Dict[str, Dict],
+        encode_block: int = 1024,   # textos por llamada a encode (ordenados por largo)
+        workers: int = 4,           # requests de upsert concurrentes
+        max_retries: int = 3,
+    ):
+        """
+        Codifica todo el corpus en bloques grandes ordenados por largo (poco padding) y va
+        encolando lotes de 100 vectores en una cola acotada que vacía un pool de hilos de upsert:
+        la codificación y la subida se solapan, y si Pinecone va más lento la cola llena frena al encoder.
+        """
+        _ids, slots = self._place(chunks_per_doc, docs_meta)
+        self._upsert_slots(slots, encode_block, workers, max_retries)
+
+    def upsert_slots(
+        self, store: ChunkStore, slots: np.ndarray, encode_block: int = 1024, workers: int = 4, max_retries: int = 3
+    ):
+        """Sube chunks que ya están en un ChunkStore (el de RagPipeline) sin duplicar el texto."""
+        slots = self.registry.adopt(store, slots)
+        self.store = self.registry.store
+        self._upsert_slots(slots, encode_block, workers, max_retries)
+
+    def attach(self, store: ChunkStore, locate: Callable[[str, int], int]):
+        """
+        Para consultar una namespace ya cargada sin upsert/sync en este proceso (RagPipeline con
+        do_upsert=False): pasa a compartir store y los ids de Pinecone que no están en el registro
+        se traducen con locate(doc_id, idx_local) -> slot de store (-1 si no existe).
+        """
+        self.registry.adopt(store, np.zeros(0, dtype=np.int64))
+        if self.registry.store is not store:
+            print(f"[WARN] {self.index_name}/{self.namespace}: el registro ya usa otro almacén; "
+                  "los ids que no estén registrados no se podrán traducir")
+            return
+        self.store = store
+        self._locate = locate
+
+    def _place(self, chunks_per_doc: Dict[str, List[str]], docs_meta: Dict[str, Dict]) -> Tuple[List[str], np.ndarray]:
+        ids, slots = place_chunks(self.registry, chunks_per_doc, docs_meta, on_detach=self._detached)
+        self.store = self.registry.store
+        return ids, slots
+
+    def _detached(self, remap: np.ndarray):
+        # almacén propio: locate devolvería slots del almacén del pipeline
+        self._locate = None
+
+    def sync_chunks(
+        self,
+        chunks_per_doc: Dict[str, List[str]],
+        docs_meta: Dict[str, Dict],
+        manifest: ChunkManifest,
+        encode_block: int = 1024,
+        workers: int = 4,
+        max_retries: int = 3,
+    ) -> Dict[str, int]:
+        """
+        Re-ingesta incremental: chunks_per_doc es el corpus completo. Contra el manifiesto
+        (chunk_id -> hash) sólo se embeben y suben los chunks nuevos o modificados y se borran
+        los ids que ya no existen. La namespace no se vacía: sigue respondiendo durante la
+        actualización (los modificados se pisan en el lugar, los borrados se eliminan al final).
+        Sin manifiesto previo todo cuenta como nuevo (equivale a upsert_chunks).
+        Al almacén sólo se agregan los chunks que cambiaron (ver place_chunks).
+        """
+        ids, slots = self._place(chunks_per_doc, docs_meta)
+        hashes = [chunk_hash(self.store.meta(s)) for s in slots.tolist()]
+        added, changed, removed = manifest.diff(ids, hashes)
+        self.registry.set(ids, slots)
+        todo = added + changed
+        if todo:
+            self._upsert_slots(slots[todo], encode_block, workers, max_retries)
+        self.delete_chunks(removed)
+        manifest.replace(ids, hashes)
+        manifest.save()
+        stats = {"added": len(added), "changed": len(changed), "removed": len(removed),
+                 "unchanged": len(ids) - len(todo)}
+        print(f"[SYNC] index={self.index_name} ns={self.namespace} {stats}")
+        return stats
+
+    def _upsert_slots(self, slots: np.ndarray, encode_block: int, workers: int, max_retries: int):
+        st = self.store
+        ids = [make_chunk_id(st.doc_id(s), st.local_idx(s)) for s in slots.tolist()]
+        self.registry.set(ids, slots)
+        print(f"[UPSERT] index={self.index_name} ns={self.namespace} vectors={len(ids)} (antes={self._ns_vector_count()})")
+
         B = 100
-        for i in range(0, len(vectors), B):
-            self.index.upsert(vectors=vectors[i:i+B], namespace=self.namespace)
+        pending: "queue.Queue[Optional[List[Dict]]]" = queue.Queue(maxsize=2 * max(1, workers))
+        errors: List[BaseException] = []
+
+        def upsert_worker():
+            while True:
+                batch = pending.get()
+                if batch is None:
+                    return
+                if errors:
+                    continue  # ya falló otro lote: sólo drenar la cola
+                for attempt in range(max_retries + 1):
+                    try:
+                        self.index.upsert(vectors=batch, namespace=self.namespace)
+                        break
+                    except Exception as e:
+                        if attempt == max_retries:
+                            errors.append(e)
+                        else:
+                            time.sleep(0.5 * 2 ** attempt)
+
+        threads = [threading.Thread(target=upsert_worker, daemon=True) for _ in range(max(1, workers))]
+        for t in threads:
+            t.start()
+        try:
+            order = np.argsort(-st.text_nbytes(slots), kind="stable").tolist()
+            for lo in range(0, len(order), encode_block):
+                if errors:
+                    break
+                block = order[lo:lo + encode_block]
+                embs = self._encode([st.text(slots[i]) for i in block])
+                vectors = [{"id": ids[i], "values": v.tolist(), "metadata": st.meta(slots[i])} for i, v in zip(block, embs)]
+                for j in range(0, len(vectors), B):
+                    pending.put(vectors[j:j+B])  # bloquea si la cola está llena (backpressure)
+        finally:
+            for _ in threads:
+                pending.put(None)
+            for t in threads:
+                t.join()
+            if self.embedding_cache is not None:
+                self.embedding_cache.flush()
+        if errors:
+            raise RuntimeError(f"Falló el upsert tras {max_retries} reintentos: {errors[0]}") from errors[0]
         print(f"[UPSERT] después={self._ns_vector_count()} en ns={self.namespace}")
 
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Borra chunks por id (en lotes) de la namespace y del registro local."""
+        chunk_ids = list(chunk_ids)
+        B = 1000
+        for i in range(0, len(chunk_ids), B):
+            self.index.delete(ids=chunk_ids[i:i+B], namespace=self.namespace)
+        for cid in chunk_ids:
+            self.registry.pop(cid, None)
+        if chunk_ids:
+            print(f"[DELETE] index={self.index_name} ns={self.namespace} vectors={len(chunk_ids)}")
 
     def search(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> List[Tuple[str, float, Dict]]:
         """
         Devuelve [(chunk_id, score, meta)], score mayor = más similar
         """
-        q = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0].tolist()
-        res = self.index.query(
-            vector=q,
-            top_k=top_k,
-            include_metadata=True,
-            namespace=self.namespace,     # usamos namespace
-            filter=meta_filter,           # opcional: filtrar por source/page/etc.
-        )
+        q = self._encode([query], query=True)[0].tolist()
+        return self._query(q, top_k, meta_filter)
+
+    def search_many(
+        self, queries: List[str], top_k: int = 50, meta_filter: Optional[dict] = None, workers: int = 8,
+        with_meta: bool = True,
+    ) -> List[List[Tuple[str, float, Dict]]]:
+        """
+        Versión por lotes de search: codifica todas las queries en un único batch y
+        lanza las consultas a Pinecone en paralelo (una por query, en orden).
+        """
+        if not queries:
+            return []
+        embs = self._encode(queries, query=True)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(queries)))) as ex:
+            return list(ex.map(lambda v: self._query(v.tolist(), top_k, meta_filter, with_meta), embs))
+
+    def search_slots(self, query: str, top_k: int = 50, meta_filter: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Como search pero devuelve (slots del almacén, scores): el id string de Pinecone se traduce
+        acá, en el borde. Los ids que no están en el registro (subidos por otro proceso sin
+        upsert/sync en éste) se traducen por (doc_id, idx_local) con attach; si no hay forma,
+        se avisa con [WARN] (la rama vectorial estaría perdiendo resultados).
+        """
+        q = self._encode([query], query=True)[0].tolist()
+        return self._to_slots(self._query(q, top_k, meta_filter, with_meta=False))
+
+    def search_slots_many(
+        self, queries: List[str], top_k: int = 50, meta_filter: Optional[dict] = None, workers: int = 8
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [self._to_slots(r) for r in self.search_many(queries, top_k, meta_filter, workers, with_meta=False)]
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings de queries (para juntarlos en batch desde afuera, ver search_slots_vector)."""
+        return self._encode(queries, query=True)
+
+    def search_slots_vector(
+        self, q: np.ndarray, top_k: int = 50, meta_filter: Optional[dict] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """search_slots con el embedding de la query ya calculado."""
+        return self._to_slots(self._query(np.asarray(q).tolist(), top_k, meta_filter, with_meta=False))
+
+    def vectors_of(self, store: ChunkStore, slots: np.ndarray) -> np.ndarray:
+        """
+        Embeddings normalizados de esos slots de store (p. ej. para MMR), sin pasar por el modelo:
+        primero los que devolvieron las últimas queries (include_values=True), después los que
+        faltan se piden a Pinecone con fetch (p. ej. candidatos que sólo trajo BM25). Sólo los
+        chunks que no están en el índice se codifican.
+        """
+        slots = np.asarray(slots, dtype=np.int64).tolist()
+        ids = [make_chunk_id(store.doc_id(s), store.local_idx(s)) for s in slots]
+        out = np.zeros((len(ids), self.dim), dtype=np.float32)
+        miss = []
+        with self._values_lock:
+            for j, cid in enumerate(ids):
+                v = self._values.get(cid)
+                if v is None:
+                    miss.append(j)
+                else:
+                    out[j] = v
+        if miss:
+            fetched = self._fetch_values([ids[j] for j in miss])
+            absent = [j for j in miss if ids[j] not in fetched]
+            for j in miss:
+                if ids[j] in fetched:
+                    out[j] = fetched[ids[j]]
+            if absent:
+                out[absent] = self._encode([store.text(slots[j]) for j in absent], persist=False)
+        return out
+
+    def _fetch_values(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """chunk_id -> vector guardado en la namespace (los que no existen no aparecen)."""
+        out: Dict[str, np.ndarray] = {}
+        B = 1000
+        with span("pinecone.fetch", ids=len(chunk_ids)):
+            for i in range(0, len(chunk_ids), B):
+                res = self.index.fetch(ids=chunk_ids[i:i+B], namespace=self.namespace)
+                for cid, vec in (res.vectors or {}).items():
+                    out[cid] = np.asarray(vec.values, dtype=np.float32)
+        self._remember_values(out.items())
+        return out
+
+    def _remember_values(self, items: Iterable[Tuple[str, np.ndarray]]):
+        with self._values_lock:
+            for cid, v in items:
+                self._values[cid] = v
+                self._values.move_to_end(cid)
+            while len(self._values) > self.values_cache_size:
+                self._values.popitem(last=False)
+
+    def _to_slots(self, res: List[Tuple[str, float, Dict]]) -> Tuple[np.ndarray, np.ndarray]:
+        slots = self.registry.slots
+        hits = []
+        lost = []
+        for cid, s, _m in res:
+            slot = slots.get(cid)
+            if slot is None:
+                slot = self._resolve(cid)
+            if slot is None:
+                lost.append(cid)
+            else:
+                hits.append((slot, s))
+        if lost:
+            print(f"[WARN] {self.index_name}/{self.namespace}: {len(lost)} de {len(res)} resultados sin chunk local "
+                  f"(p. ej. {lost[0]}); usar RagPipeline(..., do_upsert=False) o sync_chunks para registrarlos")
+        return (np.fromiter((h[0] for h in hits), dtype=np.int64, count=len(hits)),
+                np.fromiter((h[1] for h in hits), dtype=np.float32, count=len(hits)))
+
+    def _resolve(self, chunk_id: str) -> Optional[int]:
+        """Slot de un id no registrado, por (doc_id, idx_local) con el locate de attach (y se registra)."""
+        if self._locate is None:
+            return None
+        try:
+            doc_id, i = parse_chunk_id(chunk_id)
+        except ValueError:
+            return None
+        slot = self._locate(doc_id, i)
+        if slot < 0:
+            return None
+        self.registry.set([chunk_id], [slot])
+        return slot
+
+    def _query(
+        self, q: List[float], top_k: int, meta_filter: Optional[dict], with_meta: bool = True
+    ) -> List[Tuple[str, float, Dict]]:
+        with span("pinecone.query", top_k=top_k, filtered=meta_filter is not None) as sp:
+            res = self.index.query(
+                vector=q,
+                top_k=top_k,
+                include_metadata=with_meta,
+                include_values=self.include_values,
+                namespace=self.namespace,     # usamos namespace
+                filter=meta_filter,           # opcional: filtrar por source/page/etc.
+            )
+            sp.set(matches=len(res.matches))
+        if self.include_values:
+            self._remember_values((m.id, np.asarray(m.values, dtype=np.float32)) for m in res.matches if m.values)
         out = []
         for m in res.matches:
-            meta = self.registry.get(m.id) or (m.metadata or {})
+            meta = (self.registry.get(m.id) or (m.metadata or {})) if with_meta else {}
             out.append((m.id, float(m.score), meta))
         return out
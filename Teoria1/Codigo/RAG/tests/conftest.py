@@ -0,0 +1,56 @@
+"""
+Fixtures compartidas: modelos BERT diminutos armados en el momento (sin descargar nada)
+para el CrossEncoder y el bi-encoder, y un corpus chico de documentos.
+"""
+
+import os
+import random
+import pytest
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+# vocabulario a nivel de caracter: WordPiece puede tokenizar cualquier texto del corpus
+_CHARS = list("abcdefghijklmnopqrstuvwxyz0123456789.,;:!?()'\"-/%áéíóúüñ")
+_VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + _CHARS + [f"##{c}" for c in _CHARS]
+
+
+def _tiny_bert(folder, head: bool) -> str:
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    folder.mkdir(parents=True, exist_ok=True)
+    vocab = folder / "vocab.txt"
+    vocab.write_text("\n".join(_VOCAB) + "\n", encoding="utf-8")
+    config = transformers.BertConfig(
+        vocab_size=len(_VOCAB), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, num_labels=1,
+    )
+    torch.manual_seed(0)
+    model = transformers.BertForSequenceClassification(config) if head else transformers.BertModel(config)
+    model.save_pretrained(folder)
+    transformers.BertTokenizerFast(vocab_file=str(vocab)).save_pretrained(folder)
+    return str(folder)
+
+
+@pytest.fixture(scope="session")
+def ce_model(tmp_path_factory) -> str:
+    """Carpeta de un CrossEncoder BERT de 2 capas con pesos aleatorios (fijos)."""
+    return _tiny_bert(tmp_path_factory.mktemp("tiny_ce"), head=True)
+
+
+@pytest.fixture(scope="session")
+def embed_model(tmp_path_factory) -> str:
+    """Carpeta de un bi-encoder BERT de 2 capas (SentenceTransformer le agrega mean pooling)."""
+    return _tiny_bert(tmp_path_factory.mktemp("tiny_st"), head=False)
+
+
+@pytest.fixture(scope="session")
+def docs():
+    from raglib.documents import Document
+
+    rng = random.Random(7)
+    vocab = [f"w{i}" for i in range(150)]
+
+    def text(n: int) -> str:
+        return " ".join(" ".join(rng.choices(vocab, k=15)).capitalize() + "." for _ in range(n))
+
+    return [Document(f"d{i}", text(3 + i % 12), f"s{i % 5}.pdf", i) for i in range(40)]
@@ -0,0 +1,76 @@
+"""MicroBatcher: pedidos concurrentes en un solo batch, resultados en orden; la API async iguala a la sync."""
+
+import asyncio
+import numpy as np
+import pytest
+from raglib.batching import MicroBatcher
+from raglib.pipeline import RagPipeline
+from raglib.vector_local import LocalVectorSearcher
+
+QUERIES = ["w1 w2 w3", "w10 w99", "w140 w7 w33", "w5", "w60 w61 w62 w63"]
+
+
+def test_concurrent_submits_share_a_batch():
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        return [x * 10 for x in items]
+
+    async def main():
+        b = MicroBatcher(fn, max_batch_size=100, max_wait_ms=20)
+        return b, await asyncio.gather(*(b.submit(i) for i in range(7)))
+
+    b, res = asyncio.run(main())
+    assert res == [i * 10 for i in range(7)]
+    assert calls == [list(range(7))]
+    assert (b.batches, b.items) == (1, 7)
+
+
+def test_full_batch_flushes_without_waiting():
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        return items
+
+    async def main():
+        # max_wait enorme: sólo el tamaño puede disparar los batches
+        b = MicroBatcher(fn, max_batch_size=4, max_wait_ms=60_000, size=len)
+        return await asyncio.wait_for(asyncio.gather(*(b.submit("ab") for _ in range(4))), 5)
+
+    assert asyncio.run(main()) == ["ab"] * 4
+    assert calls == [["ab", "ab"], ["ab", "ab"]]
+
+
+def test_errors_reach_every_request():
+    def fn(items):
+        raise RuntimeError("falló el modelo")
+
+    async def main():
+        b = MicroBatcher(fn, max_wait_ms=1)
+        return await asyncio.gather(b.submit(1), b.submit(2), return_exceptions=True)
+
+    res = asyncio.run(main())
+    assert all(isinstance(e, RuntimeError) for e in res)
+    with pytest.raises(ValueError):
+        MicroBatcher(fn, max_batch_size=0)
+
+
+def test_async_pipeline_matches_sync(docs, ce_model, embed_model):
+    p = RagPipeline(
+        docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model), max_tokens_chunk=120, overlap=30,
+        ce_model=ce_model, ce_pretokenize=None, batch_max_wait_ms=20,
+    )
+
+    async def main():
+        return await asyncio.gather(*(p.aretrieve_and_rerank(q, 20, 5) for q in QUERIES))
+
+    got = asyncio.run(main())
+    for q, res in zip(QUERIES, got):
+        expected = p.retrieve_and_rerank(q, 20, 5)
+        assert [r[0] for r in res] == [r[0] for r in expected]
+        assert np.allclose([r[3] for r in res], [r[3] for r in expected], atol=1e-5)
+    # las queries concurrentes compartieron los batches del encoder y del CrossEncoder
+    assert p._batchers["encode"].batches < len(QUERIES)
+    assert p._batchers["rerank"].batches < len(QUERIES)
@@ -0,0 +1,106 @@
+"""BM25Index contra rank_bm25.BM25Okapi: scores y orden iguales, también tras altas/bajas y save/load."""
+
+import random
+import numpy as np
+import pytest
+import rank_bm25  # referencia de las pruebas (requirements-dev.txt); si falta, la prueba falla
+from raglib.bm25_index import BM25Index
+from raglib.documents import Document, simple_tokenize
+
+WORDS = [f"w{i}" for i in range(300)] + ["ñandú", "über"]
+
+
+def _doc(rng: random.Random, i: int):
+    chunks = [
+        " ".join(rng.choices(WORDS[:rng.randint(5, len(WORDS))], k=rng.randint(0, 60)))
+        for _ in range(rng.randint(0, 3))
+    ]
+    return Document(id=f"d{i}", text=""), chunks
+
+
+def _build(rng: random.Random, n: int, **kw) -> BM25Index:
+    items = [_doc(rng, i) for i in range(n)]
+    return BM25Index([d for d, _ in items], {d.id: c for d, c in items}, **kw)
+
+
+def _queries(rng: random.Random, n: int):
+    return [" ".join(rng.choices(WORDS + ["zz"], k=rng.randint(0, 6))) for _ in range(n)]
+
+
+def _reference(idx: BM25Index, q: str, k: int):
+    """Ranking de BM25Okapi reconstruido sobre los slots vivos (empates: slot menor primero)."""
+    live = idx.live_slots.tolist()
+    ref = rank_bm25.BM25Okapi([simple_tokenize(idx.chunks[s]) for s in live])
+    scores = ref.get_scores(simple_tokenize(q))
+    order = np.argsort(scores, kind="stable")[::-1][:k]
+    return [live[i] for i in order], scores[order]
+
+
+def _assert_same(idx: BM25Index, q: str, k: int):
+    slots, scores = _reference(idx, q, k)
+    got = idx.search(q, k)
+    assert [s for s, _ in got] == slots
+    np.testing.assert_allclose([s for _, s in got], scores, rtol=1e-12, atol=1e-12)
+
+
+def test_matches_rank_bm25():
+    rng = random.Random(0)
+    idx = _build(rng, 400)
+    idx.add_documents([Document("rep", "")], {"rep": ["w0 w0 w0 w1"] * 3})  # scores empatados
+    for q in _queries(rng, 200):
+        _assert_same(idx, q, rng.choice([1, 5, 50, 2000]))
+
+
+def test_incremental_matches_rebuild():
+    rng = random.Random(1)
+    idx = _build(rng, 100, max_segments=3)
+    next_id = 100
+    for _ in range(40):
+        if rng.random() < 0.5:
+            items = [_doc(rng, next_id + j) for j in range(rng.randint(1, 5))]
+            next_id += len(items)
+            live_docs = sorted({idx.store.doc_id(s) for s in idx.live_slots.tolist()})
+            if live_docs and rng.random() < 0.3:  # reemplazo de un documento existente
+                items.append((Document(rng.choice(live_docs), ""), _doc(rng, 0)[1]))
+            idx.add_documents([d for d, _ in items], {d.id: c for d, c in items})
+        else:
+            live_docs = sorted({idx.store.doc_id(s) for s in idx.live_slots.tolist()})
+            idx.remove_documents(rng.sample(live_docs, min(len(live_docs), rng.randint(1, 6))))
+        for q in _queries(rng, 5):
+            _assert_same(idx, q, rng.choice([3, 10, 500]))
+    idx.compact()
+    assert len(idx._state.segments) <= 1
+    for q in _queries(rng, 20):
+        _assert_same(idx, q, 50)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_roundtrip(tmp_path, mmap):
+    rng = random.Random(2)
+    idx = _build(rng, 200)
+    idx.remove_documents(["d3", "d7"])
+    idx.save(tmp_path)
+    loaded = BM25Index.load(tmp_path, mmap=mmap)
+    assert (loaded.corpus_id, loaded.generation) == (idx.corpus_id, idx.generation)
+    for q in _queries(rng, 100):
+        a = [(idx.doc_ids[i], idx.chunks[i], s) for i, s in idx.search(q, 50)]
+        b = [(loaded.doc_ids[i], loaded.chunks[i], s) for i, s in loaded.search(q, 50)]
+        assert a == b
+    # altas/bajas después de cargar (copy-on-write sobre los arrays mapeados)
+    loaded.remove_documents(["d10"])
+    d, chunks = _doc(rng, 900)
+    loaded.add_documents([d], {d.id: chunks})
+    for q in _queries(rng, 20):
+        _assert_same(loaded, q, 50)
+
+
+def test_search_many_matches_search():
+    rng = random.Random(3)
+    idx = _build(rng, 300)
+    idx.remove_documents(["d1", "d2"])
+    qs = _queries(rng, 100)
+    for k in (1, 10, 1000):
+        assert idx.search_many(qs, k) == [idx.search(q, k) for q in qs]
+        for (slots, scores), hits in zip(idx.search_slots_many(qs, k), idx.search_many(qs, k)):
+            assert slots.tolist() == [s for s, _ in hits]
+    assert idx.search_many([], 5) == []
@@ -0,0 +1,87 @@
+"""Cascada: corta cuando el ranking está asentado o se agota el presupuesto; sin corte iguala al re-ranking completo."""
+
+import asyncio
+import numpy as np
+from raglib.cascade import Cascade, CascadePolicy, summarize
+from raglib.pipeline import RagPipeline
+from raglib.vector_local import LocalVectorSearcher
+
+QUERIES = ["w1 w2 w3", "w10 w99", "w140 w7 w33"]
+
+
+def _run(ids, scores, top_final, policy):
+    c = Cascade(ids, top_final, policy)
+    while True:
+        tranche = c.next()
+        if not len(tranche):
+            break
+        c.feed(scores[tranche])
+    return c
+
+
+def test_settles_when_tail_is_low():
+    ids = np.arange(40)
+    scores = np.linspace(10.0, 0.0, 40)  # el CrossEncoder coincide con la fusión
+    c = _run(ids, scores, 3, CascadePolicy(prefix=5, step=5, margin=0.1))
+    assert c.stats().stop == "settled"
+    assert c.stats().pairs == 5 and c.stats().agreement == 1.0
+    got, s = c.result()
+    assert got.tolist() == list(range(5)) and np.array_equal(s, scores[:5])
+
+
+def test_extends_while_relevant_chunks_keep_appearing():
+    ids = np.arange(40)
+    scores = np.zeros(40)
+    scores[22] = 5.0  # relevante fuera del prefijo: los tramos siguen mientras el acuerdo es bajo
+    c = _run(ids, scores, 1, CascadePolicy(prefix=5, step=5, agreement=1.0))
+    assert c.stats().pairs > 22 and 22 in c.result()[0][np.argsort(-c.result()[1])[:1]]
+
+
+def test_budget_and_exhaustion():
+    ids = np.arange(40)
+    scores = np.random.default_rng(0).normal(size=40)
+    c = _run(ids, scores, 3, CascadePolicy(prefix=5, step=7, agreement=2.0, max_pairs=16))
+    assert (c.stats().stop, c.stats().pairs) == ("max_pairs", 16)
+    c = _run(ids, scores, 3, CascadePolicy(prefix=5, step=7, agreement=2.0))
+    assert (c.stats().stop, c.stats().pairs) == ("exhausted", 40)
+    c = _run(ids[:2], scores, 3, CascadePolicy())
+    assert (c.stats().stop, c.stats().pairs) == ("exhausted", 2)
+    s = summarize([_run(ids, scores, 3, CascadePolicy(max_pairs=20, agreement=2.0)).stats()] * 2)
+    assert s["queries"] == 2 and s["pairs_mean"] == 20 and s["pairs_saved"] == 0.5 and s["stop"] == {"max_pairs": 2}
+    assert summarize([]) == {"queries": 0}
+
+
+def _pipeline(docs, ce_model, embed_model, **kw):
+    return RagPipeline(
+        docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model), max_tokens_chunk=120, overlap=30,
+        ce_model=ce_model, ce_pretokenize=None, **kw,
+    )
+
+
+def test_without_cut_matches_full_rerank(docs, ce_model, embed_model):
+    full = _pipeline(docs, ce_model, embed_model)
+    # agreement > 1 no se cumple nunca: la cascada recorre todos los candidatos
+    casc = _pipeline(docs, ce_model, embed_model, cascade=CascadePolicy(prefix=5, step=5, agreement=2.0))
+    for q in QUERIES:
+        expected = full.retrieve_and_rerank(q, 20, 5)
+        got = casc.retrieve_and_rerank(q, 20, 5)
+        assert [r[0] for r in got] == [r[0] for r in expected]
+        assert np.allclose([r[3] for r in got], [r[3] for r in expected], atol=1e-5)
+    assert [s.stop for s in casc.cascade_log] == ["exhausted"] * len(QUERIES)
+    assert all(s.pairs == s.candidates for s in casc.cascade_log)
+
+
+def test_budget_in_every_entry_point(docs, ce_model, embed_model):
+    p = _pipeline(docs, ce_model, embed_model, cascade=CascadePolicy(prefix=5, step=5, agreement=2.0, max_pairs=10))
+    sync = [p.retrieve_and_rerank(q, 20, 5) for q in QUERIES]
+    many = p.retrieve_and_rerank_many(QUERIES, 20, 5)
+
+    async def main():
+        return await asyncio.gather(*(p.aretrieve_and_rerank(q, 20, 5) for q in QUERIES))
+
+    for res in (many, asyncio.run(main())):
+        for got, expected in zip(res, sync):
+            assert [r[0] for r in got] == [r[0] for r in expected]
+    assert len(p.cascade_log) == 3 * len(QUERIES)
+    assert {s.pairs for s in p.cascade_log} == {10} and {s.stop for s in p.cascade_log} == {"max_pairs"}
+    assert p.cascade_summary()["pairs_saved"] > 0
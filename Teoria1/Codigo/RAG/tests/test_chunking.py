@@ -0,0 +1,53 @@
+"""
+Chunker de una sola pasada contra una salida de referencia congelada, generada con la
+implementación anterior de chunk_text (oraciones re-tokenizadas en cada paso) sobre
+data/docs_sample_en.jsonl y textos derivados: la página completa, una página larga,
+una única oración más larga que max_tokens, texto vacío y overlap >= max_tokens.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict
+import pytest
+from raglib.documents import chunk_text, iter_chunks
+from raglib.io_utils import load_docs_jsonl
+
+SAMPLE = Path(__file__).resolve().parents[1] / "data" / "docs_sample_en.jsonl"
+REFERENCE = Path(__file__).parent / "data" / "chunks_docs_sample_en.json"
+CONFIGS = [(200, 60), (120, 30), (60, 20), (40, 10), (50, 50), (50, 80)]
+
+
+def sample_texts() -> Dict[str, str]:
+    docs = load_docs_jsonl(SAMPLE)
+    joined = " ".join(d.text for d in docs)
+    texts = {d.id: d.text for d in docs}
+    texts["joined"] = joined
+    texts["joined_x5"] = " ".join([joined] * 5)
+    # sin cortes de oración: una sola oración de ~130 tokens (se parte por ; : y se recorta)
+    texts["one_sentence"] = joined.replace(". ", "; ").replace(".", "")
+    texts["one_sentence_no_separators"] = joined.replace(". ", " ").replace(":", "").replace(".", "")
+    texts["empty"] = ""
+    texts["blank"] = " \n\t "
+    return texts
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return json.loads(REFERENCE.read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("max_tokens,overlap", CONFIGS)
+def test_matches_reference(reference, max_tokens, overlap):
+    expected = reference[f"{max_tokens}-{overlap}"]
+    texts = sample_texts()
+    assert sorted(expected) == sorted(texts)
+    for name, text in texts.items():
+        assert chunk_text(text, max_tokens, overlap) == expected[name], name
+        assert list(iter_chunks(text, max_tokens, overlap)) == expected[name], name
+
+
+def test_reference_covers_edge_cases(reference):
+    # la referencia no es trivial: hay chunks con solapamiento y la oración larga produce varios
+    assert len(reference["60-20"]["joined_x5"]) > 3
+    assert len(reference["60-20"]["one_sentence"]) > 1
+    assert reference["200-60"]["empty"] == [] and reference["200-60"]["blank"] == []
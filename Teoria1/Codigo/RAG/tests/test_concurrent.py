@@ -0,0 +1,70 @@
+"""Ramas concurrentes: mismo resultado que el modo serial y degradación a BM25 sólo si la vectorial falla."""
+
+import time
+import numpy as np
+import pytest
+from raglib.pipeline import RagPipeline
+from raglib.result_cache import ResultCache
+from raglib.vector_local import LocalVectorSearcher
+
+QUERIES = ["w1 w2 w3", "w10 w99", "w140 w7 w33"]
+
+
+@pytest.fixture
+def pipeline(docs, ce_model, embed_model):
+    p = RagPipeline(
+        docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model), max_tokens_chunk=120, overlap=30,
+        ce_model=ce_model, ce_pretokenize=None, concurrent=True, vec_timeout=0.2, result_cache=ResultCache(),
+    )
+    yield p
+    p.close()
+
+
+def _bm25_only(p, q, k):
+    return p.bm25.search_slots(q, top_k=k)[0][:k].tolist()
+
+
+def test_matches_serial(pipeline):
+    for q in QUERIES:
+        res = pipeline.retrieve_hybrid_concurrent(q, top_k=20)
+        assert not res.degraded and res.errors == {}
+        assert res.chunk_ids == pipeline.retrieve_hybrid(q, top_k=20)  # retrieve_hybrid no usa concurrent
+        assert res.slots.tolist() != _bm25_only(pipeline, q, 20)
+
+
+def test_slow_vector_leg_degrades_to_bm25(pipeline, monkeypatch, capsys):
+    def slow(*args, **kwargs):
+        time.sleep(1.0)
+        raise AssertionError("no debería esperarse")
+
+    monkeypatch.setattr(pipeline.vec, "search_slots", slow)
+    for q in QUERIES:
+        t0 = time.monotonic()
+        res = pipeline.retrieve_hybrid_concurrent(q, top_k=20)
+        assert time.monotonic() - t0 < 0.8
+        assert res.degraded and res.errors == {"vector": "timeout"}
+        assert res.slots.tolist() == _bm25_only(pipeline, q, 20)
+    assert capsys.readouterr().out == ""  # la degradación va en errors / la traza, no a stdout
+
+
+def test_failing_vector_leg_is_not_cached(pipeline, monkeypatch):
+    def boom(*args, **kwargs):
+        raise ConnectionError("índice caído")
+
+    monkeypatch.setattr(pipeline.vec, "search_slots", boom)
+    res = pipeline.retrieve_hybrid_concurrent(QUERIES[0], top_k=20)
+    assert res.errors == {"vector": "ConnectionError: índice caído"}
+    assert res.slots.tolist() == _bm25_only(pipeline, QUERIES[0], 20)
+    pipeline.retrieve_and_rerank(QUERIES[0], 20, 5)
+    pipeline.retrieve_and_rerank(QUERIES[0], 20, 5)
+    assert pipeline.result_cache.hits == 0  # las respuestas degradadas no se cachean
+
+
+def test_both_legs_failing_raises(pipeline, monkeypatch):
+    def boom(*args, **kwargs):
+        raise ConnectionError("caído")
+
+    monkeypatch.setattr(pipeline.vec, "search_slots", boom)
+    monkeypatch.setattr(pipeline.bm25, "search_slots", boom)
+    with pytest.raises(RuntimeError):
+        pipeline.retrieve_hybrid_concurrent(QUERIES[0], top_k=20)
@@ -0,0 +1,66 @@
+"""EmbeddingCache: mismos vectores que model.encode, uso desde varios hilos y carpeta compartida entre instancias."""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import pytest
+from raglib.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture(scope="module")
+def model(embed_model):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(embed_model, device="cpu")
+
+
+def _texts(n, prefix="t"):
+    return [f"{prefix} w{i} w{i * 7 % 13}" for i in range(n)]
+
+
+def test_threads_share_cache(model, embed_model, tmp_path):
+    cache = EmbeddingCache(tmp_path, query_cache_size=8)  # LRU chico: muchas altas y desalojos concurrentes
+    texts = _texts(40)
+    expected = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+    def work(j):
+        idx = [(j * 5 + i) % len(texts) for i in range(12)]
+        q = cache.encode(model, embed_model, [texts[i] for i in idx], query=True)
+        c = cache.encode(model, embed_model, [texts[i] for i in idx])
+        return idx, q, c
+
+    with ThreadPoolExecutor(8) as ex:
+        for idx, q, c in ex.map(work, range(64)):
+            np.testing.assert_allclose(q, expected[idx], atol=1e-5)
+            np.testing.assert_allclose(c, expected[idx], atol=1e-5)
+    assert len(cache._queries) <= 8
+    assert len(cache) == len(texts)  # pendientes sin duplicados
+    cache.flush()
+    assert len(cache) == len(texts) and not cache._pending
+
+
+def test_query_path_not_persisted(model, embed_model, tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    cache.encode(model, embed_model, _texts(5), persist=False)
+    assert len(cache) == 0
+
+
+def test_shared_folder(model, embed_model, tmp_path):
+    # dos instancias sobre la misma carpeta, como la ingesta y el pipeline en procesos distintos
+    a = EmbeddingCache(tmp_path, max_segments=2)
+    b = EmbeddingCache(tmp_path, max_segments=2)
+    for r in range(4):
+        a.encode(model, embed_model, _texts(6, f"a{r}"))
+        a.flush()
+        b.encode(model, embed_model, _texts(6, f"b{r}"))
+        b.flush()
+        segments = json.loads((tmp_path / "meta.json").read_text())["segments"]
+        assert all((tmp_path / f"{s}_keys.npy").exists() for s in segments)
+    assert not list(tmp_path.glob("*.tmp")) and not (tmp_path / "meta.lock").exists()
+    fresh = EmbeddingCache(tmp_path)
+    everything = [t for r in range(4) for p in ("a", "b") for t in _texts(6, f"{p}{r}")]
+    assert len(fresh) == len(everything)
+    fresh.encode(model, embed_model, everything)
+    assert (fresh.hits, fresh.misses) == (len(everything), 0)
+    # la instancia vieja sigue leyendo lo suyo aunque la compactación de la otra borró sus segmentos
+    a.encode(model, embed_model, _texts(6, "a0"))
+    assert a.misses == 24
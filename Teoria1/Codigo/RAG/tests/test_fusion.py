@@ -0,0 +1,81 @@
+"""fuse / rrf_combine: mismo orden que el RRF original con dict (empates incluidos) y normalizaciones de referencia."""
+
+from typing import Dict, List
+import numpy as np
+import pytest
+from raglib.fusion import fuse, rrf_combine, rrf_combine_ids
+
+
+def _rrf_baseline(*ranked_lists: List[str], k: float = 60.0) -> List[str]:
+    # implementación original de raglib.fusion.rrf_combine
+    scores: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, item in enumerate(ranked):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1.0)
+    sorted_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return [item for item, _ in sorted_items]
+
+
+def _lists(rng, n_lists, vocab, size):
+    return [[f"doc{i}::{j}" for i, j in rng.integers(0, vocab, size=(size, 2))] for _ in range(n_lists)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rrf_combine_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    lists = [list(dict.fromkeys(r)) for r in _lists(rng, int(rng.integers(1, 4)), 6, int(rng.integers(1, 40)))]
+    assert rrf_combine(*lists) == _rrf_baseline(*lists)
+    assert rrf_combine(*lists, k=1.0) == _rrf_baseline(*lists, k=1.0)
+
+
+def test_rrf_combine_ties_keep_first_appearance():
+    # "b" y "x" empatan (rango 0 en una sola lista), igual que "c" e "y": gana la primera aparición
+    a, b = ["b", "c"], ["x", "y"]
+    assert rrf_combine(a, b) == _rrf_baseline(a, b) == ["b", "x", "c", "y"]
+    assert rrf_combine(b, a) == _rrf_baseline(b, a) == ["x", "b", "y", "c"]
+    assert rrf_combine() == _rrf_baseline() == []
+    assert rrf_combine([], []) == []
+
+
+def test_rrf_ids_and_top_k():
+    rng = np.random.default_rng(7)
+    lists = [rng.permutation(50)[:30] for _ in range(3)]
+    full = rrf_combine_ids(*lists)
+    assert full.tolist() == [int(s) for s in _rrf_baseline(*[[str(x) for x in r] for r in lists])]
+    for top_k in (0, 1, 5, 29, 100):
+        ids, _ = fuse(lists, top_k=top_k)
+        assert ids.tolist() == full[:top_k].tolist()
+
+
+def test_weighted_rrf():
+    a, b = np.array([1, 2, 3]), np.array([3, 2, 1])
+    ids, fused = fuse([a, b], weights=[2.0, 1.0], k=0.0)
+    assert ids.tolist() == [1, 3, 2]
+    assert np.allclose(fused, [2 / 1 + 1 / 3, 2 / 3 + 1 / 1, 2 / 2 + 1 / 2])
+
+
+@pytest.mark.parametrize("method", ["minmax", "zscore"])
+def test_score_fusion_matches_reference(method):
+    rng = np.random.default_rng(3)
+    lists = [rng.permutation(40)[:25], rng.permutation(40)[:15]]
+    scores = [np.sort(rng.normal(size=len(r)))[::-1] for r in lists]
+    ids, fused = fuse(lists, scores, method=method, weights=[0.3, 0.7])
+
+    ref: Dict[int, float] = {}
+    for r, s, w in zip(lists, scores, [0.3, 0.7]):
+        norm = (s - s.min()) / (s.max() - s.min()) if method == "minmax" else (s - s.mean()) / s.std()
+        got = dict(zip(r.tolist(), norm))
+        for x in set(np.concatenate(lists).tolist()):
+            ref[x] = ref.get(x, 0.0) + w * got.get(x, norm.min())  # ausente = mínimo de la lista
+    assert np.allclose(fused, [ref[x] for x in ids.tolist()])
+    assert np.all(np.diff(fused) <= 1e-12)
+    assert sorted(ids.tolist()) == sorted(ref)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        fuse([np.array([1])], method="max")
+    with pytest.raises(ValueError):
+        fuse([np.array([1])], method="minmax")
+    with pytest.raises(ValueError):
+        fuse([np.array([1]), np.array([2])], weights=[1.0])
@@ -0,0 +1,60 @@
+"""iter_pdf_documents en paralelo (con y sin tramos de páginas) contra la versión serial."""
+
+from pathlib import Path
+import shutil
+import pytest
+
+pytest.importorskip("pdfplumber")
+from raglib.loader_pdfs import iter_pdf_documents
+
+CORPUS = Path(__file__).resolve().parents[1] / "corpus"
+
+
+@pytest.fixture(scope="module")
+def folder(tmp_path_factory):
+    pdfs = sorted(CORPUS.glob("*.pdf"))
+    if not pdfs:
+        pytest.skip("sin PDFs en corpus/")
+    out = tmp_path_factory.mktemp("pdfs")
+    for p in pdfs:
+        shutil.copy(p, out / p.name)
+    (out / "sub").mkdir()
+    shutil.copy(pdfs[0], out / "sub" / pdfs[0].name)
+    (out / "a_broken.pdf").write_bytes(b"no es un PDF")  # falla, pero no corta el lote
+    return out
+
+
+def _run(folder, **kw):
+    reports = []
+    docs = [(d.id, d.text, d.source, d.page) for d in iter_pdf_documents(folder, on_report=reports.append, **kw)]
+    return docs, [(Path(r.path).name, r.pages, r.documents, r.error is not None) for r in reports]
+
+
+@pytest.fixture(scope="module")
+def serial(folder):
+    return _run(folder, workers=1)
+
+
+@pytest.mark.parametrize("workers,pages_per_task", [(2, 32), (2, 4), (3, 1)])
+def test_parallel_matches_serial(folder, serial, workers, pages_per_task):
+    assert serial[0]
+    assert _run(folder, workers=workers, pages_per_task=pages_per_task) == serial
+
+
+def test_broken_file_reported(serial):
+    broken = [r for r in serial[1] if r[0] == "a_broken.pdf"]
+    assert broken == [("a_broken.pdf", 0, 0, True)]
+    assert all(not err and docs > 0 for name, _, docs, err in serial[1] if name != "a_broken.pdf")
+
+
+def test_early_close(folder, serial):
+    it = iter_pdf_documents(folder, workers=2, pages_per_task=2)
+    first = [next(it) for _ in range(3)]
+    it.close()  # no debe quedar esperando los tramos pendientes
+    assert [(d.id, d.text, d.source, d.page) for d in first] == serial[0][:3]
+
+
+@pytest.mark.parametrize("pages_per_task", [0, -3])
+def test_invalid_pages_per_task(folder, pages_per_task):
+    with pytest.raises(ValueError):
+        iter_pdf_documents(folder, pages_per_task=pages_per_task)  # al llamar, sin iterar
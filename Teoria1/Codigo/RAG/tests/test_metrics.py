@@ -0,0 +1,53 @@
+"""ir_metrics (todas las queries a la vez) contra las métricas de a una query con bucles."""
+
+import random
+import numpy as np
+import pytest
+from raglib.metrics import ir_metrics, mrr, ndcg_at_k, precision_at_k, recall_at_k, relevance_matrix
+
+KS = (1, 3, 5, 10, 20)
+
+
+def _runs(seed: int, n_queries: int = 50):
+    rng = random.Random(seed)
+    pool = [f"d{i}" for i in range(60)]
+    ranked = [rng.sample(pool, rng.randint(0, 15)) for _ in range(n_queries)]  # listas de largo variable, alguna vacía
+    graded = [{d: rng.choice([0, 1, 2, 3]) for d in rng.sample(pool, rng.randint(0, 12))} for _ in range(n_queries)]
+    return ranked, graded
+
+
+def _ndcg_graded(pred, labels, k):
+    dcg = sum(labels.get(d, 0) / np.log2(i + 2) for i, d in enumerate(pred[:k]))
+    ideal = sorted((g for g in labels.values() if g > 0), reverse=True)[:k]
+    idcg = sum(g / np.log2(i + 2) for i, g in enumerate(ideal))
+    return 0.0 if idcg == 0 else dcg / idcg
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_binary_matches_loop(seed):
+    ranked, graded = _runs(seed)
+    qrels = [{d for d, g in q.items() if g > 0} for q in graded]
+    m = ir_metrics(relevance_matrix(ranked, qrels), qrels, KS)
+    for k in KS:
+        np.testing.assert_allclose(m[f"precision@{k}"], [precision_at_k(p, r, k) for p, r in zip(ranked, qrels)])
+        np.testing.assert_allclose(m[f"recall@{k}"], [recall_at_k(p, r, k) for p, r in zip(ranked, qrels)])
+        np.testing.assert_allclose(m[f"ndcg@{k}"], [ndcg_at_k(p, r, k) for p, r in zip(ranked, qrels)])
+    np.testing.assert_allclose(m["mrr"], [mrr(p, r) for p, r in zip(ranked, qrels)])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_graded_matches_loop(seed):
+    ranked, graded = _runs(seed)
+    binary = [{d for d, g in q.items() if g > 0} for q in graded]
+    m = ir_metrics(relevance_matrix(ranked, graded), graded, KS)
+    for k in KS:
+        np.testing.assert_allclose(m[f"ndcg@{k}"], [_ndcg_graded(p, q, k) for p, q in zip(ranked, graded)])
+        # precision / recall / mrr sólo miran label > 0
+        np.testing.assert_allclose(m[f"precision@{k}"], [precision_at_k(p, r, k) for p, r in zip(ranked, binary)])
+        np.testing.assert_allclose(m[f"recall@{k}"], [recall_at_k(p, r, k) for p, r in zip(ranked, binary)])
+    np.testing.assert_allclose(m["mrr"], [mrr(p, r) for p, r in zip(ranked, binary)])
+
+
+def test_invalid_ks():
+    with pytest.raises(ValueError):
+        ir_metrics(np.zeros((1, 3)), [set()], [0])
@@ -0,0 +1,71 @@
+"""diversity="mmr": mismo resultado que mmr() sobre embeddings recalculados, y caída a per_doc_cap sin rama vectorial."""
+
+import time
+import numpy as np
+import pytest
+from raglib.diversify import mmr
+from raglib.documents import Document
+from raglib.pipeline import RagPipeline
+from raglib.result_cache import ResultCache
+from raglib.vector_local import LocalVectorSearcher
+
+QUERIES = ["w1 w2 w3", "w10 w99", "w140 w7 w33"]
+
+
+def _pipeline(docs, ce_model, embed_model, **kw):
+    return RagPipeline(
+        docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model), max_tokens_chunk=120, overlap=30,
+        ce_model=ce_model, ce_pretokenize=None, diversity="mmr", **kw,
+    )
+
+
+def test_matches_reference(docs, ce_model, embed_model):
+    dup = Document("dup", docs[0].text, "dup.pdf", 1)  # copia exacta: sus chunks son casi duplicados
+    p = _pipeline(docs + [dup], ce_model, embed_model)
+    model = p.vec.model
+    for q in QUERIES + [docs[0].text[:80]]:
+        ids = p.retrieve_ids(q, top_k=p._fetch(8))
+        vecs = model.encode([p.store.text(s) for s in ids.tolist()], convert_to_numpy=True, normalize_embeddings=True)
+        expected = ids[mmr(vecs, 8, p.mmr_lambda, threshold=p.mmr_threshold)]
+        got = p.retrieve_with_metadata(q, top_k=8)
+        assert [(m["doc_id"], m["local_idx"]) for _, _, m in got] == [
+            (p.store.doc_id(s), p.store.local_idx(s)) for s in expected.tolist()
+        ]
+        texts = [t for _, t, _ in got]
+        assert len(texts) == len(set(texts))  # los duplicados exactos quedan afuera
+    assert p.retrieve_with_metadata_many(QUERIES, top_k=8) == [p.retrieve_with_metadata(q, top_k=8) for q in QUERIES]
+
+
+def test_degraded_vector_leg_falls_back_to_cap(docs, ce_model, embed_model, monkeypatch):
+    p = _pipeline(docs, ce_model, embed_model, concurrent=True, vec_timeout=0.2, result_cache=ResultCache())
+    calls = []
+
+    def boom(*args, **kwargs):
+        raise ConnectionError("índice caído")
+
+    monkeypatch.setattr(p.vec, "search_slots", boom)
+    monkeypatch.setattr(p.vec, "vectors_of", lambda *a, **k: calls.append(a) or boom())
+    for q in QUERIES:
+        got = p.retrieve_with_metadata(q, top_k=8)
+        bm25 = p.bm25.search_slots(q, top_k=p._fetch(8))[0]
+        assert [(m["doc_id"], m["local_idx"]) for _, _, m in got] == [
+            (p.store.doc_id(s), p.store.local_idx(s)) for s in p._capped(bm25, 8, 2).tolist()
+        ]
+    assert calls == []  # no se vuelve a llamar al índice que acaba de fallar
+    p.close()
+
+
+def test_slow_vectors_respect_timeout(docs, ce_model, embed_model, monkeypatch):
+    p = _pipeline(docs, ce_model, embed_model, concurrent=True, vec_timeout=0.2, result_cache=ResultCache())
+
+    def slow(*args, **kwargs):
+        time.sleep(1.0)
+        raise AssertionError("no debería esperarse")
+
+    monkeypatch.setattr(p.vec, "vectors_of", slow)
+    t0 = time.monotonic()
+    res = p.retrieve_and_rerank(QUERIES[0], 20, 5)
+    assert time.monotonic() - t0 < 0.9 and len(res) == 5
+    p.retrieve_and_rerank(QUERIES[0], 20, 5)
+    assert p.result_cache.hits == 0  # sin MMR la respuesta es degradada: no se cachea
+    p.close()
@@ -0,0 +1,54 @@
+"""Búsqueda híbrida por lotes: mismo resultado que query por query (BM25 solo y con índice vectorial local)."""
+
+import pytest
+from raglib.pipeline import RagPipeline
+from raglib.vector_local import LocalVectorSearcher
+
+
+@pytest.fixture(scope="module")
+def queries():
+    return ["w1 w2 w3", "w10 w99", "w5", "w140 w7 w7 w33", "zz", ""]
+
+
+@pytest.mark.parametrize("with_vectors", [False, True])
+def test_retrieve_many_matches_single(docs, ce_model, embed_model, queries, with_vectors):
+    vec = LocalVectorSearcher(model_name=embed_model) if with_vectors else None
+    p = RagPipeline(docs, pinecone_searcher=vec, max_tokens_chunk=120, overlap=30, ce_model=ce_model)
+    assert p.retrieve_many(queries, top_k=20) == [p.retrieve_hybrid(q, top_k=20) for q in queries]
+    assert p.retrieve_with_metadata_many(queries, top_k=8) == [p.retrieve_with_metadata(q, top_k=8) for q in queries]
+    assert p.retrieve_and_rerank_many(queries, 20, 5) == [p.retrieve_and_rerank(q, 20, 5) for q in queries]
+
+
+def test_add_remove_matches_rebuild(docs, ce_model, embed_model, queries):
+    from raglib.documents import Document
+
+    kw = dict(max_tokens_chunk=120, overlap=30, ce_model=ce_model)
+    p = RagPipeline(docs[:30], pinecone_searcher=LocalVectorSearcher(model_name=embed_model), **kw)
+    short = Document("d5", docs[5].text[:100], docs[5].source, docs[5].page)  # reemplazo con menos chunks
+    p.add_documents(docs[30:] + [short])
+    p.remove_documents(["d3", "no-existe"])
+    final = [short if d.id == "d5" else d for d in docs if d.id != "d3"]
+    assert [d.id for d in p.doc_list] == [d.id for d in final]
+    ref = RagPipeline(final, pinecone_searcher=LocalVectorSearcher(model_name=embed_model), **kw)
+    queries = [q for q in queries if q.startswith("w")] + [docs[35].text[:60]]  # "zz": sólo ruido vectorial
+    for q in queries:
+        assert p.retrieve_hybrid(q, top_k=20) == ref.retrieve_hybrid(q, top_k=20)
+        assert p.retrieve_with_metadata(q, top_k=8) == ref.retrieve_with_metadata(q, top_k=8)
+    assert not len(p.bm25.slots_of("d3")) and len(p.bm25.slots_of("d5")) == len(ref.bm25.slots_of("d5"))
+
+
+def test_pipeline_from_saved_index(tmp_path, docs, ce_model, embed_model, queries):
+    from raglib.bm25_index import BM25Index
+
+    kw = dict(max_tokens_chunk=120, overlap=30, ce_model=ce_model)
+    p = RagPipeline(docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model), **kw)
+    p.remove_documents(["d4"])
+    p.bm25.save(tmp_path)
+    loaded = RagPipeline(
+        [d for d in docs if d.id != "d4"], pinecone_searcher=LocalVectorSearcher(model_name=embed_model),
+        bm25_index=BM25Index.load(tmp_path), **kw,
+    )
+    assert loaded.corpus_version == p.corpus_version
+    for q in queries:
+        assert loaded.retrieve_hybrid(q, top_k=20) == p.retrieve_hybrid(q, top_k=20)
+        assert loaded.retrieve_with_metadata(q, top_k=8) == p.retrieve_with_metadata(q, top_k=8)
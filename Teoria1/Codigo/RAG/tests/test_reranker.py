@@ -0,0 +1,43 @@
+"""score_slots (pares armados con token ids cacheados) contra CrossEncoder.predict sobre los textos."""
+
+import numpy as np
+import pytest
+from raglib.chunk_store import ChunkStore
+from raglib.reranker import CrossEncoderReranker
+
+
+@pytest.fixture(scope="module")
+def store(docs):
+    s = ChunkStore()
+    for d in docs:
+        words = d.text.split()
+        s.append(d.id, [" ".join(words[i:i + 40]) for i in range(0, len(words), 25)], d.source, d.page)
+    s.append("empty", [""])
+    return s
+
+
+QUERIES = ["w1 w2 w3", "w140 w7 w7 w33 " * 20, "", "W10, w99?"]
+
+
+# largos cortos para forzar truncado de query, de chunk y de los dos (longest_first)
+@pytest.mark.parametrize("max_length", [None, 64, 24, 9])
+@pytest.mark.parametrize("bucket", [True, False])
+def test_score_slots_matches_predict(ce_model, store, max_length, bucket):
+    rr = CrossEncoderReranker(ce_model, max_length=max_length, bucket=bucket, max_batch_tokens=512)
+    assert rr.pretokenized
+    rng = np.random.default_rng(0)
+    slots_lists = [rng.choice(len(store), size=n, replace=False) for n in (17, 1, 0, 30)]
+    got = rr.score_slots_many(QUERIES, slots_lists, store, batch_size=8)
+    for q, slots, scores in zip(QUERIES, slots_lists, got):
+        expected = rr.model.predict([(q, store.text(s)) for s in slots.tolist()]) if len(slots) else np.zeros(0)
+        np.testing.assert_allclose(scores, expected, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(rr.score_slots(q, slots, store), scores, rtol=1e-5, atol=1e-6)
+
+
+def test_score_slots_without_token_cache(ce_model, store):
+    cached = CrossEncoderReranker(ce_model, max_length=32)
+    plain = CrossEncoderReranker(ce_model, max_length=32, token_cache=False)
+    assert not plain.pretokenized
+    slots = np.arange(len(store))
+    np.testing.assert_allclose(plain.score_slots("w3 w4", slots, store), cached.score_slots("w3 w4", slots, store),
+                               rtol=1e-4, atol=1e-5)
@@ -0,0 +1,56 @@
+"""ResultCache con RagPipeline: misma versión tras reiniciar, invalidación por altas/bajas y limpieza del disco."""
+
+import os
+import time
+from raglib.documents import Document
+from raglib.pipeline import RagPipeline
+from raglib.result_cache import ResultCache
+
+KW = dict(max_tokens_chunk=120, overlap=30, ce_pretokenize=None)
+
+
+def _pipeline(docs, ce_model, folder):
+    return RagPipeline(docs, ce_model=ce_model, result_cache=ResultCache(folder=folder), **KW)
+
+
+def test_restart_hits_disk(docs, ce_model, tmp_path):
+    p = _pipeline(docs, ce_model, tmp_path)
+    res = p.retrieve_and_rerank("w1 w2 w3", 20, 5)
+    # "otro proceso": mismo corpus, índice construido de nuevo
+    q = _pipeline(docs, ce_model, tmp_path)
+    assert q.corpus_version == p.corpus_version
+    assert q.retrieve_and_rerank("w1 w2 w3", 20, 5) == res
+    assert q.result_cache.disk_hits == 1
+    # otro corpus, otra versión
+    assert _pipeline(docs[1:], ce_model, tmp_path).corpus_version != p.corpus_version
+
+
+def test_add_remove_invalidate(docs, ce_model, tmp_path):
+    p = _pipeline(docs[:30], ce_model, tmp_path)
+    q = "w5 w6 w7"
+    before = p.retrieve_and_rerank(q, 20, 20)
+    v0 = p.corpus_version
+    p.add_documents([Document("nuevo", "W5 w6 w7 w5 w6 w7. W5 w6 w7 w5.", "n.pdf", 1)])
+    assert p.corpus_version != v0
+    after = p.retrieve_and_rerank(q, 20, 20)
+    assert "nuevo" in {m["doc_id"] for _, _, m, _ in after}  # CrossEncoder aleatorio: sólo importa que aparezca
+    p.remove_documents(["nuevo"])
+    assert p.retrieve_and_rerank(q, 20, 20) == before
+    assert p.result_cache.misses == 3
+
+
+def test_clear_and_gc_keep_other_versions(docs, ce_model, tmp_path):
+    other = _pipeline(docs[1:], ce_model, tmp_path)
+    other.retrieve_and_rerank("w1", 20, 5)
+    p = _pipeline(docs, ce_model, tmp_path)
+    p.retrieve_and_rerank("w1", 20, 5)
+    p.invalidate_results()
+    folders = {d.name for d in tmp_path.iterdir()}
+    assert {other.corpus_version, p.result_cache.version} <= folders  # clear() no borra el disco
+    assert p.result_cache.gc() == 0  # recién escritas: no vencieron
+    old = time.time() - 2 * p.result_cache.ttl
+    for d in (tmp_path / other.corpus_version).rglob("*"):
+        os.utime(d, (old, old))
+    os.utime(tmp_path / other.corpus_version, (old, old))
+    p.retrieve_and_rerank("w2", 20, 5)  # nueva versión tras invalidate_results: set_version corre gc
+    assert other.corpus_version not in {d.name for d in tmp_path.iterdir()}
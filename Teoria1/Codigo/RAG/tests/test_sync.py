@@ -0,0 +1,71 @@
+"""Re-ingesta incremental contra el manifiesto y sync_chunks sobre un buscador que comparte el almacén del pipeline."""
+
+import numpy as np
+import pytest
+from raglib.chunk_manifest import ChunkManifest
+from raglib.documents import Document, chunk_documents
+from raglib.pipeline import RagPipeline
+from raglib.vector_local import LocalVectorSearcher
+
+QUERIES = ["w1 w2 w3", "w10 w99", "w140 w7 w33"]
+
+
+def _corpus(docs):
+    return chunk_documents(docs, 120, 30), {d.id: {"source": d.source, "page": d.page} for d in docs}
+
+
+def _hits(searcher, q):
+    return [(cid, round(score, 5)) for cid, score, _ in searcher.search(q, top_k=15)]
+
+
+def test_manifest_sync_matches_rebuild(docs, embed_model, tmp_path, monkeypatch):
+    vec = LocalVectorSearcher(model_name=embed_model)
+    manifest = ChunkManifest(tmp_path / "m.json")
+    chunks, meta = _corpus(docs)
+    n = sum(len(c) for c in chunks.values())
+    assert vec.sync_chunks(chunks, meta, manifest) == {"added": n, "changed": 0, "removed": 0, "unchanged": 0}
+
+    # misma corrida otra vez (otro proceso con el manifiesto guardado): no se codifica ni se agrega nada
+    encoded = []
+    monkeypatch.setattr(vec, "_encode", lambda texts, *a, **k: encoded.extend(texts) or np.zeros((len(texts), vec.dim)))
+    size = len(vec.store)
+    assert vec.sync_chunks(chunks, meta, ChunkManifest(tmp_path / "m.json"))["unchanged"] == n
+    assert encoded == [] and len(vec.store) == size
+    monkeypatch.undo()
+
+    # un documento cambia, otro desaparece, otro es nuevo
+    edited = [Document(d.id, d.text + " W149 w148.", d.source, d.page) if d.id == "d3" else d for d in docs[1:]]
+    edited.append(Document("nuevo", "W7 w8 w9 w7 w8. W9 w7.", "n.pdf", 1))
+    chunks, meta = _corpus(edited)
+    stats = vec.sync_chunks(chunks, meta, manifest)
+    assert stats["removed"] == len(_corpus(docs[:1])[0]["d0"]) and stats["added"] >= 1 and stats["changed"] >= 1
+    assert len(vec.store) - size == stats["added"] + stats["changed"]  # sólo lo nuevo o modificado
+
+    fresh = LocalVectorSearcher(model_name=embed_model)
+    fresh.upsert_chunks(chunks, meta)
+    for q in QUERIES:
+        assert _hits(vec, q) == _hits(fresh, q)
+
+
+def test_sync_does_not_touch_pipeline_store(docs, ce_model, embed_model, tmp_path):
+    p = RagPipeline(docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model),
+                    max_tokens_chunk=120, overlap=30, ce_model=ce_model, ce_pretokenize=None)
+    size, version = len(p.store), p.corpus_version
+    before = {q: p.retrieve_hybrid(q, top_k=20) for q in QUERIES}
+
+    extra = Document("solo_vector", "W1 w2 w3 w1 w2 w3. W10 w99 w10.", "x.pdf", 1)
+    chunks, meta = _corpus(docs + [extra])
+    p.vec.sync_chunks(chunks, meta, ChunkManifest(tmp_path / "m.json"))
+    assert len(p.store) == size and p.corpus_version == version  # el BM25 no ve esos slots
+    assert p.vec.store is not p.store
+    for q in QUERIES:
+        ids = p.retrieve_ids(q, top_k=20)
+        assert p.bm25.is_live(ids).all()
+        assert "solo_vector" not in {p.store.doc_id(s) for s in ids.tolist()}
+        assert len(p.retrieve_hybrid(q, top_k=20)) == len(before[q])
+    # sin chunks nuevos el almacén se sigue compartiendo
+    q = RagPipeline(docs, pinecone_searcher=LocalVectorSearcher(model_name=embed_model),
+                    max_tokens_chunk=120, overlap=30, ce_model=ce_model, ce_pretokenize=None)
+    chunks, meta = _corpus(docs)
+    q.vec.sync_chunks(chunks, meta, ChunkManifest(tmp_path / "m2.json"))
+    assert q.vec.store is q.store and len(q.store) == size
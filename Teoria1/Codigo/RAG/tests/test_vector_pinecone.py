@@ -0,0 +1,109 @@
+"""
+PineconeSearcher sobre una namespace ya cargada por otro proceso (sin upsert/sync en éste):
+los ids se traducen a slots del pipeline y la rama vectorial no se pierde en la fusión.
+El cliente de Pinecone se reemplaza por un índice en memoria con la misma interfaz.
+"""
+
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import raglib.vector_pinecone as vp
+from raglib.pipeline import RagPipeline
+
+
+class _MemoryIndex:
+    def __init__(self):
+        self.namespaces = {}
+
+    def upsert(self, vectors, namespace=""):
+        ns = self.namespaces.setdefault(namespace, {})
+        for v in vectors:
+            ns[v["id"]] = (np.asarray(v["values"], dtype=np.float32), v.get("metadata"))
+
+    def delete(self, ids=None, deleteAll=False, namespace=""):
+        if deleteAll:
+            self.namespaces.pop(namespace, None)
+        for cid in ids or []:
+            self.namespaces.get(namespace, {}).pop(cid, None)
+
+    def describe_index_stats(self):
+        return {"namespaces": {k: {"vectorCount": len(v)} for k, v in self.namespaces.items()}}
+
+    def query(self, vector, top_k, include_metadata=False, include_values=False, namespace="", filter=None):
+        items = list(self.namespaces.get(namespace, {}).items())
+        if not items:
+            return SimpleNamespace(matches=[])
+        scores = np.stack([v for _, (v, _) in items]) @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=items[i][0], score=float(scores[i]),
+                            metadata=items[i][1][1] if include_metadata else None,
+                            values=items[i][1][0].tolist() if include_values else [])
+            for i in order
+        ])
+
+    def fetch(self, ids, namespace=""):
+        ns = self.namespaces.get(namespace, {})
+        return SimpleNamespace(vectors={i: SimpleNamespace(values=ns[i][0].tolist()) for i in ids if i in ns})
+
+
+@pytest.fixture
+def index(monkeypatch):
+    shared = _MemoryIndex()
+
+    class _Client:
+        def __init__(self, api_key=None):
+            pass
+
+        def list_indexes(self):
+            return {"indexes": [{"name": "test"}]}
+
+        def Index(self, name):
+            return shared
+
+    monkeypatch.setattr(vp, "Pinecone", _Client)
+    return shared
+
+
+def _searcher(embed_model):
+    return vp.PineconeSearcher(index_name="test", model_name=embed_model, api_key="test", namespace="ns")
+
+
+QUERIES = ["w1 w2 w3", "w10 w99", "w140 w7 w33"]
+
+
+def test_search_over_namespace_populated_elsewhere(index, docs, ce_model, embed_model, capsys):
+    kw = dict(max_tokens_chunk=120, overlap=30, ce_model=ce_model, ce_pretokenize=None)
+    loader = RagPipeline(docs, pinecone_searcher=_searcher(embed_model), **kw)  # "otro proceso": sube todo
+    assert len(index.namespaces["ns"]) == len(loader.store)
+
+    searcher = _searcher(embed_model)
+    assert len(searcher.registry) == 0
+    p = RagPipeline(docs, pinecone_searcher=searcher, do_upsert=False, **kw)
+    for q in QUERIES:
+        expected = searcher.search(q, top_k=20)
+        slots, scores = searcher.search_slots(q, top_k=20)
+        assert [p.chunk_id(s) for s in slots.tolist()] == [cid for cid, _, _ in expected]
+        np.testing.assert_allclose(scores, [s for _, s, _ in expected], rtol=1e-6)
+        assert p.retrieve_hybrid(q, top_k=20) == loader.retrieve_hybrid(q, top_k=20)
+        assert p.retrieve_many([q], top_k=20) == [loader.retrieve_hybrid(q, top_k=20)]
+    assert "[WARN]" not in capsys.readouterr().out
+
+
+def test_unmapped_ids_warn(index, docs, ce_model, embed_model, capsys):
+    kw = dict(max_tokens_chunk=120, overlap=30, ce_model=ce_model, ce_pretokenize=None)
+    RagPipeline(docs, pinecone_searcher=_searcher(embed_model), **kw)
+    capsys.readouterr()
+
+    # sin pipeline que traduzca los ids: no hay slots, pero no se descartan en silencio
+    standalone = _searcher(embed_model)
+    slots, _ = standalone.search_slots(QUERIES[0], top_k=5)
+    assert len(slots) == 0
+    assert "[WARN]" in capsys.readouterr().out
+
+    # pipeline con sólo una parte del corpus: los ids de documentos que no tiene se avisan
+    p = RagPipeline(docs[:10], pinecone_searcher=_searcher(embed_model), do_upsert=False, **kw)
+    slots, _ = p.vec.search_slots(QUERIES[0], top_k=len(index.namespaces["ns"]))
+    assert {p.store.doc_id(s) for s in slots.tolist()} <= {d.id for d in docs[:10]}
+    assert len(slots) == len(p.store)
+    assert "[WARN]" in capsys.readouterr().out